@@ -2,16 +2,56 @@
 import os
 import time
 import json
+import uuid
+import threading
 from flask import Flask, render_template, request, Response, session, jsonify
-from src.task2_rag import setup_rag_system
-from llama_index.core.llms import ChatMessage
+from src.task2_rag import (configure_models, load_index, student_filters, question_filters, question_doc_id,
+                           student_versions, load_manifest, DEFAULT_STUDENT_ID)
+from src.session_store import SessionStore
+from src.router import (QueryRouter, ROUTE_QUESTION, ROUTE_PERSONA, ROUTE_OFF_TOPIC, PERSONA_ANSWER, OFF_TOPIC_ANSWER,
+                        QUESTION_PATTERN)
+from src.semantic_cache import SemanticCache
+from llama_index.core import Settings
+from llama_index.core.llms import ChatMessage, MessageRole
+from src.cache import CACHE_DIR, SQLiteCache
+from src.scheduler import estimate_tokens
+from src import telemetry
 
 # --- Flask App Initialization ---
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "a_very_secret_key_for_baaz_bot")
 
-# --- Global variable for the RAG Index ---
+# --- Global variables for the RAG Index and the local query router ---
 rag_index = None
+query_router = None
+semantic_cache = None
+insight_versions = {}  # student_id -> hash of their indexed insights, scopes the semantic cache
+
+# --- Startup: models and index load on a background thread; /readyz says when chat is available ---
+# WARMUP_ON_START=0 defers loading until start_warmup() is called (e.g. by a test harness)
+WARMUP_ON_START = os.getenv("WARMUP_ON_START", "1") != "0"
+rag_ready = threading.Event()
+startup_state = {"status": "starting", "error": None, "timings": {}}
+_warmup_thread = None
+_warmup_lock = threading.Lock()
+_process_started = time.monotonic()  # when app.py was imported
+
+# --- Streaming settings: flush a batch of tokens when either limit is hit ---
+STREAM_FLUSH_CHARS = 24
+STREAM_FLUSH_INTERVAL = 0.05  # seconds
+
+# --- Chat sessions live on the server, keyed by the session id in the cookie ---
+CHAT_TOKEN_LIMIT = int(os.getenv("CHAT_TOKEN_LIMIT", "3000"))  # history kept per session
+SESSION_TTL = float(os.getenv("SESSION_TTL", "3600"))          # seconds of inactivity
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "1000"))          # live sessions per process
+# SESSION_BACKEND=sqlite also keeps histories in .cache/sessions.sqlite across evictions and restarts
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+
+# --- Semantic answer cache: near-identical questions about the same insights reuse the stored answer ---
+SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE", "1") != "0"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))  # cosine similarity
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "86400"))             # seconds
+SEMANTIC_CACHE_MAX = int(os.getenv("SEMANTIC_CACHE_MAX", "5000"))                # answers per process
 
 # --- NEW: Define the custom system prompt as a global constant ---
 SYSTEM_PROMPT = (
@@ -29,28 +69,238 @@ SYSTEM_PROMPT = (
 )
 
 def initialize_rag_system():
-    global rag_index
+    global rag_index, query_router, semantic_cache, insight_versions
     if rag_index is None:
         print("="*50)
         print("🚀 Initializing RAG Index for the first time...")
-        rag_index = setup_rag_system()
+        timings = startup_state["timings"]
+        with telemetry.span("rag.setup"):
+            start = time.perf_counter()
+            configure_models()
+            timings["models_s"] = round(time.perf_counter() - start, 3)
+
+            start = time.perf_counter()
+            index = load_index()
+            timings["index_s"] = round(time.perf_counter() - start, 3)
+
+            # Routes on the embedding model configure_models just loaded; the first
+            # embedding also pays for the model's lazy initialisation
+            start = time.perf_counter()
+            with telemetry.span("rag.warm_up_router"):
+                query_router = QueryRouter(Settings.embed_model)
+                query_router.warm_up()
+            timings["warm_up_s"] = round(time.perf_counter() - start, 3)
+
+        insight_versions = student_versions(load_manifest() or {})
+        if SEMANTIC_CACHE:
+            semantic_cache = SemanticCache(
+                Settings.embed_model,
+                threshold=SEMANTIC_CACHE_THRESHOLD,
+                ttl=SEMANTIC_CACHE_TTL,
+                max_entries=SEMANTIC_CACHE_MAX,
+            )
+        rag_index = index
         print("✅ RAG Index initialized successfully!")
         print("="*50)
 
+def warm_up():
+    try:
+        initialize_rag_system()
+    except Exception as e:
+        startup_state.update(status="failed", error=str(e))
+        print(f"❌ Startup failed: {e}")
+        return
+    startup_state["status"] = "ready"
+    startup_state["timings"]["ready_after_s"] = round(time.monotonic() - _process_started, 3)
+    print(f"✅ Ready {startup_state['timings']['ready_after_s']}s after start.")
+    rag_ready.set()
+
+def start_warmup():
+    """Starts loading the models and index in the background; safe to call more than once."""
+    global _warmup_thread
+    with _warmup_lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=warm_up, name="rag-warmup", daemon=True)
+            _warmup_thread.start()
+
+def readiness():
+    """Returns (payload, HTTP status) for /readyz."""
+    return dict(startup_state), 200 if rag_ready.is_set() else 503
+
+def not_ready_message() -> str:
+    if startup_state["status"] == "failed":
+        return f"Baaz Bot failed to start: {startup_state['error']}"
+    return "Baaz Bot is still waking up, please try again in a few seconds."
+
+def build_chat_engine(student_id: str, memory):
+    # Retrieval only ever sees the session's own student partition
+    return rag_index.as_chat_engine(
+        chat_mode='condense_plus_context',
+        memory=memory,
+        system_prompt=SYSTEM_PROMPT,
+        filters=student_filters(student_id)
+    )
+
+def build_question_engine(student_id: str, question_id: int, memory):
+    # Straight to one question's insight section: no condense step, one LLM call
+    return rag_index.as_chat_engine(
+        chat_mode='context',
+        memory=memory,
+        system_prompt=SYSTEM_PROMPT,
+        filters=question_filters(student_id, question_id)
+    )
+
+session_store = SessionStore(
+    build_chat_engine,
+    token_limit=CHAT_TOKEN_LIMIT,
+    max_sessions=MAX_SESSIONS,
+    ttl=SESSION_TTL,
+    backend=SQLiteCache(CACHE_DIR / "sessions.sqlite") if SESSION_BACKEND == "sqlite" else None,
+)
+
+def get_session_id():
+    if "session_id" not in session:
+        session["session_id"] = uuid.uuid4().hex
+    return session["session_id"]
+
+def bind_student(cookie_session, requested: str = None):
+    """
+    The student a browser session is about. It's set once, when the session
+    is created (from ?student=, else DEFAULT_STUDENT_ID), and kept across new
+    chats; returns None if `requested` names a different student.
+    This only keeps one chat history to one student; it is not access
+    control, since a client can always start over without the cookie.
+    """
+    if "student_id" not in cookie_session:
+        cookie_session["student_id"] = requested or DEFAULT_STUDENT_ID
+    if requested is not None and requested != cookie_session["student_id"]:
+        return None
+    return cookie_session["student_id"]
+
+STUDENT_MISMATCH = "Error: This chat session belongs to another student."
+
+def sse_event(payload: dict) -> str:
+    return f"data: {json.dumps(payload)}\n\n"
+
+def put_turn(chat_session, user_message: str, answer: str):
+    """Records a turn answered without the chat engine."""
+    chat_session.memory.put(ChatMessage(role=MessageRole.USER, content=user_message))
+    chat_session.memory.put(ChatMessage(role=MessageRole.ASSISTANT, content=answer))
+    session_store.save(chat_session)
+
+def plan_turn(chat_session, user_message: str):
+    """
+    Everything that happens before the LLM: routing, canned answers and the
+    semantic cache. Returns (answer, None, None) when the turn is answered
+    locally, else (None, engine, cache_args) where cache_args is None if the
+    answer must not be cached.
+    """
+    route, question_id = query_router.route(user_message)
+    telemetry.annotate(route=route)
+    if route in (ROUTE_PERSONA, ROUTE_OFF_TOPIC):
+        telemetry.annotate(answered_by="canned")
+        return PERSONA_ANSWER if route == ROUTE_PERSONA else OFF_TOPIC_ANSWER, None, None
+
+    # Follow-ups depend on the conversation so far; only standalone turns are cached.
+    # Question numbers are part of the key: "question 3" and "question 4" embed almost identically.
+    cache_args = None
+    if semantic_cache is not None and (route == ROUTE_QUESTION or not chat_session.memory.get_all()):
+        cache_args = dict(
+            student_id=chat_session.student_id,
+            version=insight_versions.get(chat_session.student_id, ""),
+            message=user_message,
+            key=tuple(sorted({int(number) for number in QUESTION_PATTERN.findall(user_message)})),
+            vector=semantic_cache.embed(user_message),
+        )
+        answer = semantic_cache.lookup(**cache_args)
+        telemetry.annotate(semantic_cache="miss" if answer is None else "hit")
+        telemetry.inc("semantic_cache_lookups_total", result="miss" if answer is None else "hit")
+        if answer is not None:
+            telemetry.annotate(answered_by="semantic_cache")
+            return answer, None, None
+
+    engine = chat_session.engine
+    # Unknown question numbers fall back to the regular condense + retrieve path
+    if route == ROUTE_QUESTION and rag_index.docstore.get_ref_doc_info(question_doc_id(chat_session.student_id, question_id)):
+        engine = build_question_engine(chat_session.student_id, question_id, chat_session.memory)
+    telemetry.annotate(answered_by="llm")
+    return None, engine, cache_args
+
+def record_retrieval(span, streaming_response):
+    """Puts the retrieved nodes' similarity scores on the turn's span and in the retrieval_score histogram."""
+    scores = [node.score for node in streaming_response.source_nodes or [] if node.score is not None]
+    span.set(retrieval_top_k=len(scores), retrieval_scores=[round(score, 4) for score in scores])
+    for score in scores:
+        telemetry.observe("retrieval_score", score, buckets=telemetry.SCORE_BUCKETS)
+
+def record_first_token(span, request_start: float):
+    ttft = time.perf_counter() - request_start
+    span.set(ttft_s=round(ttft, 4))
+    telemetry.observe("chat_ttft_seconds", ttft)
+
+def end_turn_span(span, answer: str = ""):
+    """Closes a chat.stream span and counts the turn by how it was answered."""
+    if answer:
+        span.set(response_tokens=estimate_tokens(answer))
+    telemetry.inc("chat_turns_total", answered_by=span.attrs.get("answered_by", "none"), status=span.status)
+    span.end()
+
+def batch_tokens(tokens):
+    """
+    Groups small LLM deltas into larger chunks, flushing when either
+    STREAM_FLUSH_CHARS characters are buffered or STREAM_FLUSH_INTERVAL has
+    passed, so we don't send one SSE event per character.
+    """
+    buffer = []
+    buffered_chars = 0
+    last_flush = time.monotonic()
+    for token in tokens:
+        if not token:
+            continue
+        buffer.append(token)
+        buffered_chars += len(token)
+        if buffered_chars >= STREAM_FLUSH_CHARS or time.monotonic() - last_flush >= STREAM_FLUSH_INTERVAL:
+            yield "".join(buffer)
+            buffer, buffered_chars = [], 0
+            last_flush = time.monotonic()
+    if buffer:
+        yield "".join(buffer)
+
 # --- Routes ---
 
-@app.before_request
-def before_first_request_func():
-    initialize_rag_system()
+@app.route("/healthz")
+def healthz():
+    # The process is up and serving; see /readyz for whether chat works yet
+    return jsonify({"status": "ok"})
+
+@app.route("/readyz")
+def readyz():
+    payload, status = readiness()
+    return jsonify(payload), status
+
+@app.route("/metrics")
+def metrics():
+    return Response(telemetry.render_prometheus(), mimetype="text/plain; version=0.0.4")
 
 @app.route("/")
 def index():
+    # The student whose insights this chat is about, e.g. /?student=exam_x/student_001
+    student_id = bind_student(session, request.args.get("student"))
+    if student_id is None:
+        return Response(STUDENT_MISMATCH, status=403)
+    if "session_id" in session:
+        session_store.drop(session["session_id"])
     session.clear()
+    session["student_id"] = student_id
     return render_template("index.html")
 
 @app.route("/new_chat", methods=["POST"])
 def new_chat():
+    student_id = bind_student(session)
+    if "session_id" in session:
+        session_store.drop(session["session_id"])
     session.clear()
+    session["student_id"] = student_id
     return jsonify({"status": "success", "message": "New chat session started."})
 
 @app.route("/stream_ask")
@@ -58,32 +308,86 @@ def stream_ask():
     user_message = request.args.get("message", "")
     if not user_message:
         return Response("Error: Message cannot be empty.", status=400)
+    student_id = bind_student(session, request.args.get("student"))
+    if student_id is None:
+        return Response(STUDENT_MISMATCH, status=403)
 
-    chat_history_dicts = session.get("chat_history", [])
-    chat_history = [ChatMessage.parse_obj(msg) for msg in chat_history_dicts]
-    
-    # --- MODIFIED: Pass the system_prompt to the chat engine ---
-    chat_engine = rag_index.as_chat_engine(
-        chat_history=chat_history,
-        chat_mode='condense_plus_context',
-        system_prompt=SYSTEM_PROMPT  # <-- The fix is applied here
-    )
-    
-    # ... (The rest of the function remains the same) ...
-    
-    streaming_response = chat_engine.stream_chat(user_message)
-    
-    full_response_text = "".join(list(streaming_response.response_gen))
-    
-    session["chat_history"] = [msg.model_dump() for msg in chat_engine.chat_history]
-    
-    def stream_characters(text):
-        for char in text:
-            sse_data = f"data: {json.dumps({'token': char})}\n\n"
-            yield sse_data
-            time.sleep(0.01)
-
-    return Response(stream_characters(full_response_text), mimetype='text/event-stream')
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if not rag_ready.is_set():
+        # Sent as an event rather than a 503 so the chat window can show it
+        return Response(sse_event({'error': not_ready_message()}), mimetype='text/event-stream',
+                        headers={**headers, "Retry-After": "5"})
+
+    request_start = time.perf_counter()
+    chat_session = session_store.get(get_session_id(), student_id)
+
+    def stream_tokens():
+        # One turn at a time per session; the engine's memory isn't safe to share
+        if not chat_session.lock.acquire(blocking=False):
+            yield sse_event({'error': "Please wait for the current answer to finish."})
+            return
+        span = telemetry.start_span("chat.stream", server="flask", student_id=chat_session.student_id)
+        chunks = []
+        try:
+            with telemetry.use_span(span):
+                answer, engine, cache_args = plan_turn(chat_session, user_message)
+            if answer is not None:
+                put_turn(chat_session, user_message, answer)
+                chunks.append(answer)
+                record_first_token(span, request_start)
+                yield sse_event({'token': answer})
+                yield sse_event({'done': True})
+                return
+
+            streaming_response = engine.stream_chat(user_message)
+            record_retrieval(span, streaming_response)
+            # Forward LLM chunks to the client as soon as they arrive
+            for chunk in batch_tokens(streaming_response.response_gen):
+                if not chunks:
+                    record_first_token(span, request_start)
+                chunks.append(chunk)
+                yield sse_event({'token': chunk})
+
+            # The engine writes the answer to memory on a background thread
+            writer = getattr(streaming_response, "write_response_to_history_thread", None)
+            if writer is not None:
+                writer.join()
+            session_store.save(chat_session)
+            if cache_args is not None:
+                semantic_cache.store(answer="".join(chunks), **cache_args)
+            yield sse_event({'done': True})
+        except GeneratorExit:
+            # The client went away mid-answer
+            span.set(disconnected=True)
+            raise
+        except Exception as e:
+            print(f"❌ Error while streaming response: {e}")
+            span.status = "error"
+            span.set(error=type(e).__name__)
+            yield sse_event({'error': str(e)})
+        finally:
+            chat_session.lock.release()
+            end_turn_span(span, "".join(chunks))
+
+    return Response(stream_tokens(), mimetype='text/event-stream', headers=headers)
+
+# --- Gauges read on each /metrics scrape ---
+telemetry.gauge("ready", rag_ready.is_set)
+telemetry.gauge("chat_sessions", lambda: len(session_store))
+telemetry.gauge("semantic_cache_entries", lambda: semantic_cache.stats()["entries"] if semantic_cache else 0)
+
+def embed_cache_stat(name: str) -> int:
+    """One of the ONNX embedder's query cache stats; 0 before startup or with EMBED_BACKEND=hf."""
+    cache_stats = getattr(Settings.embed_model, "cache_stats", None) if rag_ready.is_set() else None
+    return cache_stats()[name] if cache_stats else 0
+
+telemetry.gauge("embed_query_cache_entries", lambda: embed_cache_stat("entries"))
+telemetry.gauge("embed_query_cache_hits", lambda: embed_cache_stat("hits"))
+telemetry.gauge("embed_query_cache_misses", lambda: embed_cache_stat("misses"))
+
+# The debug reloader's parent process only watches files; the child it spawns does the loading
+if WARMUP_ON_START and not (__name__ == "__main__" and os.environ.get("WERKZEUG_RUN_MAIN") != "true"):
+    start_warmup()
 
 if __name__ == "__main__":
     app.run(debug=True, host='0.0.0.0')
\ No newline at end of file
@@ -0,0 +1,185 @@
+# asgi.py
+# Async serving mode for the chat app, for many concurrent streams per process:
+#   hypercorn asgi:app --bind 0.0.0.0:5000
+# Same routes, templates, sessions and caches as app.py; LLM calls stream on
+# the event loop instead of holding a thread each.
+import os
+import time
+import uuid
+import asyncio
+from quart import Quart, render_template, request, Response, session, jsonify
+import app as wsgi
+from src import telemetry
+
+# --- Backpressure: at most MAX_STREAMS LLM generations at once; others wait up to STREAM_QUEUE_TIMEOUT ---
+MAX_STREAMS = int(os.getenv("MAX_STREAMS", "256"))
+STREAM_QUEUE_TIMEOUT = float(os.getenv("STREAM_QUEUE_TIMEOUT", "10"))  # seconds
+
+app = Quart(__name__)
+# Same secret, so the session cookie is shared with the Flask app
+app.secret_key = wsgi.app.secret_key
+
+stream_slots = asyncio.Semaphore(MAX_STREAMS)
+active_streams = 0  # LLM generations holding a slot
+telemetry.gauge("active_streams", lambda: active_streams)
+
+def get_session_id():
+    if "session_id" not in session:
+        session["session_id"] = uuid.uuid4().hex
+    return session["session_id"]
+
+async def abatch_tokens(tokens):
+    """Async version of app.batch_tokens: groups LLM deltas by size or time before sending."""
+    buffer = []
+    buffered_chars = 0
+    last_flush = time.monotonic()
+    async for token in tokens:
+        if not token:
+            continue
+        buffer.append(token)
+        buffered_chars += len(token)
+        if buffered_chars >= wsgi.STREAM_FLUSH_CHARS or time.monotonic() - last_flush >= wsgi.STREAM_FLUSH_INTERVAL:
+            yield "".join(buffer)
+            buffer, buffered_chars = [], 0
+            last_flush = time.monotonic()
+    if buffer:
+        yield "".join(buffer)
+
+async def cancel_generation(streaming_response, writer: asyncio.Task):
+    """Stops an LLM stream nobody is listening to any more, so it stops spending tokens."""
+    if not writer.done():
+        writer.cancel()
+        try:
+            await writer
+        except (asyncio.CancelledError, Exception):
+            pass
+    if streaming_response.achat_stream is not None:
+        # Closes the underlying HTTP stream to the LLM
+        await streaming_response.achat_stream.aclose()
+
+# --- Routes ---
+
+@app.before_serving
+async def load_rag_system():
+    # Loads in the background: the server accepts connections (and /healthz) right away
+    wsgi.start_warmup()
+
+@app.route("/healthz")
+async def healthz():
+    return jsonify({"status": "ok"})
+
+@app.route("/readyz")
+async def readyz():
+    payload, status = wsgi.readiness()
+    return jsonify(payload), status
+
+@app.route("/metrics")
+async def metrics():
+    return Response(telemetry.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/")
+async def index():
+    student_id = wsgi.bind_student(session, request.args.get("student"))
+    if student_id is None:
+        return Response(wsgi.STUDENT_MISMATCH, status=403)
+    if "session_id" in session:
+        wsgi.session_store.drop(session["session_id"])
+    session.clear()
+    session["student_id"] = student_id
+    return await render_template("index.html")
+
+@app.route("/new_chat", methods=["POST"])
+async def new_chat():
+    student_id = wsgi.bind_student(session)
+    if "session_id" in session:
+        wsgi.session_store.drop(session["session_id"])
+    session.clear()
+    session["student_id"] = student_id
+    return jsonify({"status": "success", "message": "New chat session started."})
+
+@app.route("/stream_ask")
+async def stream_ask():
+    user_message = request.args.get("message", "")
+    if not user_message:
+        return Response("Error: Message cannot be empty.", status=400)
+    student_id = wsgi.bind_student(session, request.args.get("student"))
+    if student_id is None:
+        return Response(wsgi.STUDENT_MISMATCH, status=403)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if not wsgi.rag_ready.is_set():
+        return Response(wsgi.sse_event({'error': wsgi.not_ready_message()}), mimetype='text/event-stream',
+                        headers={**headers, "Retry-After": "5"})
+
+    request_start = time.perf_counter()
+    chat_session = wsgi.session_store.get(get_session_id(), student_id)
+
+    async def stream_tokens():
+        global active_streams
+        # One turn at a time per session; the engine's memory isn't safe to share
+        if not chat_session.lock.acquire(blocking=False):
+            yield wsgi.sse_event({'error': "Please wait for the current answer to finish."})
+            return
+        streaming_response = writer = None
+        history = list(chat_session.memory.get_all())
+        span = telemetry.start_span("chat.stream", server="asgi", student_id=chat_session.student_id)
+        chunks = []
+        try:
+            # Routing and the semantic cache embed the message: keep that CPU work off the event loop
+            with telemetry.use_span(span):
+                answer, engine, cache_args = await asyncio.to_thread(wsgi.plan_turn, chat_session, user_message)
+            if answer is not None:
+                wsgi.put_turn(chat_session, user_message, answer)
+                chunks.append(answer)
+                wsgi.record_first_token(span, request_start)
+                yield wsgi.sse_event({'token': answer})
+                yield wsgi.sse_event({'done': True})
+                return
+
+            queued = time.perf_counter()
+            try:
+                await asyncio.wait_for(stream_slots.acquire(), timeout=STREAM_QUEUE_TIMEOUT)
+            except asyncio.TimeoutError:
+                span.set(answered_by="busy")
+                yield wsgi.sse_event({'error': "Baaz Bot is busy right now, please try again in a moment."})
+                return
+            span.set(queue_wait_s=round(time.perf_counter() - queued, 4))
+            active_streams += 1
+            try:
+                streaming_response = await engine.astream_chat(user_message)
+                wsgi.record_retrieval(span, streaming_response)
+                # The background task that pulls the LLM stream and writes the answer to memory.
+                # Take it over: async_response_gen would otherwise wait for it to finish, even on disconnect.
+                writer = streaming_response.awrite_response_to_history_task
+                streaming_response.awrite_response_to_history_task = None
+                async for chunk in abatch_tokens(streaming_response.async_response_gen()):
+                    if not chunks:
+                        wsgi.record_first_token(span, request_start)
+                    chunks.append(chunk)
+                    yield wsgi.sse_event({'token': chunk})
+                await writer
+            finally:
+                active_streams -= 1
+                stream_slots.release()
+
+            wsgi.session_store.save(chat_session)
+            if cache_args is not None:
+                wsgi.semantic_cache.store(answer="".join(chunks), **cache_args)
+            yield wsgi.sse_event({'done': True})
+        except (asyncio.CancelledError, GeneratorExit):
+            # The client went away mid-answer: stop the LLM and forget the half-finished turn
+            span.set(disconnected=True)
+            if writer is not None:
+                await cancel_generation(streaming_response, writer)
+            chat_session.memory.set(history)
+            raise
+        except Exception as e:
+            print(f"❌ Error while streaming response: {e}")
+            span.status = "error"
+            span.set(error=type(e).__name__)
+            yield wsgi.sse_event({'error': str(e)})
+        finally:
+            chat_session.lock.release()
+            wsgi.end_turn_span(span, "".join(chunks))
+
+    return Response(stream_tokens(), mimetype='text/event-stream', headers=headers)
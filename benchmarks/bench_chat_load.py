@@ -0,0 +1,238 @@
+# benchmarks/bench_chat_load.py
+"""
+Load test for the chat server's /stream_ask with a stub streaming LLM
+(no network, no API key). Runs the Flask app (app.py, threaded dev server)
+or the ASGI app (asgi.py on hypercorn) in-process and opens many
+concurrent SSE streams against it.
+
+  load:        N clients each stream one full answer; time to first token,
+               total time, errors, peak threads in the process
+  disconnect:  N clients hang up after the first chunk; how many tokens the
+               LLM still generated for nobody
+
+Usage: python -m benchmarks.bench_chat_load [--server asgi|flask|both] [--clients 200]
+                                            [--tokens 100] [--json results.json]
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import threading
+import statistics
+import multiprocessing
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def setup_chat_app(tokens: int, first_token_latency: float, token_interval: float, index=None):
+    """Points app.py at an in-memory index (synthetic insights unless `index` is given) and the stub LLM."""
+    os.environ.setdefault("BAAZ_CACHE_DIR", tempfile.mkdtemp(prefix="baaz-load-"))
+    os.environ["SEMANTIC_CACHE"] = "0"  # every request should reach the LLM
+    os.environ["WARMUP_ON_START"] = "0"  # the index below replaces the real startup
+
+    from llama_index.core import Settings, MockEmbedding, VectorStoreIndex
+    from benchmarks.stub_llm import StubStreamingLLM
+    from benchmarks.synthetic import make_questions, make_insights
+    Settings.llm = StubStreamingLLM(tokens=tokens, first_token_latency=first_token_latency, token_interval=token_interval)
+    Settings.embed_model = MockEmbedding(embed_dim=384)
+
+    import app as wsgi
+    from src.router import QueryRouter
+    from src.task2_rag import split_insights, DEFAULT_STUDENT_ID
+    from src.insights_parser import InsightsNodeParser
+    if index is None:
+        documents = split_insights(make_insights(make_questions(10)), DEFAULT_STUDENT_ID)
+        index = VectorStoreIndex(InsightsNodeParser().get_nodes_from_documents(documents))
+    # Setting the globals up front makes initialize_rag_system a no-op
+    wsgi.rag_index = index
+    wsgi.query_router = QueryRouter(Settings.embed_model)
+    wsgi.start_warmup()
+    wsgi.rag_ready.wait()
+    return wsgi
+
+
+def start_server(kind: str, port: int):
+    """Starts the app in a background thread; returns a stop() callable."""
+    if kind == "flask":
+        import logging
+        from werkzeug.serving import make_server
+        import app as wsgi
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        server = make_server("127.0.0.1", port, wsgi.app, threaded=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        return server.shutdown
+
+    from hypercorn.config import Config
+    from hypercorn.asyncio import serve
+    import asgi
+    config = Config()
+    config.bind = [f"127.0.0.1:{port}"]
+    config.accesslog = None
+    config.backlog = 4096
+    loop = asyncio.new_event_loop()
+    shutdown = asyncio.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(serve(asgi.app, config, shutdown_trigger=shutdown.wait))
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+
+    def stop():
+        loop.call_soon_threadsafe(shutdown.set)
+        thread.join(timeout=5)
+    return stop
+
+
+async def one_client(base_url: str, message: str, hang_up_after_first: bool) -> dict:
+    import httpx
+    result = {"ttft": None, "total": None, "error": None}
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        await client.get("/", params={"student": "default"})
+        start = time.perf_counter()
+        async with client.stream("GET", "/stream_ask", params={"message": message}) as response:
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                event = json.loads(line[len("data: "):])
+                if "error" in event:
+                    result["error"] = event["error"]
+                    break
+                if "token" in event and result["ttft"] is None:
+                    result["ttft"] = time.perf_counter() - start
+                    if hang_up_after_first:
+                        break
+                if event.get("done"):
+                    result["total"] = time.perf_counter() - start
+                    break
+    return result
+
+
+def percentile(values: list, pct: float) -> float:
+    values = sorted(values)
+    return values[max(0, int(len(values) * pct) - 1)] if values else float("nan")
+
+
+async def gather_clients(base_url: str, clients: int, hang_up_after_first: bool) -> list:
+    message = "Why did I lose marks overall?"
+    results = await asyncio.gather(*(one_client(base_url, message, hang_up_after_first) for _ in range(clients)),
+                                   return_exceptions=True)
+    return [r if isinstance(r, dict) else {"ttft": None, "total": None, "error": repr(r)} for r in results]
+
+
+def run_clients(base_url: str, clients: int, hang_up_after_first: bool = False) -> list:
+    """Runs the clients in their own process so they don't compete with the server for the GIL."""
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(_run_clients, (base_url, clients, hang_up_after_first))
+
+
+def _run_clients(base_url: str, clients: int, hang_up_after_first: bool) -> list:
+    return asyncio.run(gather_clients(base_url, clients, hang_up_after_first))
+
+
+def load_scenario(base_url: str, clients: int) -> dict:
+    peak_threads = threading.active_count()
+    sampling = True
+
+    def sample():
+        nonlocal peak_threads
+        while sampling:
+            peak_threads = max(peak_threads, threading.active_count())
+            time.sleep(0.02)
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+
+    start = time.perf_counter()
+    results = run_clients(base_url, clients)
+    wall = time.perf_counter() - start
+    sampling = False
+    sampler.join()
+
+    completed = [r for r in results if r["total"] is not None]
+    ttft = [r["ttft"] for r in completed]
+    totals = [r["total"] for r in completed]
+    return {
+        "clients": clients,
+        "completed": len(completed),
+        "errors": clients - len(completed),
+        "wall_s": round(wall, 3),
+        "ttft_p50_ms": round(statistics.median(ttft) * 1000, 1) if ttft else None,
+        "ttft_p95_ms": round(percentile(ttft, 0.95) * 1000, 1) if ttft else None,
+        "ttft_p99_ms": round(percentile(ttft, 0.99) * 1000, 1) if ttft else None,
+        "total_p50_ms": round(statistics.median(totals) * 1000, 1) if totals else None,
+        "total_p95_ms": round(percentile(totals, 0.95) * 1000, 1) if totals else None,
+        "total_p99_ms": round(percentile(totals, 0.99) * 1000, 1) if totals else None,
+        "peak_threads": peak_threads,
+    }
+
+
+def disconnect_scenario(base_url: str, clients: int, tokens: int, settle: float) -> dict:
+    from benchmarks.stub_llm import STATS
+    before = STATS["tokens_generated"]
+    run_clients(base_url, clients, hang_up_after_first=True)
+    time.sleep(settle)
+    generated = STATS["tokens_generated"] - before
+    return {
+        "clients": clients,
+        "tokens_if_not_cancelled": clients * tokens,
+        "tokens_generated": generated,
+        "streams_still_running": STATS["active_streams"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--server", choices=["asgi", "flask", "both"], default="both")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--tokens", type=int, default=100, help="tokens per stub answer")
+    parser.add_argument("--first-token-latency", type=float, default=0.3)
+    parser.add_argument("--token-interval", type=float, default=0.02)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    setup_chat_app(args.tokens, args.first_token_latency, args.token_interval)
+    answer_time = args.first_token_latency + args.tokens * args.token_interval
+    print(f"Stub LLM: {args.tokens} tokens, ~{answer_time:.1f}s per answer; {args.clients} concurrent clients\n")
+
+    results = {}
+    for kind in (["asgi", "flask"] if args.server == "both" else [args.server]):
+        port = free_port()
+        stop = start_server(kind, port)
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            load = load_scenario(base_url, args.clients)
+            disconnect = disconnect_scenario(base_url, args.clients, args.tokens, settle=answer_time)
+        finally:
+            stop()
+        results[kind] = {"load": load, "disconnect": disconnect}
+
+        print(f"[{kind}] load:       {load['completed']}/{load['clients']} completed, {load['errors']} errors, "
+              f"wall {load['wall_s']}s, TTFT p50 {load['ttft_p50_ms']} ms / p95 {load['ttft_p95_ms']} ms, "
+              f"total p50 {load['total_p50_ms']} ms / p95 {load['total_p95_ms']} ms, peak threads {load['peak_threads']}")
+        print(f"[{kind}] disconnect: {disconnect['tokens_generated']} of {disconnect['tokens_if_not_cancelled']} tokens "
+              f"generated after early hang-ups, {disconnect['streams_still_running']} streams still running\n")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+# benchmarks/bench_e2e.py
+"""
+End-to-end offline benchmark: the whole pipeline on synthetic data, with no
+network and no API key.
+
+  ocr:       OCR pages/sec over rendered answer pages (preprocessing only if
+             Tesseract isn't installed; the OCR cache is then seeded with the
+             pages' ground-truth text so the later stages still get answers)
+  insights:  generate-cohort (model answers, parse, grading) against the fake
+             Gemini model from bench_grading, under the real scheduler;
+             insights per minute, LLM requests and time by stage (OCR cached)
+  index:     building the vector index over the cohort's insights, reloading
+             it unchanged, and re-syncing after one student's insights change
+  chat:      N concurrent SSE clients against the chat server (stub streaming
+             LLM) over that index; time to first token and total p50/p95/p99
+
+Results are written as JSON; with --baseline, every timing and throughput
+metric is compared against an earlier run and the exit code is 1 if any got
+worse by more than --tolerance.
+
+Usage: python -m benchmarks.bench_e2e [--questions 10] [--students 4] [--clients 50]
+                                      [--server asgi|flask|both] [--rpm 600]
+                                      [--json results.json] [--baseline old.json] [--tolerance 0.2]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+from pathlib import Path
+
+
+def ocr_stage(page_paths: list, page_texts: dict) -> dict:
+    from src.utils import ocr_pages, preprocess_image_for_ocr, read_image_bytes, get_ocr_cache, ocr_cache_key
+    from benchmarks.bench_ocr import tesseract_available
+
+    start = time.perf_counter()
+    if tesseract_available():
+        for _ in ocr_pages(page_paths):
+            pass
+        stage = "preprocess + tesseract"
+    else:
+        for path in page_paths:
+            preprocess_image_for_ocr(read_image_bytes(path))
+        stage = "preprocess only (Tesseract not installed)"
+    elapsed = time.perf_counter() - start
+
+    if stage.startswith("preprocess only"):
+        cache = get_ocr_cache()
+        for path in page_paths:
+            cache.set(ocr_cache_key(read_image_bytes(path)), page_texts[str(path)])
+    return {
+        "stage": stage,
+        "pages": len(page_paths),
+        "wall_s": round(elapsed, 3),
+        "pages_per_s": round(len(page_paths) / elapsed, 2),
+    }
+
+
+def insights_stage(exam_dir: Path, students: int, workers: int, fake) -> dict:
+    from src import telemetry
+    from src.task1_generate_model_ans import generate_cohort, COHORT_INSIGHTS_DIR
+
+    fake.calls = 0
+    start = time.perf_counter()
+    generate_cohort(str(exam_dir), workers)
+    elapsed = time.perf_counter() - start
+    written = len(list((exam_dir / COHORT_INSIGHTS_DIR).glob("*.txt")))
+    return {
+        "students": students,
+        "insights_written": written,
+        "wall_s": round(elapsed, 3),
+        "insights_per_min": round(written / elapsed * 60, 2),
+        "llm_requests": fake.calls,
+        "stages": {
+            name: {"count": entry["count"], "total_s": round(entry["total_s"], 3)}
+            for name, entry in telemetry.span_summary().items()
+        },
+    }
+
+
+def index_stage(data_dir: Path, storage_dir: Path, exam_dir: Path, embed_model: str):
+    """Returns (results, index) where index is the built index, for the chat stage."""
+    from llama_index.core import Settings, MockEmbedding
+    from src import task2_rag
+    from src.task1_generate_model_ans import COHORT_INSIGHTS_DIR
+
+    if embed_model == "hf":
+        task2_rag.configure_models()
+    else:
+        Settings.embed_model = MockEmbedding(embed_dim=384)
+    task2_rag.DATA_DIR = data_dir
+    task2_rag.INSIGHTS_FILE = data_dir / "insights.txt"
+    task2_rag.PERSIST_DIR = storage_dir
+    task2_rag.MANIFEST_FILE = storage_dir / "manifest.json"
+
+    # The chat clients talk to the default student: give it the first student's insights
+    insight_files = sorted((exam_dir / COHORT_INSIGHTS_DIR).glob("*.txt"))
+    shutil.copy(insight_files[0], task2_rag.INSIGHTS_FILE)
+
+    results = {"embed_model": embed_model, "insight_files": len(insight_files) + 1}
+    start = time.perf_counter()
+    task2_rag.load_index()
+    results["cold_build_s"] = round(time.perf_counter() - start, 3)
+
+    start = time.perf_counter()
+    task2_rag.load_index()
+    results["unchanged_reload_s"] = round(time.perf_counter() - start, 3)
+
+    # One question of one student changes, as after re-grading a single answer
+    with open(insight_files[-1], "a", encoding="utf-8") as f:
+        f.write("\nRe-graded after review.\n")
+    start = time.perf_counter()
+    index = task2_rag.load_index()
+    results["one_file_changed_s"] = round(time.perf_counter() - start, 3)
+    return results, index
+
+
+def chat_stage(index, servers: list, clients: int, tokens: int, first_token_latency: float, token_interval: float) -> dict:
+    from benchmarks.bench_chat_load import setup_chat_app, start_server, load_scenario, free_port
+
+    setup_chat_app(tokens, first_token_latency, token_interval, index=index)
+    results = {}
+    for kind in servers:
+        port = free_port()
+        stop = start_server(kind, port)
+        try:
+            results[kind] = load_scenario(f"http://127.0.0.1:{port}", clients)
+        finally:
+            stop()
+    return results
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def direction(metric: str):
+    """'higher' or 'lower' is better, or None for metrics that aren't compared (counts, sizes)."""
+    if metric.endswith(("_per_s", "_per_min")):
+        return "higher"
+    if metric.endswith(("_s", "_ms")) and ".stages." not in metric:
+        return "lower"
+    return None
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Returns [(metric, old, new, change)] for metrics that got worse by more than `tolerance`."""
+    old, new = flatten(baseline), flatten(results)
+    regressions = []
+    for metric, value in new.items():
+        better = direction(metric)
+        if better is None or not old.get(metric):
+            continue
+        change = (value - old[metric]) / old[metric]
+        if (better == "lower" and change > tolerance) or (better == "higher" and -change > tolerance):
+            regressions.append((metric, old[metric], value, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--students", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=4, help="students graded in parallel")
+    parser.add_argument("--rpm", type=float, default=600, help="GEMINI_RPM for the scheduler")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="fake Gemini first-token latency")
+    parser.add_argument("--tokens-per-second", type=float, default=2000, help="fake Gemini output speed")
+    parser.add_argument("--embed-model", choices=["mock", "hf"], default="mock",
+                        help="mock: deterministic stub embeddings; hf: the real bge-small model")
+    parser.add_argument("--server", choices=["asgi", "flask", "both"], default="asgi")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--tokens", type=int, default=50, help="tokens per stub chat answer")
+    parser.add_argument("--first-token-latency", type=float, default=0.2)
+    parser.add_argument("--token-interval", type=float, default=0.01)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown before it counts as a regression")
+    parser.add_argument("--keep", action="store_true", help="keep the synthetic data directory")
+    args = parser.parse_args()
+
+    work_dir = Path(tempfile.mkdtemp(prefix="baaz-e2e-"))
+    # Before any src import: caches live in the scratch directory, every run starts cold
+    os.environ.update({
+        "GEMINI_API_KEY": "fake-key",
+        "GEMINI_RPM": str(args.rpm),
+        "BAAZ_CACHE_DIR": str(work_dir / "cache"),
+    })
+    from src import llm_client
+    from benchmarks.bench_grading import FakeGeminiModel
+    from benchmarks.synthetic import write_exam, make_answer_lines, split_pages
+
+    data_dir = work_dir / "data"
+    exam_dir = data_dir / "exam_e2e"
+    questions = write_exam(exam_dir, args.questions, args.students)
+    page_paths, page_texts = [], {}
+    for student in range(args.students):
+        student_dir = exam_dir / f"student_{student + 1:03d}"
+        pages = split_pages(make_answer_lines(questions, seed=student))
+        for page_number, lines in enumerate(pages, start=1):
+            path = student_dir / f"page_{page_number:02d}.png"
+            page_paths.append(path)
+            page_texts[str(path)] = "\n".join(lines)
+
+    fake = FakeGeminiModel(args.llm_latency, args.tokens_per_second, feedback_tokens=400, invalid_rate=0.0)
+    llm_client.get_model = lambda: fake
+
+    results = {}
+    try:
+        print(f"\n=== OCR: {len(page_paths)} pages ===")
+        results["ocr"] = ocr_stage(page_paths, page_texts)
+        print(f"\n=== Insights: {args.students} students x {args.questions} questions ===")
+        results["insights"] = insights_stage(exam_dir, args.students, args.workers, fake)
+        print("\n=== Index ===")
+        results["index"], index = index_stage(data_dir, work_dir / "storage", exam_dir, args.embed_model)
+        print(f"\n=== Chat: {args.clients} concurrent clients ===")
+        servers = ["asgi", "flask"] if args.server == "both" else [args.server]
+        results["chat"] = chat_stage(index, servers, args.clients, args.tokens, args.first_token_latency, args.token_interval)
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    ocr, insights, index_results = results["ocr"], results["insights"], results["index"]
+    print("\n=== Summary ===")
+    print(f"OCR       {ocr['pages_per_s']:8.2f} pages/s  ({ocr['stage']})")
+    print(f"Insights  {insights['insights_per_min']:8.2f} per minute  ({insights['insights_written']}/{insights['students']} "
+          f"written, {insights['llm_requests']} LLM requests, {insights['wall_s']}s)")
+    print(f"Index     cold {index_results['cold_build_s']}s, unchanged {index_results['unchanged_reload_s']}s, "
+          f"one file changed {index_results['one_file_changed_s']}s ({args.embed_model} embeddings)")
+    for kind, chat in results["chat"].items():
+        print(f"Chat      [{kind}] {chat['completed']}/{chat['clients']} completed; TTFT p50 {chat['ttft_p50_ms']} / "
+              f"p99 {chat['ttft_p99_ms']} ms; total p50 {chat['total_p50_ms']} / p99 {chat['total_p99_ms']} ms")
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} metric(s) worse than {args.baseline} by more than {args.tolerance:.0%}:")
+            for metric, old, new, change in regressions:
+                print(f"   {metric}: {old} -> {new} ({change:+.0%})")
+            return 1
+        print(f"\n✅ No metric worse than {args.baseline} by more than {args.tolerance:.0%}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
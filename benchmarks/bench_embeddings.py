@@ -0,0 +1,169 @@
+# benchmarks/bench_embeddings.py
+"""
+Embedding backends compared on synthetic insights chunks:
+
+  hf         HuggingFaceEmbedding (sentence-transformers on torch, fp32), the default backend
+  onnx-fp32  OnnxEmbedding on the exported fp32 model
+  onnx-int8  OnnxEmbedding on the int8 quantized model
+
+For each: indexing throughput (chunks/sec), query embedding latency on
+first sight and when repeated (served from the LRU cache on the ONNX
+backends), and recall@k of its top-k chunks per query against the top-k of
+the reference backend (hf if it loads, else onnx-fp32).
+
+Needs the ONNX export first (python main.py export-onnx-embed-model); hf
+loads EMBED_MODEL_PATH or downloads the model from the Hub.
+
+Usage: python -m benchmarks.bench_embeddings [--students 20] [--questions 10] [--queries 200] [--k 5]
+                                             [--batch-size 32] [--threads 0] [--onnx-dir models/bge-small-en-v1.5-onnx]
+                                             [--backends hf,onnx-fp32,onnx-int8] [--json results.json]
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+from pathlib import Path
+import numpy as np
+from llama_index.core.schema import MetadataMode
+
+
+def make_corpus(students: int, questions: int) -> list:
+    """Chunk texts as they are embedded when the index is built, for a synthetic cohort."""
+    from src.task2_rag import split_insights
+    from src.insights_parser import InsightsNodeParser
+    from benchmarks.synthetic import make_questions, make_insights
+
+    exam = make_questions(questions)
+    parser = InsightsNodeParser()
+    texts = []
+    for student in range(students):
+        documents = split_insights(make_insights(exam, seed=student), f"exam/student_{student + 1:03d}")
+        texts.extend(node.get_content(metadata_mode=MetadataMode.EMBED) for node in parser.get_nodes_from_documents(documents))
+    return texts
+
+
+def make_queries(count: int, questions: int, seed: int = 0) -> list:
+    from benchmarks.synthetic import TOPICS
+
+    rng = random.Random(seed)
+    templates = [
+        "Why did I lose marks on question {q}?",
+        "What should I revisit about {topic}?",
+        "How can I improve my answer on {topic} in question {q}?",
+        "Which concepts did I miss in question {q}?",
+        "Can you give me an example of {topic}?",
+    ]
+    return [rng.choice(templates).format(q=rng.randint(1, questions), topic=rng.choice(TOPICS)) for _ in range(count)]
+
+
+def load_backend(name: str, args):
+    """Returns the embedding model, or None with a message if this backend isn't available here."""
+    from src import task2_rag
+    try:
+        if name == "hf":
+            from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+            from src.onnx_embedding import BGE_QUERY_INSTRUCTION
+            # Explicit: with a local EMBED_MODEL_PATH llama-index wouldn't know to add the bge instruction
+            return HuggingFaceEmbedding(model_name=task2_rag.EMBED_MODEL_PATH or task2_rag.EMBED_MODEL_NAME,
+                                        query_instruction=BGE_QUERY_INSTRUCTION, embed_batch_size=args.batch_size)
+        from src.onnx_embedding import OnnxEmbedding, QUANTIZED_MODEL_FILE
+        if name == "onnx-int8" and not (Path(args.onnx_dir) / QUANTIZED_MODEL_FILE).exists():
+            raise FileNotFoundError(f"no {QUANTIZED_MODEL_FILE} in {args.onnx_dir}")
+        return OnnxEmbedding(args.onnx_dir, batch_size=args.batch_size, threads=args.threads,
+                             quantized=(name == "onnx-int8"))
+    except Exception as e:
+        print(f"⚠️ Skipping {name}: {type(e).__name__}: {e}")
+        return None
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def query_latencies(model, queries: list) -> list:
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        model.get_query_embedding(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def top_k(chunk_vectors: np.ndarray, query_vectors: np.ndarray, k: int) -> list:
+    scores = query_vectors @ chunk_vectors.T
+    return [set(np.argsort(-row)[:k]) for row in scores]
+
+
+def run_backend(model, texts: list, queries: list) -> tuple:
+    """Returns (results, chunk vectors, query vectors)."""
+    model.get_text_embedding_batch(texts[:8])  # warm-up: session init, allocator, caches
+    start = time.perf_counter()
+    chunk_vectors = np.array(model.get_text_embedding_batch(texts), dtype=np.float32)
+    elapsed = time.perf_counter() - start
+
+    distinct = list(dict.fromkeys(queries))
+    cold = query_latencies(model, distinct)
+    repeated = query_latencies(model, distinct)
+    query_vectors = np.array([model.get_query_embedding(query) for query in distinct], dtype=np.float32)
+    results = {
+        "chunks": len(texts),
+        "index_s": round(elapsed, 3),
+        "chunks_per_s": round(len(texts) / elapsed, 1),
+        "query_p50_ms": round(statistics.median(cold), 2),
+        "query_p95_ms": round(percentile(cold, 0.95), 2),
+        "repeated_query_p50_ms": round(statistics.median(repeated), 3),
+    }
+    return results, chunk_vectors, query_vectors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=20)
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5, help="top-k for recall")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=0, help="onnxruntime intra-op threads (0: its default)")
+    parser.add_argument("--onnx-dir", default="models/bge-small-en-v1.5-onnx")
+    parser.add_argument("--backends", default="hf,onnx-fp32,onnx-int8")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    texts = make_corpus(args.students, args.questions)
+    queries = make_queries(args.queries, args.questions)
+    print(f"{len(texts)} chunks, {len(set(queries))} distinct queries")
+
+    results, rankings = {}, {}
+    for name in args.backends.split(","):
+        model = load_backend(name, args)
+        if model is None:
+            continue
+        print(f"\n=== {name} ===")
+        results[name], chunk_vectors, query_vectors = run_backend(model, texts, queries)
+        rankings[name] = top_k(chunk_vectors, query_vectors, args.k)
+    if not results:
+        print("\n❌ No backend could be loaded.")
+        return 1
+
+    reference = next(name for name in ("hf", "onnx-fp32", *results) if name in rankings)
+    for name, ranking in rankings.items():
+        overlaps = [len(ours & theirs) / args.k for ours, theirs in zip(ranking, rankings[reference])]
+        results[name][f"recall_at_{args.k}_vs_{reference}"] = round(statistics.mean(overlaps), 4)
+
+    print(f"\n{'backend':<11} {'chunks/s':>9} {'query p50':>10} {'query p95':>10} {'repeated':>9}  recall@{args.k} vs {reference}")
+    for name, result in results.items():
+        print(f"{name:<11} {result['chunks_per_s']:9.1f} {result['query_p50_ms']:8.2f}ms {result['query_p95_ms']:8.2f}ms "
+              f"{result['repeated_query_p50_ms']:7.3f}ms  {result[f'recall_at_{args.k}_vs_{reference}']:.3f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "reference": reference, "results": results}, f, indent=2)
+        print(f"\nResults written to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
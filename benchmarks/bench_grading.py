@@ -0,0 +1,151 @@
+# benchmarks/bench_grading.py
+"""
+Requests and wall-clock time to grade one student's paper:
+
+  per-question: one parse request, then one grading request per question
+  batched:      a few JSON "find + grade" requests packed to GRADING_BATCH_TOKENS,
+                with per-question fallback for entries that fail validation
+
+Runs task1.grade_answers through the real llm_client and scheduler (RPM/TPM
+quota, concurrency), with a fake Gemini model whose latency grows with the
+output length. --invalid-rate makes that share of batched entries malformed
+to exercise the fallback.
+
+Usage: python -m benchmarks.bench_grading [--questions 20] [--rpm 10] [--tokens-per-second 250]
+                                          [--invalid-rate 0.0] [--json results.json]
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGeminiModel:
+    """
+    Answers the three prompt kinds the pipeline sends (parse, per-question
+    grading, batched JSON grading) after first_token_latency plus the time
+    to "generate" the output at tokens_per_second.
+    """
+    FEEDBACK = ("The answer states the definition correctly but does not compare the two concepts, "
+                "which the question asks for explicitly. ")
+
+    def __init__(self, first_token_latency: float, tokens_per_second: float, feedback_tokens: int,
+                 invalid_rate: float, seed: int = 0):
+        self.first_token_latency = first_token_latency
+        self.tokens_per_second = tokens_per_second
+        self.feedback_tokens = feedback_tokens
+        self.invalid_rate = invalid_rate
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _feedback(self) -> str:
+        repeats = max(1, self.feedback_tokens * 4 // len(self.FEEDBACK))
+        return self.FEEDBACK * repeats
+
+    def _batched(self, prompt: str) -> str:
+        ids = [int(i) for i in re.findall(r"\*\*Question ID:\*\* (\d+)", prompt)]
+        entries = []
+        for question_id in ids:
+            with self._lock:
+                broken = self.rng.random() < self.invalid_rate
+            entry = {
+                "question_id": question_id,
+                "student_answer": f"Answer text for question {question_id}.",
+                "overall_summary": self._feedback(),
+                "positive_points": ["The definition is correct."],
+                "areas_for_improvement": [{"error_type": "Omission", "student_wrote": "uses memory",
+                                           "correction": "Explain how, and compare with the alternative."}],
+                "actionable_path": "Practise a two-line comparison.",
+            }
+            if broken:
+                del entry["positive_points"]
+            entries.append(entry)
+        return json.dumps({"questions": entries})
+
+    def generate_content(self, prompt: str, generation_config: dict = None) -> FakeResponse:
+        with self._lock:
+            self.calls += 1
+        if generation_config and generation_config.get("response_mime_type") == "application/json":
+            text = self._batched(prompt)
+        elif "text structuring expert" in prompt:
+            ids = re.search(r"question numbers are: \[([\d, ]+)\]", prompt).group(1).split(",")
+            text = json.dumps({i.strip(): f"Answer text for question {i.strip()}." for i in ids})
+        else:
+            text = self._feedback()
+        time.sleep(self.first_token_latency + len(text) / 4 / self.tokens_per_second)
+        return FakeResponse(text)
+
+
+def run(mode: str, fake: FakeGeminiModel, questions, graded, model_answers, script_text) -> dict:
+    from src import scheduler
+    from src.task1_generate_model_ans import grade_answers
+    scheduler._scheduler = None  # fresh quota for each run
+    fake.calls = 0
+    start = time.perf_counter()
+    insights = grade_answers(script_text, questions, graded, model_answers, mode=mode)
+    return {
+        "requests": fake.calls,
+        "wall_s": round(time.perf_counter() - start, 2),
+        "graded": len(insights or {}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--rpm", type=float, default=10, help="GEMINI_RPM for the scheduler")
+    parser.add_argument("--first-token-latency", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=250)
+    parser.add_argument("--feedback-tokens", type=int, default=600, help="output tokens per question's feedback")
+    parser.add_argument("--invalid-rate", type=float, default=0.0)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    os.environ.update({
+        "GEMINI_API_KEY": "fake-key",
+        "GEMINI_RPM": str(args.rpm),
+        "BAAZ_CACHE_DIR": tempfile.mkdtemp(prefix="baaz-grading-"),
+        "LLM_CACHE_BYPASS": "1",
+    })
+    from src import llm_client
+    from benchmarks.synthetic import make_questions, make_answer_lines
+
+    fake = FakeGeminiModel(args.first_token_latency, args.tokens_per_second, args.feedback_tokens, args.invalid_rate)
+    llm_client.get_model = lambda: fake
+
+    questions = make_questions(args.questions)
+    model_answers = {q["id"]: f"Model answer for question {q['id']}. " * 40 for q in questions}
+    script_text = "\n".join(make_answer_lines(questions))
+
+    results = {}
+    for mode in ("per-question", "batched"):
+        print(f"\n=== {mode} ===")
+        results[mode] = run(mode, fake, questions, questions, model_answers, script_text)
+
+    print(f"\n{args.questions} questions, GEMINI_RPM={args.rpm:g}, {args.tokens_per_second:g} output tokens/s, "
+          f"invalid batched entries {args.invalid_rate:.0%}")
+    for mode, result in results.items():
+        print(f"{mode:<13} {result['requests']:3d} requests  {result['wall_s']:7.2f}s  ({result['graded']} graded)")
+    before, after = results["per-question"], results["batched"]
+    print(f"batched: {before['requests'] / after['requests']:.1f}x fewer requests, "
+          f"{before['wall_s'] / after['wall_s']:.1f}x faster")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
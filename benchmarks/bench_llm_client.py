@@ -0,0 +1,65 @@
+# benchmarks/bench_llm_client.py
+"""
+Per-call client overhead against the local stub Gemini server.
+
+  before: genai.configure() + a new GenerativeModel for every prompt (the old get_gemini_response)
+  after:  the shared model from llm_client.get_model()
+
+Usage: python -m benchmarks.bench_llm_client [--calls 200]
+"""
+import os
+import time
+import argparse
+import statistics
+from benchmarks.stub_gemini_server import start_stub_server
+
+
+def summarize(label, timings, connections):
+    timings_ms = sorted(t * 1000 for t in timings)
+    p95 = timings_ms[int(len(timings_ms) * 0.95) - 1]
+    print(f"{label:<8} mean {statistics.mean(timings_ms):7.2f} ms   p50 {statistics.median(timings_ms):7.2f} ms   "
+          f"p95 {p95:7.2f} ms   connections opened: {connections}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    server = start_stub_server()
+    endpoint = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ.update({
+        "GEMINI_API_KEY": "stub-key",
+        "GEMINI_API_ENDPOINT": endpoint,
+        "GEMINI_TRANSPORT": "rest",
+        "GEMINI_RPM": "1000000",
+    })
+
+    import google.generativeai as genai
+    from src import llm_client
+
+    prompt = "Explain the difference between a process and a thread."
+
+    # Before: reconfigure and rebuild the model on every call
+    timings = []
+    server.connections = 0
+    for _ in range(args.calls):
+        start = time.perf_counter()
+        genai.configure(api_key="stub-key", transport="rest", client_options={"api_endpoint": endpoint})
+        model = genai.GenerativeModel(model_name=llm_client.MODEL_NAME, generation_config=llm_client.GENERATION_CONFIG)
+        model.generate_content(prompt).text
+        timings.append(time.perf_counter() - start)
+    summarize("before", timings, server.connections)
+
+    # After: one model (and connection pool) for the whole process
+    timings = []
+    server.connections = 0
+    for _ in range(args.calls):
+        start = time.perf_counter()
+        llm_client.generate(prompt, use_cache=False)
+        timings.append(time.perf_counter() - start)
+    summarize("after", timings, server.connections)
+
+
+if __name__ == "__main__":
+    main()
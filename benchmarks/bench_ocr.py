@@ -0,0 +1,114 @@
+# benchmarks/bench_ocr.py
+"""
+OCR preprocessing benchmark over a synthetic page set.
+
+  legacy:   cv2.imread (colour) -> cvtColor -> Otsu -> medianBlur -> pytesseract (temp files)
+  inmemory: bytes -> grayscale decode -> downscale oversized pages -> Otsu -> medianBlur
+            -> tesserocr / tesseract stdin
+
+Each mode runs in its own process so peak RSS is measured separately.
+If Tesseract isn't installed, only the preprocessing stage is timed.
+
+Usage: python -m benchmarks.bench_ocr [--pages 8] [--oversized 4] [--json results.json]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+from pathlib import Path
+
+
+def tesseract_available() -> bool:
+    from src import utils
+    return utils.tesserocr is not None or shutil.which(utils.pytesseract.pytesseract.tesseract_cmd) is not None
+
+
+def run_mode(mode: str, page_dir: str) -> dict:
+    import cv2
+    import pytesseract
+    from src import utils
+
+    pages = sorted(Path(page_dir).glob("*.png"))
+    with_tesseract = tesseract_available()
+    preprocess_time = tesseract_time = 0.0
+
+    for page in pages:
+        start = time.perf_counter()
+        if mode == "legacy":
+            image = cv2.imread(str(page))
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+            binary = cv2.medianBlur(binary, 3)
+        else:
+            binary = utils.preprocess_image_for_ocr(utils.read_image_bytes(str(page)))
+        preprocess_time += time.perf_counter() - start
+
+        if with_tesseract:
+            start = time.perf_counter()
+            if mode == "legacy":
+                pytesseract.image_to_string(binary)
+            else:
+                utils.run_tesseract(binary)
+            tesseract_time += time.perf_counter() - start
+
+    # ru_maxrss is in KB on Linux, bytes on macOS
+    unit = 1 if sys.platform == "darwin" else 1024
+    return {
+        "mode": mode,
+        "pages": len(pages),
+        "tesseract": with_tesseract,
+        "preprocess_ms_per_page": 1000 * preprocess_time / len(pages),
+        "tesseract_ms_per_page": 1000 * tesseract_time / len(pages) if with_tesseract else None,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit / 2**20,
+        "peak_child_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit / 2**20,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=8, help="A4 pages at 300 DPI")
+    parser.add_argument("--oversized", type=int, default=4, help="extra A4 pages at 600 DPI")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--mode", help=argparse.SUPPRESS)
+    parser.add_argument("--page-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.page_dir)))
+        return
+
+    from benchmarks.synthetic import A4_300_DPI, make_questions, make_answer_lines, write_answer_pages
+
+    with tempfile.TemporaryDirectory() as page_dir:
+        lines = make_answer_lines(make_questions(20))
+        normal = write_answer_pages(Path(page_dir) / "normal", lines)[:args.pages]
+        big = write_answer_pages(Path(page_dir) / "big", lines, size=(A4_300_DPI[0] * 2, A4_300_DPI[1] * 2))[:args.oversized]
+        for i, path in enumerate(normal + big):
+            path.rename(Path(page_dir) / f"page_{i:03d}.png")
+
+        results = []
+        for mode in ("legacy", "inmemory"):
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_ocr", "--mode", mode, "--page-dir", page_dir],
+                capture_output=True, text=True, check=True, env=dict(os.environ, OCR_WORKERS="1"),
+            ).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+
+    if not results[0]["tesseract"]:
+        print("⚠️ Tesseract not found: timing preprocessing only.")
+    for r in results:
+        tesseract = f"{r['tesseract_ms_per_page']:8.1f}" if r["tesseract"] else "     n/a"
+        print(f"{r['mode']:<9} pages {r['pages']:3d}   preprocess {r['preprocess_ms_per_page']:7.1f} ms/page   "
+              f"tesseract {tesseract} ms/page   peak RSS {r['peak_rss_mb']:6.1f} MB (children {r['peak_child_rss_mb']:.1f} MB)")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# benchmarks/bench_segmentation.py
+"""
+Local answer segmentation vs the LLM parser, on synthetic answer scripts in
+the marker styles students use (and a few the segmenter should hand to the
+LLM): how often the segmenter is confident enough to skip the LLM, whether
+its segments are right when it is, and what the skipped parse would cost.
+
+The LLM parse echoes the whole script back as JSON, so its cost is
+estimated as first-token latency plus the script's tokens at
+--tokens-per-second.
+
+Usage: python -m benchmarks.bench_segmentation [--questions 20] [--scripts 50]
+                                               [--tokens-per-second 250] [--json results.json]
+"""
+import sys
+import json
+import time
+import random
+import argparse
+from src.answer_segmenter import segment_answers, SEGMENT_CONFIDENCE_THRESHOLD
+from src.scheduler import estimate_tokens
+from benchmarks.synthetic import make_questions, make_answer_lines
+
+# style -> (marker format, whether the segmenter is expected to be confident)
+STYLES = {
+    "Q1.": ("Q{id}.", True),
+    "Ans 1:": ("Ans {id}:", True),
+    "Question No. 1)": ("Question No. {id})", True),
+    "OCR-misread (Ql.)": ("Q{id}.", True),
+    "bare 1.": ("{id}.", True),
+    "bare 1. + numbered lists": ("{id}.", False),
+    "unmarked": ("", False),
+}
+OCR_MISREADS = str.maketrans({"1": "l", "0": "O"})
+
+
+def make_script(style: str, questions: list, seed: int):
+    """Returns (script text, {question_id: expected answer})."""
+    marker, _ = STYLES[style]
+    lines = make_answer_lines(questions, seed=seed, marker=marker or "{id}")
+    rng = random.Random(seed)
+    expected, current, script = {}, None, ["Name: Test Student", "Roll No: 42", ""]
+    for line in lines:
+        question_id = next((q['id'] for q in questions if line == marker.format(id=q['id'])), None) if marker else None
+        if question_id is not None:
+            current = question_id
+            if style.startswith("OCR") and rng.random() < 0.5:
+                line = line.translate(OCR_MISREADS)
+        elif not marker and line.isdigit():
+            continue  # unmarked: the answers simply follow each other
+        else:
+            if current is not None and line:
+                expected[current] = f"{expected.get(current, '')}\n{line}".strip()
+            if style.endswith("numbered lists") and line and rng.random() < 0.15:
+                script.append(f"{rng.randint(1, 3)}. {line}")
+                continue
+        script.append(line)
+    return "\n".join(script), expected
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--scripts", type=int, default=50, help="scripts per style")
+    parser.add_argument("--first-token-latency", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=250)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    questions = make_questions(args.questions)
+    results = {}
+    print(f"{args.scripts} scripts per style, {args.questions} questions, threshold {SEGMENT_CONFIDENCE_THRESHOLD:.2f}\n")
+    print(f"{'style':<26} {'local':>7} {'correct':>8} {'confidence':>11} {'ms/script':>10} {'LLM s saved':>12}")
+    for style, (_, expect_local) in STYLES.items():
+        local = correct = 0
+        confidences, elapsed, saved = [], 0.0, 0.0
+        for seed in range(args.scripts):
+            script, expected = make_script(style, questions, seed)
+            start = time.perf_counter()
+            answers, confidence = segment_answers(script, questions)
+            elapsed += time.perf_counter() - start
+            confidences.append(confidence)
+            if confidence >= SEGMENT_CONFIDENCE_THRESHOLD:
+                local += 1
+                correct += all(answers[q['id']] == expected.get(q['id']) for q in questions)
+                saved += args.first_token_latency + estimate_tokens(json.dumps(expected)) / args.tokens_per_second
+        results[style] = {
+            "expected_local": expect_local,
+            "local_rate": local / args.scripts,
+            "correct_when_local": correct / local if local else None,
+            "mean_confidence": round(sum(confidences) / len(confidences), 3),
+            "ms_per_script": round(1000 * elapsed / args.scripts, 3),
+            "llm_seconds_saved_per_script": round(saved / args.scripts, 2),
+        }
+        r = results[style]
+        accuracy = f"{r['correct_when_local']:.0%}" if local else "-"
+        print(f"{style:<26} {r['local_rate']:>7.0%} {accuracy:>8} {r['mean_confidence']:>11.2f} "
+              f"{r['ms_per_script']:>10.3f} {r['llm_seconds_saved_per_script']:>12.2f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
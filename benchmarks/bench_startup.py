@@ -0,0 +1,120 @@
+# benchmarks/bench_startup.py
+"""
+Cold-start time of the chat server: launches it as a fresh process and
+polls /healthz (process serving) and /readyz (models and index loaded,
+chat available). Prints the startup phases /readyz reports.
+
+Run it from the repo root with the real environment (GEMINI_API_KEY, data/);
+compare e.g. a Hub download against a local snapshot:
+
+  python -m benchmarks.bench_startup
+  EMBED_MODEL_PATH=models/bge-small-en-v1.5 python -m benchmarks.bench_startup
+
+Usage: python -m benchmarks.bench_startup [--server flask|asgi] [--runs 3] [--timeout 300] [--json results.json]
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.request
+import urllib.error
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def server_command(kind: str, port: int) -> list:
+    if kind == "asgi":
+        return [sys.executable, "-m", "hypercorn", "asgi:app", "--bind", f"127.0.0.1:{port}"]
+    return [sys.executable, "-m", "flask", "--app", "app", "run", "--port", str(port)]
+
+
+def get(url: str):
+    """Returns (status, JSON body), or (None, None) if nothing is listening yet."""
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"null")
+    except (urllib.error.URLError, ConnectionError, socket.timeout):
+        return None, None
+
+
+def seconds(value) -> str:
+    return f"{value}s" if value is not None else "-"
+
+
+def one_run(kind: str, timeout: float) -> dict:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    process = subprocess.Popen(server_command(kind, port), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    result = {"healthz_s": None, "ready_s": None, "status": "timeout", "error": None, "phases": {}}
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                result["status"] = f"exited with code {process.returncode}"
+                break
+            if result["healthz_s"] is None and get(f"{base_url}/healthz")[0] == 200:
+                result["healthz_s"] = round(time.perf_counter() - start, 3)
+            if result["healthz_s"] is not None:
+                status, body = get(f"{base_url}/readyz")
+                if status == 200 or (body or {}).get("status") == "failed":
+                    result["status"] = body["status"]
+                    result["error"] = body.get("error")
+                    result["phases"] = body.get("timings", {})
+                    if status == 200:
+                        result["ready_s"] = round(time.perf_counter() - start, 3)
+                    break
+            time.sleep(0.05)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--server", choices=["flask", "asgi"], default="flask")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=300, help="seconds to wait for /readyz per run")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    print(f"Cold starts of the {args.server} server; EMBED_MODEL_PATH={os.getenv('EMBED_MODEL_PATH') or '(Hub)'}\n")
+    runs = []
+    for i in range(args.runs):
+        result = one_run(args.server, args.timeout)
+        runs.append(result)
+        phases = ", ".join(f"{name} {value}s" for name, value in result["phases"].items())
+        print(f"run {i + 1}: /healthz {seconds(result['healthz_s'])}, /readyz {seconds(result['ready_s'])} "
+              f"({result['status']}) [{phases or result['error'] or ''}]")
+
+    ready = [r["ready_s"] for r in runs if r["ready_s"] is not None]
+    healthz = [r["healthz_s"] for r in runs if r["healthz_s"] is not None]
+    summary = {
+        "server": args.server,
+        "embed_model_path": os.getenv("EMBED_MODEL_PATH"),
+        "runs": runs,
+        "healthz_median_s": statistics.median(healthz) if healthz else None,
+        "ready_median_s": statistics.median(ready) if ready else None,
+        "ready_max_s": max(ready) if ready else None,
+    }
+    print(f"\n/healthz median {seconds(summary['healthz_median_s'])}; /readyz median {seconds(summary['ready_median_s'])}, "
+          f"max {seconds(summary['ready_max_s'])}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+# benchmarks/bench_vector_store.py
+"""
+Vector stores compared on a synthetic cohort of embeddings, one per
+insights section, tagged with student_id / question_id. The vectors are
+unit vectors scattered around topic centroids, clustered like real sentence
+embeddings (uniform random ones are a worst case for ANN graphs):
+
+  simple       LlamaIndex's SimpleVectorStore, persisted as JSON
+  memmap       MemmapVectorStore, float32
+  memmap-int8  MemmapVectorStore, int8
+  memmap-ann   MemmapVectorStore, float32 with an hnswlib graph (skipped without hnswlib)
+
+For each: persist time and size on disk, then, in a fresh process, load time,
+RSS added by the load and by querying, query latency filtered to one student
+(what a chat turn does) and over everyone, and recall@k of the unfiltered
+results against the exact float32 scan.
+
+Usage: python -m benchmarks.bench_vector_store [--students 1000] [--questions 10] [--dim 384] [--queries 50] [--k 10]
+                                               [--stores simple,memmap,memmap-int8,memmap-ann] [--json results.json]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import statistics
+from pathlib import Path
+import numpy as np
+
+# Graph for the unfiltered queries even on small runs; one student's rows are still scanned exactly
+ANN_MIN_CANDIDATES = 1000
+TOPICS = 200
+SECTIONS = ["Overall Summary", "Where Marks Were Lost", "Key Concepts to Revisit", "Actionable Path to Improvement"]
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def clustered_vectors(count: int, dim: int, rng, topics: int = TOPICS) -> np.ndarray:
+    centroids = np.random.default_rng(0).standard_normal((topics, dim)).astype(np.float32)
+    vectors = centroids[rng.integers(topics, size=count)] + 0.35 * rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_nodes(students: int, questions: int, dim: int, seed: int = 1) -> list:
+    from llama_index.core.schema import TextNode, NodeRelationship, RelatedNodeInfo
+
+    vectors = clustered_vectors(students * questions * len(SECTIONS), dim, np.random.default_rng(seed))
+    nodes, row = [], 0
+    for student in range(students):
+        student_id = f"exam/student_{student + 1:04d}"
+        for question in range(1, questions + 1):
+            doc_id = f"{student_id}:q{question}"
+            for section in SECTIONS:
+                node = TextNode(text="", id_=f"{doc_id}:{section}", embedding=vectors[row].tolist(),
+                                metadata={"student_id": student_id, "question_id": question, "section": section})
+                node.relationships[NodeRelationship.SOURCE] = RelatedNodeInfo(node_id=doc_id)
+                nodes.append(node)
+                row += 1
+    return nodes
+
+
+def new_store(kind: str):
+    from src.memmap_vector_store import MemmapVectorStore
+    from llama_index.core.vector_stores import SimpleVectorStore
+    if kind == "simple":
+        return SimpleVectorStore()
+    return MemmapVectorStore(dtype="int8" if kind == "memmap-int8" else "float32", use_ann=(kind == "memmap-ann"))
+
+
+def load_store(kind: str, store_dir: Path):
+    from src.memmap_vector_store import MemmapVectorStore
+    from llama_index.core.vector_stores import SimpleVectorStore
+    if kind == "simple":
+        return SimpleVectorStore.from_persist_path(str(store_dir / "default__vector_store.json"))
+    return MemmapVectorStore.from_persist_dir(store_dir, use_ann=(kind == "memmap-ann"))
+
+
+def worker(kind: str, store_dir: Path, students: int, dim: int, queries: int, k: int) -> dict:
+    """Runs in a fresh process: load, then query; returns timings, RSS and the unfiltered result ids."""
+    from llama_index.core.vector_stores import VectorStoreQuery, MetadataFilters, ExactMatchFilter
+
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    store = load_store(kind, store_dir)
+    load_s = time.perf_counter() - start
+    rss_loaded = rss_mb()
+
+    rng = np.random.default_rng(2)
+    query_vectors = clustered_vectors(queries, dim, rng)
+    filtered, unfiltered, ids = [], [], []
+    for i, vector in enumerate(query_vectors):
+        student_id = f"exam/student_{rng.integers(students) + 1:04d}"
+        query = VectorStoreQuery(query_embedding=vector.tolist(), similarity_top_k=k,
+                                 filters=MetadataFilters(filters=[ExactMatchFilter(key="student_id", value=student_id)]))
+        start = time.perf_counter()
+        store.query(query)
+        filtered.append((time.perf_counter() - start) * 1000)
+    rss_filtered = rss_mb()
+    for vector in query_vectors:
+        start = time.perf_counter()
+        result = store.query(VectorStoreQuery(query_embedding=vector.tolist(), similarity_top_k=k))
+        unfiltered.append((time.perf_counter() - start) * 1000)
+        ids.append(result.ids)
+    return {
+        "load_s": round(load_s, 4),
+        "load_rss_mb": round(rss_loaded - rss_before, 1),
+        "filtered_query_rss_mb": round(rss_filtered - rss_before, 1),
+        "total_rss_mb": round(rss_mb() - rss_before, 1),
+        "filtered_query_p50_ms": round(statistics.median(filtered), 3),
+        "unfiltered_query_p50_ms": round(statistics.median(unfiltered), 3),
+        "ids": ids,
+    }
+
+
+def dir_size_mb(path: Path) -> float:
+    return sum(f.stat().st_size for f in path.iterdir() if f.is_file()) / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--stores", default="simple,memmap,memmap-int8,memmap-ann")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--worker", nargs=2, metavar=("STORE", "DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(worker(args.worker[0], Path(args.worker[1]), args.students, args.dim, args.queries, args.k)))
+        return 0
+
+    from src import memmap_vector_store
+    kinds = args.stores.split(",")
+    if "memmap-ann" in kinds:
+        if memmap_vector_store.hnswlib is None:
+            print("⚠️ Skipping memmap-ann: hnswlib is not installed")
+            kinds.remove("memmap-ann")
+        else:
+            memmap_vector_store.ANN_MIN_CANDIDATES = ANN_MIN_CANDIDATES
+
+    nodes = make_nodes(args.students, args.questions, args.dim)
+    print(f"{len(nodes)} vectors ({args.students} students x {args.questions} questions x {len(SECTIONS)} sections), dim {args.dim}")
+
+    work_dir = Path(tempfile.mkdtemp(prefix="baaz-vectors-"))
+    results, ids = {}, {}
+    env = {**os.environ, "VECTOR_STORE_ANN_MIN_CANDIDATES": str(ANN_MIN_CANDIDATES)}
+    try:
+        for kind in kinds:
+            print(f"\n=== {kind} ===")
+            store_dir = work_dir / kind
+            store = new_store(kind)
+            start = time.perf_counter()
+            store.add(nodes)
+            store.persist(str(store_dir / "default__vector_store.json"))
+            persist_s = time.perf_counter() - start
+            del store
+
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_vector_store", "--worker", kind, str(store_dir),
+                 "--students", str(args.students), "--dim", str(args.dim), "--queries", str(args.queries), "--k", str(args.k)],
+                capture_output=True, text=True, check=True, env=env,
+            ).stdout.strip().splitlines()[-1]
+            measured = json.loads(output)
+            ids[kind] = measured.pop("ids")
+            results[kind] = {"add_and_persist_s": round(persist_s, 3), "disk_mb": round(dir_size_mb(store_dir), 1), **measured}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    reference = "memmap" if "memmap" in ids else next(iter(ids))
+    for kind in results:
+        overlaps = [len(set(ours) & set(theirs)) / args.k for ours, theirs in zip(ids[kind], ids[reference])]
+        results[kind][f"recall_at_{args.k}"] = round(statistics.mean(overlaps), 4)
+
+    print(f"\n{'store':<12} {'disk MB':>8} {'load':>9} {'load RSS':>9} {'RSS after':>10} {'1 student':>10} {'everyone':>10}  recall@{args.k} vs {reference}")
+    for kind, r in results.items():
+        print(f"{kind:<12} {r['disk_mb']:8.1f} {r['load_s']:8.3f}s {r['load_rss_mb']:7.1f}MB {r['total_rss_mb']:8.1f}MB "
+              f"{r['filtered_query_p50_ms']:8.2f}ms {r['unfiltered_query_p50_ms']:8.2f}ms  {r[f'recall_at_{args.k}']:.3f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+        print(f"\nResults written to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,38 @@
+# benchmarks/fake_llm.py
+import time
+import threading
+from collections import deque
+from src.scheduler import RateLimitError
+
+
+class FakeLLM:
+    """
+    Local stand-in for the Gemini API.
+
+    Each call sleeps for `latency` seconds and returns a deterministic answer.
+    The fake enforces its own sliding-window RPM quota and answers with a 429
+    carrying a Gemini-style retry hint when a caller goes over it.
+    """
+    def __init__(self, latency: float = 0.2, rpm: int = 60, window: float = 60.0):
+        self.latency = latency
+        self.rpm = rpm
+        self.window = window
+        self.calls = 0
+        self.rate_limited = 0
+        self._lock = threading.Lock()
+        self._recent = deque()
+
+    def __call__(self, prompt: str) -> str:
+        with self._lock:
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] >= self.window:
+                self._recent.popleft()
+            if len(self._recent) >= self.rpm:
+                self.rate_limited += 1
+                retry_in = self.window - (now - self._recent[0])
+                raise RateLimitError(f"429 Resource has been exhausted. Please retry in {retry_in:.2f}s.")
+            self._recent.append(now)
+            self.calls += 1
+
+        time.sleep(self.latency)
+        return f"Fake answer for prompt of {len(prompt)} characters: {prompt[-40:]}"
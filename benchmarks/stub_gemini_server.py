@@ -0,0 +1,81 @@
+# benchmarks/stub_gemini_server.py
+"""
+A tiny local server that speaks enough of the Gemini REST API
+(POST /v1beta/models/<model>:generateContent) for benchmarks.
+
+It keeps HTTP/1.1 connections alive and counts how many TCP connections
+clients open, which shows whether a client reuses its connection pool.
+
+Usage: python -m benchmarks.stub_gemini_server [--port 8765] [--latency 0.0]
+"""
+import json
+import time
+import socket
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out as separate writes; without TCP_NODELAY a
+        # kept-alive connection stalls ~40ms per call on Nagle + delayed ACK.
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server.stats_lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        prompt = ""
+        for content in body.get("contents", []):
+            for part in content.get("parts", []):
+                prompt += part.get("text", "")
+
+        payload = json.dumps({
+            "candidates": [{
+                "content": {"role": "model", "parts": [{"text": f"Stub answer ({len(prompt)} characters in prompt)."}]},
+                "finishReason": "STOP",
+                "index": 0,
+            }],
+            "usageMetadata": {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": 8},
+        }).encode("utf-8")
+
+        with self.server.stats_lock:
+            self.server.requests += 1
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(port: int = 0, latency: float = 0.0) -> ThreadingHTTPServer:
+    """Starts the stub in a daemon thread; the bound port is server.server_address[1]."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubGeminiHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.connections = 0
+    server.requests = 0
+    server.stats_lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    server = start_stub_server(args.port, args.latency)
+    print(f"Stub Gemini server listening on http://127.0.0.1:{server.server_address[1]}")
+    threading.Event().wait()
@@ -0,0 +1,77 @@
+# benchmarks/stub_llm.py
+"""
+A LlamaIndex LLM that streams a canned answer at a fixed pace, with no
+network, for load tests of the chat server. Counts the tokens it produces
+so tests can see generation stop when a client disconnects.
+"""
+import time
+import asyncio
+import threading
+from typing import Any
+from llama_index.core.llms import CustomLLM, CompletionResponse, LLMMetadata
+from llama_index.core.llms.callbacks import llm_completion_callback
+
+ANSWER = (
+    "You lost marks mainly because the answer defines the concept but never compares it, "
+    "and the question asks for both. Add one concrete example and a two-line comparison next time. "
+)
+
+# Shared by every StubStreamingLLM in the process
+STATS = {"tokens_generated": 0, "active_streams": 0}
+_stats_lock = threading.Lock()
+
+
+def count(tokens: int = 0, streams: int = 0):
+    with _stats_lock:
+        STATS["tokens_generated"] += tokens
+        STATS["active_streams"] += streams
+
+
+class StubStreamingLLM(CustomLLM):
+    first_token_latency: float = 0.3  # seconds before the first token
+    token_interval: float = 0.02      # seconds between tokens
+    tokens: int = 100                 # tokens per answer
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(model_name="stub-streaming-llm")
+
+    def _words(self):
+        words = ANSWER.split(" ")
+        return [words[i % len(words)] + " " for i in range(self.tokens)]
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        return CompletionResponse(text="".join(self._words()))
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+        def gen():
+            count(streams=1)
+            try:
+                text = ""
+                time.sleep(self.first_token_latency)
+                for word in self._words():
+                    time.sleep(self.token_interval)
+                    text += word
+                    count(tokens=1)
+                    yield CompletionResponse(text=text, delta=word)
+            finally:
+                count(streams=-1)
+        return gen()
+
+    @llm_completion_callback()
+    async def astream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+        async def gen():
+            count(streams=1)
+            try:
+                text = ""
+                await asyncio.sleep(self.first_token_latency)
+                for word in self._words():
+                    await asyncio.sleep(self.token_interval)
+                    text += word
+                    count(tokens=1)
+                    yield CompletionResponse(text=text, delta=word)
+            finally:
+                count(streams=-1)
+        return gen()
@@ -0,0 +1,101 @@
+# benchmarks/synthetic.py
+"""
+Synthetic exam data for benchmarks: questions.json files and rendered,
+typed-text answer page images.
+"""
+import json
+import random
+from pathlib import Path
+import cv2
+import numpy as np
+
+A4_300_DPI = (2480, 3508)
+
+TOPICS = [
+    "process", "thread", "deadlock", "semaphore", "paging", "virtual memory",
+    "scheduling", "context switch", "mutex", "file system", "cache", "interrupt",
+]
+
+
+def make_questions(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    return [
+        {
+            "id": i + 1,
+            "question": f"Explain the role of {rng.choice(TOPICS)} and compare it with {rng.choice(TOPICS)}.",
+            "max_marks": rng.choice([5, 10, 15]),
+        }
+        for i in range(count)
+    ]
+
+
+def make_answer_lines(questions: list, lines_per_answer: int = 12, seed: int = 0, marker: str = "Q{id}.") -> list:
+    """Answer-script text with a marker line ('Q<n>.' by default) before each answer, as a student would type it."""
+    rng = random.Random(seed)
+    lines = []
+    for q in questions:
+        lines.append(marker.format(id=q['id']))
+        for _ in range(lines_per_answer):
+            words = rng.choices(TOPICS + ["the", "is", "a", "of", "and", "uses", "memory", "CPU"], k=8)
+            lines.append(" ".join(words).capitalize() + ".")
+        lines.append("")
+    return lines
+
+
+def render_page(lines: list, size: tuple = A4_300_DPI) -> np.ndarray:
+    """Renders text lines onto a white page (BGR), scaled to the page size."""
+    width, height = size
+    page = np.full((height, width, 3), 255, dtype=np.uint8)
+    scale = width / A4_300_DPI[0]
+    line_height = int(70 * scale)
+    y = int(150 * scale)
+    for line in lines:
+        cv2.putText(page, line, (int(150 * scale), y), cv2.FONT_HERSHEY_SIMPLEX, 1.6 * scale, (0, 0, 0), max(1, int(3 * scale)))
+        y += line_height
+    return page
+
+
+def split_pages(lines: list, lines_per_page: int = 45) -> list:
+    """The lines on each page, as write_answer_pages lays them out; doubles as the pages' ground-truth text."""
+    return [lines[start:start + lines_per_page] for start in range(0, len(lines), lines_per_page)]
+
+
+def write_answer_pages(out_dir, lines: list, lines_per_page: int = 45, size: tuple = A4_300_DPI, ext: str = ".png") -> list:
+    """Splits lines over pages and writes page_01.png, page_02.png, ... Returns the paths."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for page_number, page in enumerate(split_pages(lines, lines_per_page), start=1):
+        path = out_dir / f"page_{page_number:02d}{ext}"
+        cv2.imwrite(str(path), render_page(page, size))
+        paths.append(path)
+    return paths
+
+
+def write_exam(out_dir, question_count: int, students: int = 1, seed: int = 0) -> list:
+    """Writes questions.json plus one answer folder per student. Returns the questions."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    questions = make_questions(question_count, seed)
+    with open(out_dir / "questions.json", "w", encoding="utf-8") as f:
+        json.dump(questions, f, indent=4)
+    for student in range(students):
+        lines = make_answer_lines(questions, seed=seed + student)
+        write_answer_pages(out_dir / f"student_{student + 1:03d}", lines)
+    return questions
+
+
+def make_insights(questions: list, seed: int = 0) -> str:
+    """An insights.txt in the layout generate_insights writes: a banner and four sections per question."""
+    rng = random.Random(seed)
+    blocks = []
+    for q in questions:
+        topic = rng.choice(TOPICS)
+        blocks.append(
+            "=" * 50 + f"\nAnalysis for Question {q['id']}: {q['question']}\n" + "=" * 50 + "\n"
+            f"### 1. Overall Summary\nThe answer covers {topic} but misses the comparison.\n\n"
+            f"### 2. Where Marks Were Lost\n* No example of {topic} in practice.\n* The definition is incomplete.\n\n"
+            f"### 3. Key Concepts to Revisit\n* {topic.capitalize()} and how the OS manages it.\n\n"
+            f"### 4. Actionable Path to Improvement\nPractise writing a short definition of {topic}, then one example.\n"
+        )
+    return "\n\n".join(blocks)
@@ -1,8 +1,59 @@
 # main.py
 import sys
 import os
-from src.task1_generate_model_ans import generate_model_answers, generate_insights
-from src.task2_rag import start_chat_session
+from src.task1_generate_model_ans import generate_model_answers, generate_insights, generate_cohort
+from src.task2_rag import (
+    start_chat_session, download_embed_model, export_onnx_embed_model,
+    DEFAULT_EMBED_MODEL_DIR, DEFAULT_ONNX_EMBED_MODEL_DIR,
+)
+from src.llm_client import get_response_cache
+from src.utils import get_ocr_cache
+from src import telemetry
+
+# --- On-disk caches that the `cache` command can inspect and prune ---
+CACHES = {
+    "llm": get_response_cache,
+    "ocr": get_ocr_cache,
+}
+
+def print_usage():
+    print("\nUsage: python main.py [command]")
+    print("\nCommands:")
+    print("  generate-answers                  - Step 1: Generates only the model answers.")
+    print("  generate-insights [path]          - Step 2: Generates insights from an answer directory.")
+    print("  generate-all [path]               - Runs both generation steps sequentially.")
+    print("  generate-cohort [path] [workers]  - Generates insights for every student folder in an exam directory.")
+    print("  chat [student]                    - Starts the interactive RAG chatbot (default: data/insights.txt).")
+    print(f"  download-embed-model [dir]        - Saves the embedding model locally (default: {DEFAULT_EMBED_MODEL_DIR}).")
+    print(f"  export-onnx-embed-model [dir]     - Exports it to ONNX + int8 for EMBED_BACKEND=onnx (default: {DEFAULT_ONNX_EMBED_MODEL_DIR}).")
+    print("  cache [stats|prune|clear] [name] [days]")
+    print("                                    - Inspects or prunes the on-disk caches (name: " + "|".join(CACHES) + ").")
+
+def print_cache_stats(name: str):
+    stats = CACHES[name]().stats()
+    print(f"💾 {name} cache: {stats['entries']} entries ({stats['bytes'] / 1024:.1f} KB), "
+          f"{stats['hits']} hits / {stats['misses']} misses this run")
+
+def run_cache_command(args: list):
+    action = args[0] if args else "stats"
+    names = [args[1]] if len(args) > 1 and args[1] != "all" else list(CACHES)
+    for name in names:
+        if name not in CACHES:
+            print(f"\n❌ Unknown cache: {name}. Choose from: {', '.join(CACHES)}")
+            sys.exit(1)
+        cache = CACHES[name]()
+        if action == "stats":
+            print_cache_stats(name)
+        elif action == "prune":
+            # Without a max age, trim the cache back to its configured size limit
+            days = float(args[2]) if len(args) > 2 else None
+            removed = cache.prune(max_age_days=days, max_bytes=None if days is not None else cache.max_bytes)
+            print(f"🧹 {name} cache: removed {removed} entries.")
+        elif action == "clear":
+            print(f"🧹 {name} cache: removed {cache.clear()} entries.")
+        else:
+            print(f"\n❌ Unknown cache action: {action}. Use stats, prune or clear.")
+            sys.exit(1)
 
 def main():
     """
@@ -11,13 +62,9 @@ def main():
     and handles directory paths for multi-image answers.
     """
     if len(sys.argv) < 2:
-        print("\nUsage: python main.py [command]")
-        print("\nCommands:")
-        print("  generate-answers                  - Step 1: Generates only the model answers.")
-        print("  generate-insights [path]          - Step 2: Generates insights from an answer directory.")
-        print("  generate-all [path]               - Runs both generation steps sequentially.")
-        print("  chat                              - Starts the interactive RAG chatbot.")
+        print_usage()
         print("\nExample for insights: python main.py generate-insights data/student_01")
+        print("Example for a cohort:  python main.py generate-cohort data/exam_x")
         sys.exit(1)
 
     command = sys.argv[1].lower()
@@ -25,8 +72,14 @@ def main():
     # Create data directory if it doesn't exist to prevent errors
     os.makedirs('data', exist_ok=True)
 
+    # Batch commands append one JSON line per span (OCR page, parse, LLM call...) to the trace file
+    if command.startswith("generate"):
+        telemetry.set_trace_file(telemetry.TRACE_FILE or telemetry.DEFAULT_CLI_TRACE_FILE)
+
     if command == "generate-answers":
         generate_model_answers()
+        print_cache_stats("llm")
+        telemetry.print_span_summary()
 
     elif command == "generate-insights":
         if len(sys.argv) < 3:
@@ -35,6 +88,9 @@ def main():
             sys.exit(1)
         answer_directory = sys.argv[2]
         generate_insights(answer_directory)
+        print_cache_stats("ocr")
+        print_cache_stats("llm")
+        telemetry.print_span_summary()
 
     elif command == "generate-all":
         if len(sys.argv) < 3:
@@ -45,9 +101,37 @@ def main():
         print("\n--- Running all generation steps ---")
         generate_model_answers()
         generate_insights(answer_directory)
+        print_cache_stats("ocr")
+        print_cache_stats("llm")
+        telemetry.print_span_summary()
         print("--- All generation steps complete ---\n")
 
+    elif command == "generate-cohort":
+        if len(sys.argv) < 3:
+            print("\n❌ Error: Please provide the path to the exam directory.")
+            print("Usage: python main.py generate-cohort path/to/exam_folder [workers]")
+            sys.exit(1)
+        exam_directory = sys.argv[2]
+        workers = int(sys.argv[3]) if len(sys.argv) > 3 else None
+        generate_cohort(exam_directory, workers)
+        print_cache_stats("ocr")
+        print_cache_stats("llm")
+        telemetry.print_span_summary()
+
+    elif command == "cache":
+        run_cache_command(sys.argv[2:])
+
+    elif command == "download-embed-model":
+        download_embed_model(sys.argv[2] if len(sys.argv) > 2 else DEFAULT_EMBED_MODEL_DIR)
+
+    elif command == "export-onnx-embed-model":
+        export_onnx_embed_model(sys.argv[2] if len(sys.argv) > 2 else DEFAULT_ONNX_EMBED_MODEL_DIR)
+
     elif command == "chat":
+        # A cohort student is addressed as <exam>/<student>, e.g. exam_x/student_001
+        if len(sys.argv) > 2:
+            start_chat_session(sys.argv[2])
+            return
         if not os.path.exists('data/insights.txt'):
             print("\n❌ Error: insights.txt not found.")
             print("Please run a 'generate' command first to create the analysis file.")
@@ -58,12 +142,7 @@ def main():
         print(f"\n❌ Unknown command: {command}")
         print("See usage below:")
         # Re-print help text for clarity
-        print("\nUsage: python main.py [command]")
-        print("\nCommands:")
-        print("  generate-answers                  - Step 1: Generates only the model answers.")
-        print("  generate-insights [path]          - Step 2: Generates insights from an answer directory.")
-        print("  generate-all [path]               - Runs both generation steps sequentially.")
-        print("  chat                              - Starts the interactive RAG chatbot.")
+        print_usage()
         sys.exit(1)
 
 if __name__ == "__main__":
@@ -0,0 +1,128 @@
+# src/answer_segmenter.py
+import os
+import re
+
+# Below this confidence the caller should fall back to the LLM parser
+# (0 always trusts the segmenter, anything above 1 always uses the LLM)
+SEGMENT_CONFIDENCE_THRESHOLD = float(os.getenv("SEGMENT_CONFIDENCE_THRESHOLD", "0.8"))
+
+NO_ANSWER = "No answer provided"
+
+# --- Question markers at the start of a line ---
+# Strong: a "Q"/"Ques"/"Question"/"Ans"/"Answer" prefix, e.g. "Q1.", "Q.2)", "Ans 3:", "Question No. 4 -"
+STRONG_MARKER = re.compile(
+    r"^[ \t]*[(\[]?[ \t]*(?i:q(?:ue?s?)?(?:tion)?|ans(?:wer)?)[ \t]*(?i:no\.?|number|#)?[ \t]*[.:\-]?[ \t]*"
+    r"(?P<number>[0-9lIO|]{1,3})(?=[ \t)\].:\-]|$)[ \t]*[)\].:\-]?",
+    re.MULTILINE,
+)
+# Weak: a bare number, e.g. "1.", "2)", "(3)"; also how numbered lists inside an answer look
+WEAK_MARKER = re.compile(r"^[ \t]*\(?(?P<number>\d{1,3})[ \t]*[.):](?=\s|$)", re.MULTILINE)
+# The separator generate_insights puts between OCR'd pages
+PAGE_BREAK = re.compile(r"^\s*-+\s*Page Break\s*-+\s*$", re.IGNORECASE | re.MULTILINE)
+
+# Characters Tesseract commonly reads in place of digits in a marker
+OCR_DIGITS = str.maketrans({"l": "1", "I": "1", "|": "1", "O": "0"})
+
+# Confidence multipliers for the ways a segmentation can go wrong
+WEAK_ONLY_PENALTY = 0.85      # bare numbers could be list items inside an answer
+DUPLICATE_PENALTY = 0.7       # the same question marked twice: which one is the answer?
+OUT_OF_ORDER_PENALTY = 0.9    # legitimate, but also what a misread marker looks like
+PREAMBLE_PENALTY = 0.8        # a lot of text before the first marker may be an unmarked answer
+PREAMBLE_SHARE = 0.3
+
+
+def _marker_number(match: re.Match):
+    raw = match.group("number")
+    # A lone look-alike is only a misread digit when it's attached to the prefix ("Ql", not "Q. I think")
+    if not any(c.isdigit() for c in raw) and match.string[match.start("number") - 1].isspace():
+        return None
+    number = raw.translate(OCR_DIGITS)
+    return int(number) if number.isdigit() else None
+
+
+def find_markers(raw_text: str, question_ids: list) -> tuple:
+    """
+    Returns ([(start, end, question_id)], strong) for the markers that name
+    one of `question_ids`: the prefixed ones if there are any, else the bare
+    numbers, which are only trusted when each id appears exactly once.
+    """
+    ids = set(question_ids)
+    for pattern, strong in ((STRONG_MARKER, True), (WEAK_MARKER, False)):
+        markers = []
+        for match in pattern.finditer(raw_text):
+            number = _marker_number(match)
+            if number in ids:
+                markers.append((match.start(), match.end(), number))
+        if markers:
+            return markers, strong
+    return [], False
+
+
+def segment_answers(raw_text: str, questions: list) -> tuple:
+    """
+    Splits the OCR text of an answer script on its question markers, without
+    an LLM. Returns ({question_id: answer text}, confidence in [0, 1]), with
+    NO_ANSWER for questions that have no marker. Confidence is the share of
+    questions found, lowered for bare-number markers, repeated or
+    out-of-order markers and a long unmarked preamble.
+    """
+    question_ids = [q['id'] for q in questions]
+    answers = {question_id: NO_ANSWER for question_id in question_ids}
+    if not question_ids:
+        return answers, 0.0
+
+    markers, strong = find_markers(raw_text, question_ids)
+    if not markers:
+        return answers, 0.0
+
+    found = [number for _, _, number in markers]
+    duplicates = len(found) != len(set(found))
+    if duplicates and not strong:
+        return answers, 0.0
+
+    segments = {}
+    for (_, end, number), next_marker in zip(markers, markers[1:] + [None]):
+        text = raw_text[end:next_marker[0] if next_marker else len(raw_text)]
+        text = PAGE_BREAK.sub("", text).strip()
+        # A repeated marker continues the answer ("Q2 (contd.)")
+        segments[number] = f"{segments[number]}\n{text}".strip() if number in segments else text
+    for number, text in segments.items():
+        answers[number] = text or NO_ANSWER
+
+    confidence = len(segments) / len(question_ids)
+    if not strong:
+        confidence *= WEAK_ONLY_PENALTY
+    if duplicates:
+        confidence *= DUPLICATE_PENALTY
+    order = [question_ids.index(number) for number in dict.fromkeys(found)]
+    if order != sorted(order):
+        confidence *= OUT_OF_ORDER_PENALTY
+    preamble = PAGE_BREAK.sub("", raw_text[:markers[0][0]]).strip()
+    if len(preamble) > PREAMBLE_SHARE * len(raw_text.strip()):
+        confidence *= PREAMBLE_PENALTY
+    return answers, round(confidence, 3)
+
+
+def closed_answers(raw_text: str, questions: list, threshold: float = None) -> dict:
+    """
+    The answers that are already complete in a partly read script: those
+    whose marker is followed by another question's marker. Returns
+    {question_id: answer text}, or {} while the markers are bare numbers or
+    repeat, since a later page could still change where an answer ends.
+
+    The segmentation so far must also reach `threshold` (default
+    SEGMENT_CONFIDENCE_THRESHOLD), scored over the questions up to the
+    furthest one marked: a question skipped before it ("Q1" then "Q3") may
+    mean an answer lost its marker and ran into the one before.
+    """
+    threshold = SEGMENT_CONFIDENCE_THRESHOLD if threshold is None else threshold
+    question_ids = [q['id'] for q in questions]
+    markers, strong = find_markers(raw_text, question_ids)
+    found = [number for _, _, number in markers]
+    if not strong or len(found) != len(set(found)):
+        return {}
+    seen = questions[:max(question_ids.index(number) for number in found) + 1]
+    answers, confidence = segment_answers(raw_text, seen)
+    if confidence < threshold:
+        return {}
+    return {number: answers[number] for number in found[:-1]}
@@ -0,0 +1,179 @@
+# src/batch_grading.py
+import os
+import json
+import math
+from src.llm_client import get_gemini_response, JSON_GENERATION_CONFIG
+from src.scheduler import get_scheduler, estimate_tokens
+from src import telemetry
+
+# --- Packing: each request carries the instructions and the whole answer script, plus as many
+# questions (question text + model answer + output reserved for the feedback) as fit the budget ---
+GRADING_BATCH_TOKENS = int(os.getenv("GRADING_BATCH_TOKENS", "16000"))
+GRADING_OUTPUT_TOKENS_PER_QUESTION = int(os.getenv("GRADING_OUTPUT_TOKENS_PER_QUESTION", "800"))
+
+BATCH_GRADING_INSTRUCTIONS = """
+You are an empathetic yet rigorous Teaching Assistant. Your primary goal is to help the student understand their mistakes and learn from them.
+**Task:** Below is the raw OCR text of a student's whole answer script, followed by several questions with their model answers.
+For EACH question:
+1. Find the student's answer to it in the script and copy it verbatim. You MUST NOT alter, correct, add to, or summarize the student's text. If there is no answer, use "No answer provided".
+2. Grade it against the model answer with a detailed, self-contained feedback report. It will be the *only* document the student sees and will also be used as a knowledge base for a support chatbot.
+
+**Output:** a single JSON object {"questions": [...]} with one entry per question, in this exact shape:
+{
+  "question_id": <the question's id, as a number>,
+  "student_answer": "<the student's answer, verbatim>",
+  "overall_summary": "<a concise paragraph on the student's grasp of the topic: strengths and the primary areas that need improvement>",
+  "positive_points": ["<at least one thing the student did correctly or partially correctly, even if the answer is poor>"],
+  "areas_for_improvement": [
+    {
+      "error_type": "<e.g. Conceptual Error / Omission / Vague Statement>",
+      "student_wrote": "<directly quote the student's incorrect phrase>",
+      "correction": "<why it's wrong and what the correct concept is, referencing the model answer; be specific>"
+    }
+  ],
+  "actionable_path": "<concrete next steps, e.g. which concepts to review and what to practise>"
+}
+List every error, omission or misconception in "areas_for_improvement".
+"""
+
+FEEDBACK_FIELDS = ("student_answer", "overall_summary", "actionable_path")
+
+
+def pack_batches(questions: list, model_answers: dict, script_text: str, budget: int = None, min_batches: int = 1) -> list:
+    """
+    Splits the questions, in order, into batches whose estimated prompt plus
+    reserved output stays within `budget` tokens and whose output fits the
+    JSON generation limit. A question too big for any batch goes alone.
+
+    Batches are generated concurrently and each one's latency grows with its
+    output, so questions are spread over at least `min_batches` batches.
+    """
+    budget = budget or GRADING_BATCH_TOKENS
+    fixed = estimate_tokens(BATCH_GRADING_INSTRUCTIONS) + estimate_tokens(script_text)
+    max_per_batch = min(
+        max(1, JSON_GENERATION_CONFIG["max_output_tokens"] // GRADING_OUTPUT_TOKENS_PER_QUESTION),
+        max(1, math.ceil(len(questions) / min_batches)),
+    )
+
+    batches, batch, used = [], [], fixed
+    for q in questions:
+        cost = estimate_tokens(q['question'] + model_answers[q['id']]) + GRADING_OUTPUT_TOKENS_PER_QUESTION
+        if batch and (used + cost > budget or len(batch) >= max_per_batch):
+            batches.append(batch)
+            batch, used = [], fixed
+        batch.append(q)
+        used += cost
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def build_batch_prompt(batch: list, model_answers: dict, script_text: str) -> str:
+    question_blocks = "\n".join(
+        f'**Question ID:** {q["id"]}\n**Question:** "{q["question"]}"\n**Model Answer:**\n"{model_answers[q["id"]]}"\n'
+        for q in batch
+    )
+    return f"""{BATCH_GRADING_INSTRUCTIONS}
+---
+**Raw Text from Answer Sheet:**
+"{script_text}"
+---
+{question_blocks}
+---
+Now, provide the JSON object for question IDs {[q['id'] for q in batch]}.
+"""
+
+
+def parse_batch_response(response_text: str) -> dict:
+    """Returns {question_id: entry} for every well-formed entry in a batched response."""
+    if "```json" in response_text:
+        response_text = response_text.split("```json")[1].split("```")[0]
+    try:
+        data = json.loads(response_text)
+    except json.JSONDecodeError as e:
+        print(f"❌ Batched grading response is not valid JSON: {e}")
+        return {}
+    entries = data.get("questions", []) if isinstance(data, dict) else data
+    parsed = {}
+    for entry in entries if isinstance(entries, list) else []:
+        try:
+            parsed[int(entry["question_id"])] = entry
+        except (TypeError, KeyError, ValueError):
+            continue
+    return parsed
+
+
+def _text(value) -> bool:
+    return isinstance(value, str) and bool(value.strip())
+
+
+def validate_entry(entry: dict) -> bool:
+    """True if the entry has every section the insights format needs."""
+    if not all(_text(entry.get(field)) for field in FEEDBACK_FIELDS):
+        return False
+    points = entry.get("positive_points")
+    if not isinstance(points, list) or not points or not all(_text(point) for point in points):
+        return False
+    areas = entry.get("areas_for_improvement")
+    if not isinstance(areas, list):
+        return False
+    return all(
+        isinstance(area, dict) and all(_text(area.get(key)) for key in ("error_type", "student_wrote", "correction"))
+        for area in areas
+    )
+
+
+def format_feedback(entry: dict) -> str:
+    """Renders a validated entry in the same four-section layout as the per-question reports."""
+    positives = "\n".join(f"* {point.strip()}" for point in entry["positive_points"])
+    areas = "\n".join(
+        f"* **{area['error_type'].strip()}:** The student wrote, \"{area['student_wrote'].strip()}\".\n"
+        f"* **Correction:** {area['correction'].strip()}"
+        for area in entry["areas_for_improvement"]
+    ) or "* No errors found: the answer covers the model answer fully."
+    return (
+        f"### 1. Overall Summary\n{entry['overall_summary'].strip()}\n"
+        f"### 2. Positive Points\n{positives}\n"
+        f"### 3. Areas for Improvement (Detailed Breakdown)\n{areas}\n"
+        f"### 4. Actionable Path to Improvement\n{entry['actionable_path'].strip()}\n"
+    )
+
+
+def grade_in_batches(script_text: str, questions: list, model_answers: dict, min_batches: int = None, on_graded=None):
+    """
+    Finds and grades the answers to `questions` in a few JSON requests.
+    Returns ({question_id: feedback text}, {question_id: student answer});
+    questions missing from the first dict failed validation and need grading
+    on their own. The second dict holds any answers the model did extract.
+
+    `on_graded(question_id, feedback)` is called for each valid result as
+    soon as its batch comes back, from that batch's worker thread.
+    """
+    scheduler = get_scheduler()
+    batches = pack_batches(questions, model_answers, script_text, min_batches=min_batches or scheduler.max_concurrency)
+    telemetry.annotate(batches=len(batches))
+    print(f"\n 📦 Grading {len(questions)} questions in {len(batches)} batched request(s) "
+          f"(up to {scheduler.max_concurrency} at a time)...")
+
+    def grade_batch(batch: list) -> dict:
+        response_text = get_gemini_response(build_batch_prompt(batch, model_answers, script_text),
+                                            generation_config=JSON_GENERATION_CONFIG)
+        entries = parse_batch_response(response_text or "")
+        for q in batch:
+            entry = entries.get(q['id'])
+            if entry is not None and on_graded and validate_entry(entry):
+                on_graded(q['id'], format_feedback(entry))
+        return entries
+
+    insights, student_answers = {}, {}
+    for batch, entries in zip(batches, scheduler.map(grade_batch, batches)):
+        for q in batch:
+            entry = entries.get(q['id'])
+            if entry is None:
+                continue
+            if _text(entry.get("student_answer")):
+                student_answers[q['id']] = entry["student_answer"]
+            if validate_entry(entry):
+                insights[q['id']] = format_feedback(entry)
+    print(f"✅ {len(insights)}/{len(questions)} questions graded in batches.")
+    return insights, student_answers
@@ -0,0 +1,113 @@
+# src/cache.py
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+
+# Every on-disk cache lives under this directory
+CACHE_DIR = Path(os.getenv("BAAZ_CACHE_DIR", ".cache"))
+
+
+def make_key(*parts) -> str:
+    """Content-addresses any JSON-serialisable parts into a stable SHA-256 hex key."""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SQLiteCache:
+    """
+    A persistent key -> text store kept in a single SQLite file.
+
+    Entries are evicted least-recently-used first once the total size of the
+    stored values goes over `max_bytes` (no limit if None). Hits and misses
+    are counted for the lifetime of the object.
+    """
+    def __init__(self, path, max_bytes: int = None):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+            " created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        self._conn.commit()
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            return row[0]
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), now, now),
+            )
+            if self.max_bytes is not None:
+                self._evict(self.max_bytes)
+            self._conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def _total_bytes(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _evict(self, max_bytes: int) -> int:
+        excess = self._total_bytes() - max_bytes
+        if excess <= 0:
+            return 0
+        # Walk from least to most recently used until enough bytes are freed
+        victims = []
+        rows = self._conn.execute("SELECT key, size FROM entries ORDER BY accessed ASC")
+        for key, size in rows:
+            if excess <= 0:
+                break
+            victims.append((key,))
+            excess -= size
+        rows.close()
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+        return len(victims)
+
+    def prune(self, max_age_days: float = None, max_bytes: int = None) -> int:
+        """Removes entries not used for `max_age_days` and/or trims to `max_bytes`. Returns the count removed."""
+        removed = 0
+        with self._lock:
+            if max_age_days is not None:
+                cutoff = time.time() - max_age_days * 86400
+                removed += self._conn.execute("DELETE FROM entries WHERE accessed < ?", (cutoff,)).rowcount
+            if max_bytes is not None:
+                removed += self._evict(max_bytes)
+            self._conn.commit()
+        return removed
+
+    def clear(self) -> int:
+        with self._lock:
+            removed = self._conn.execute("DELETE FROM entries").rowcount
+            self._conn.commit()
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"entries": entries, "bytes": total, "hits": self.hits, "misses": self.misses}
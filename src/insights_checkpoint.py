@@ -0,0 +1,73 @@
+# src/insights_checkpoint.py
+import os
+import json
+import hashlib
+import threading
+
+CHECKPOINT_SUFFIX = ".checkpoint.jsonl"
+
+
+def checkpoint_path(insights_file) -> str:
+    """The checkpoint next to an insights file; it only exists while that file is incomplete."""
+    return f"{insights_file}{CHECKPOINT_SUFFIX}"
+
+
+def grading_key(model_answer: str, source_text: str) -> str:
+    """What a question's feedback was graded from: its model answer and the student's text (its answer, or the whole script)."""
+    return hashlib.sha256(f"{model_answer}\0{source_text}".encode("utf-8")).hexdigest()[:32]
+
+
+class InsightsCheckpoint:
+    """
+    Append-only log of the questions graded so far for one insights file,
+    one JSON line per question: {"question_id", "key", "insight"}.
+
+    Every line is flushed and fsynced as soon as its question is graded, so
+    a crash loses at most the questions still in flight. A re-run reuses an
+    entry only if its key still matches, i.e. the same answer graded against
+    the same model answer. A torn last line (a crash mid-write) is skipped.
+    """
+    def __init__(self, insights_file):
+        self.path = checkpoint_path(insights_file)
+        self._lock = threading.Lock()
+        self._entries = {}  # question_id -> (key, insight)
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self._entries[int(entry["question_id"])] = (entry["key"], entry["insight"])
+                    except (ValueError, KeyError, TypeError):
+                        continue
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, question_id: int, key: str):
+        """The checkpointed feedback for a question graded from `key`, else None."""
+        with self._lock:
+            entry = self._entries.get(question_id)
+        return entry[1] if entry and entry[0] == key else None
+
+    def create(self):
+        """Makes sure the checkpoint file exists, even before any question is recorded."""
+        with self._lock:
+            if not os.path.exists(self.path):
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    os.fsync(f.fileno())
+
+    def record(self, question_id: int, key: str, insight: str):
+        line = json.dumps({"question_id": question_id, "key": key, "insight": insight})
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._entries[question_id] = (key, insight)
+
+    def remove(self):
+        """Called once the insights file is complete."""
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self._entries = {}
@@ -0,0 +1,102 @@
+# src/insights_parser.py
+import re
+from typing import Any, List, Sequence
+from pydantic import Field, PrivateAttr
+from llama_index.core.node_parser import NodeParser, SentenceSplitter
+from llama_index.core.node_parser.node_utils import build_nodes_from_splits
+from llama_index.core.schema import BaseNode
+
+# The layout written by generate_insights:
+#   ==================================================
+#   Analysis for Question N: <question text>
+#   ==================================================
+#   ### 1. Overall Summary
+#   ...
+#   ### 4. Actionable Path to Improvement
+QUESTION_BANNER = re.compile(r"^Analysis for Question (\S+?): .*$", re.MULTILINE)
+SECTION_HEADER = re.compile(r"^#{2,4}\s*(\d+)\.\s*(.+?)\s*$", re.MULTILINE)
+
+
+def _is_rule(line: str) -> bool:
+    return set(line.strip()) == {"="}
+
+
+def split_questions(text: str) -> list:
+    """
+    Splits an insights file on its 'Analysis for Question N' banners.
+    Returns [(question_id, section_text)], with numeric ids as ints and the
+    ===== rule lines dropped. Empty if the text has no banners.
+    """
+    banners = list(QUESTION_BANNER.finditer(text))
+    questions = []
+    for banner, next_banner in zip(banners, banners[1:] + [None]):
+        end = next_banner.start() if next_banner else len(text)
+        section = "\n".join(line for line in text[banner.start():end].splitlines() if not _is_rule(line)).strip()
+        question_id = banner.group(1)
+        questions.append((int(question_id) if question_id.isdigit() else question_id, section))
+    return questions
+
+
+def split_sections(question_text: str):
+    """
+    Splits one question's analysis on its '### N. Title' headers.
+    Returns (banner_line, [(section_title, section_text)]); text before the
+    first header (other than the banner) is kept as an untitled section.
+    """
+    banner = ""
+    match = QUESTION_BANNER.match(question_text)
+    if match:
+        banner = match.group(0)
+        question_text = question_text[match.end():]
+
+    headers = list(SECTION_HEADER.finditer(question_text))
+    sections = []
+    preamble = question_text[:headers[0].start() if headers else len(question_text)].strip()
+    if preamble:
+        sections.append((None, preamble))
+    for header, next_header in zip(headers, headers[1:] + [None]):
+        end = next_header.start() if next_header else len(question_text)
+        sections.append((header.group(2), question_text[header.start():end].strip()))
+    return banner, sections
+
+
+class InsightsNodeParser(NodeParser):
+    """
+    Node parser for insights files: one node per feedback section of each
+    question, instead of fixed-size windows that cut across sections.
+
+    Every node starts with its question's banner line and carries
+    `question_id` and `section` metadata. Sections longer than
+    `max_section_tokens` are split further by sentence.
+    """
+    max_section_tokens: int = Field(default=400, description="Sections longer than this are split by sentence.")
+
+    _splitter: SentenceSplitter = PrivateAttr()
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._splitter = SentenceSplitter(chunk_size=self.max_section_tokens, chunk_overlap=20)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "InsightsNodeParser"
+
+    def _parse_nodes(self, nodes: Sequence[BaseNode], show_progress: bool = False, **kwargs: Any) -> List[BaseNode]:
+        all_nodes = []
+        for node in nodes:
+            text = node.get_content()
+            questions = split_questions(text) or [(node.metadata.get("question_id"), text)]
+
+            for question_id, question_text in questions:
+                banner, sections = split_sections(question_text)
+                for section, section_text in sections:
+                    chunks = [
+                        f"{banner}\n{chunk}" if banner else chunk
+                        for chunk in self._splitter.split_text(section_text)
+                    ]
+                    for chunk_node in build_nodes_from_splits(chunks, node, id_func=self.id_func):
+                        if question_id is not None:
+                            chunk_node.metadata["question_id"] = question_id
+                        chunk_node.metadata["section"] = section or "General"
+                        all_nodes.append(chunk_node)
+        return all_nodes
@@ -1,45 +1,156 @@
 # src/llm_client.py
 import os
-import time 
+import time
+import asyncio
+import threading
+import functools
 import google.generativeai as genai
 from dotenv import load_dotenv
+from src.scheduler import get_scheduler, estimate_tokens, is_rate_limit_error
+from src import telemetry
+from src.cache import CACHE_DIR, SQLiteCache, make_key
 
 load_dotenv()
 
-def get_gemini_response(prompt: str) -> str:
+MODEL_NAME = "gemini-2.5-flash"
+GENERATION_CONFIG = {
+    "temperature": 0.0,
+    "max_output_tokens": 8192, # Increased token limit for detailed answers
+}
+# For prompts that must come back as one JSON document (e.g. batched grading)
+JSON_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "max_output_tokens": 32768,
+}
+
+# --- Response cache: calls run at temperature 0.0, so a cached answer is as good as a fresh one ---
+LLM_CACHE_FILE = CACHE_DIR / "llm_responses.sqlite"
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "256"))
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> SQLiteCache:
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = SQLiteCache(LLM_CACHE_FILE, max_bytes=int(LLM_CACHE_MAX_MB * 1024 * 1024))
+        return _response_cache
+
+
+def cache_bypassed() -> bool:
+    """LLM_CACHE_BYPASS=1 skips cache lookups (fresh answers still refresh the cache)."""
+    return os.getenv("LLM_CACHE_BYPASS", "0").lower() in ("1", "true", "yes")
+
+
+# --- One configured client and model per process, shared by every thread ---
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_model() -> genai.GenerativeModel:
+    """
+    Configures the Gemini client and builds the model the first time it is
+    needed; later calls reuse it, along with its open HTTP/gRPC connections.
+    GEMINI_API_ENDPOINT and GEMINI_TRANSPORT can point it at another server
+    (e.g. the local stub used by the benchmarks).
+    """
+    global _model
+    with _model_lock:
+        if _model is None:
+            api_key = os.getenv("GEMINI_API_KEY")
+            if not api_key:
+                raise ValueError("GEMINI_API_KEY not found in environment variables.")
+
+            configure_kwargs = {"api_key": api_key}
+            if os.getenv("GEMINI_API_ENDPOINT"):
+                configure_kwargs["client_options"] = {"api_endpoint": os.getenv("GEMINI_API_ENDPOINT")}
+            if os.getenv("GEMINI_TRANSPORT"):
+                configure_kwargs["transport"] = os.getenv("GEMINI_TRANSPORT")
+            genai.configure(**configure_kwargs)
+
+            _model = genai.GenerativeModel(
+                model_name=MODEL_NAME,
+                generation_config=GENERATION_CONFIG,
+            )
+        return _model
+
+
+def generate(prompt: str, use_cache: bool = True, generation_config: dict = None) -> str:
     """
     Sends a prompt to the Gemini API and returns the response.
-    Includes a retry mechanism with exponential backoff for reliability.
+    `generation_config` overrides GENERATION_CONFIG keys for this call only.
+    Answers are served from the on-disk cache when the same model, generation
+    config and prompt have been seen before.
+    Other errors are retried with exponential backoff; rate-limit errors are
+    not, since the scheduler has already retried them.
     """
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise ValueError("GEMINI_API_KEY not found in environment variables.")
-        
-    genai.configure(api_key=api_key)
-    
-    generation_config = {
-        "temperature": 0.0,
-        "max_output_tokens": 8192, # Increased token limit for detailed answers
-    }
-
-    model = genai.GenerativeModel(
-        model_name="gemini-2.5-flash", # Sticking with gemini-pro for high-quality text generation
-        generation_config=generation_config,
-    )
-
-    # --- NEW: Retry Logic ---
-    max_retries = 3
-    delay = 5  # Initial delay in seconds
-    for attempt in range(max_retries):
-        try:
-            response = model.generate_content(prompt)
-            return response.text
-        except Exception as e:
-            print(f"An error occurred: {e}")
-            if attempt < max_retries - 1:
-                print(f"Retrying in {delay} seconds...")
-                time.sleep(delay)
-                delay *= 2  # Exponential backoff
-            else:
-                print("Max retries reached. Returning empty string.")
-                return "" # Return empty if all retries fail
\ No newline at end of file
+    with telemetry.span("llm.generate", model=MODEL_NAME) as span:
+        config = {**GENERATION_CONFIG, **(generation_config or {})}
+        cache_key = make_key(MODEL_NAME, config, prompt)
+        if use_cache and not cache_bypassed():
+            cached = get_response_cache().get(cache_key)
+            if cached is not None:
+                span.set(cache="hit", response_tokens=estimate_tokens(cached))
+                telemetry.inc("llm_requests_total", cache="hit")
+                return cached
+        span.set(cache="miss")
+        telemetry.inc("llm_requests_total", cache="miss")
+
+        model = get_model()
+        request = model.generate_content
+        if generation_config:
+            request = functools.partial(model.generate_content, generation_config=config)
+
+        max_retries = 3
+        delay = 5  # Initial delay in seconds
+        for attempt in range(max_retries):
+            try:
+                # The scheduler waits for RPM/TPM quota and handles 429 backoff
+                response = get_scheduler().call(request, prompt)
+                text = response.text
+                record_usage(span, response, prompt, text)
+                if text:
+                    get_response_cache().set(cache_key, text)
+                return text
+            except Exception as e:
+                print(f"An error occurred: {e}")
+                telemetry.inc("llm_errors_total", error=type(e).__name__)
+                if is_rate_limit_error(e):
+                    # Still rate limited after the scheduler's own backoff and retries
+                    print("Rate limit retries exhausted. Returning empty string.")
+                    span.status = "error"
+                    return ""
+                span.add("retries")
+                if attempt < max_retries - 1:
+                    print(f"Retrying in {delay} seconds...")
+                    time.sleep(delay)
+                    delay *= 2  # Exponential backoff
+                else:
+                    print("Max retries reached. Returning empty string.")
+                    span.status = "error"
+                    return "" # Return empty if all retries fail
+
+
+def record_usage(span, response, prompt: str, text: str):
+    """Token counts for one response: Gemini's usage metadata when it sent any, else estimates."""
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", None) or estimate_tokens(prompt)
+    response_tokens = getattr(usage, "candidates_token_count", None) or estimate_tokens(text or "")
+    span.set(prompt_tokens=prompt_tokens, response_tokens=response_tokens)
+    telemetry.inc("llm_tokens_total", prompt_tokens, kind="prompt")
+    telemetry.inc("llm_tokens_total", response_tokens, kind="response")
+
+
+async def agenerate(prompt: str, use_cache: bool = True, generation_config: dict = None) -> str:
+    """
+    asyncio entry point for generate(). The blocking call runs on a worker
+    thread, so async callers share the same model, quota and connection pool.
+    """
+    return await asyncio.to_thread(generate, prompt, use_cache, generation_config)
+
+
+def get_gemini_response(prompt: str, use_cache: bool = True, generation_config: dict = None) -> str:
+    """Synchronous entry point used by the generation pipeline; see generate()."""
+    return generate(prompt, use_cache, generation_config)
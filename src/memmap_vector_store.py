@@ -0,0 +1,387 @@
+# src/memmap_vector_store.py
+import os
+import json
+import threading
+from pathlib import Path
+from typing import Any, List, Optional, Sequence
+import numpy as np
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    FilterCondition,
+    FilterOperator,
+    MetadataFilter,
+    MetadataFilters,
+    VectorStoreQuery,
+    VectorStoreQueryMode,
+    VectorStoreQueryResult,
+)
+from llama_index.core.vector_stores.utils import build_metadata_filter_fn
+
+# hnswlib is optional: without it every query is an exact NumPy scan
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+# --- On-disk layout, next to the docstore in the persist directory ---
+VECTORS_FILE = "vectors.npy"        # (rows, dim) float32 or int8, memory-mapped on load
+NORMS_FILE = "vector_norms.npy"     # (rows,) float32 L2 norms, for cosine similarity
+SCALES_FILE = "vector_scales.npy"   # (rows,) float32 int8 dequantization scales (int8 only)
+META_FILE = "vector_meta.json"      # dtype, dim and the node_id, ref_doc_id and metadata columns
+ANN_FILE = "vectors.hnsw"           # optional hnswlib graph over the persisted rows
+
+# Below this many candidate rows an exact scan is as fast as the ANN graph, and exact
+ANN_MIN_CANDIDATES = int(os.getenv("VECTOR_STORE_ANN_MIN_CANDIDATES", "20000"))
+# Full scans go block by block, so int8 rows are converted in cache-sized pieces
+SCAN_BLOCK_ROWS = 8192
+
+
+def quantize_int8(vectors: np.ndarray) -> tuple:
+    """Symmetric per-row int8 quantization: returns (int8 rows, float32 scales)."""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+
+def _write_npy(path: Path, array: np.ndarray):
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+class MemmapVectorStore(BasePydanticVectorStore):
+    """
+    Vector store that keeps embeddings in one contiguous float32 (or int8)
+    array, memory-mapped from disk, with a small JSON table of node ids,
+    ref doc ids and metadata alongside.
+
+    Loading maps the array instead of parsing it, so startup does not grow
+    with the number of vectors and only the rows a query touches are paged
+    in: a query filtered to one student reads that student's rows. Search is
+    an exact cosine top-k in NumPy; equality filters (student_id,
+    question_id) are evaluated on dictionary-encoded metadata columns. With
+    use_ann and hnswlib installed, large unfiltered scans use an HNSW graph
+    built at persist time.
+
+    Like LlamaIndex's SimpleVectorStore it stores no text (the docstore
+    does), so it plugs into StorageContext as the default vector store.
+    Deleted rows are only masked until the next persist, which compacts them.
+    """
+    stores_text: bool = False
+    dtype: str = Field(default="float32", description="float32, or int8 for 4x smaller vectors.")
+    use_ann: bool = Field(default=False, description="Build and use an hnswlib graph (needs hnswlib).")
+
+    _lock: Any = PrivateAttr()
+    _dim: Optional[int] = PrivateAttr(default=None)
+    _vectors: Any = PrivateAttr(default=None)
+    _norms: Any = PrivateAttr(default=None)
+    _scales: Any = PrivateAttr(default=None)
+    _pending: list = PrivateAttr(default_factory=list)  # (vectors, norms, scales) added since the last consolidation
+    _alive: Any = PrivateAttr(default=None)
+    _node_ids: list = PrivateAttr(default_factory=list)
+    _ref_doc_ids: list = PrivateAttr(default_factory=list)
+    _metadata: list = PrivateAttr(default_factory=list)
+    _rows_by_node: Optional[dict] = PrivateAttr(default=None)  # built on first add/delete, not at load
+    _rows_by_ref_doc: Optional[dict] = PrivateAttr(default=None)
+    _columns: dict = PrivateAttr(default_factory=dict)  # metadata key -> (codes, {value: code})
+    _ann: Any = PrivateAttr(default=None)
+    _ann_rows: int = PrivateAttr(default=0)
+
+    def __init__(self, dtype: str = "float32", use_ann: bool = False, **kwargs: Any):
+        if dtype not in ("float32", "int8"):
+            raise ValueError(f"Unsupported vector dtype: {dtype} (use float32 or int8)")
+        super().__init__(dtype=dtype, use_ann=use_ann, **kwargs)
+        self._lock = threading.RLock()
+        self._alive = np.zeros(0, dtype=bool)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "MemmapVectorStore"
+
+    @property
+    def client(self) -> None:
+        return None
+
+    # --- Loading and saving ---
+    @staticmethod
+    def exists(persist_dir) -> bool:
+        return (Path(persist_dir) / META_FILE).exists()
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir, use_ann: bool = False) -> "MemmapVectorStore":
+        """Maps a persisted store; the dtype is the one it was saved with."""
+        persist_dir = Path(persist_dir)
+        with open(persist_dir / META_FILE, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        store = cls(dtype=meta["dtype"], use_ann=use_ann)
+        store._dim = meta["dim"]
+        store._set_rows(meta["node_ids"], meta["ref_doc_ids"], meta["metadata"])
+        if store._node_ids:
+            store._vectors = np.load(persist_dir / VECTORS_FILE, mmap_mode="r")
+            store._norms = np.load(persist_dir / NORMS_FILE, mmap_mode="r")
+            if store.dtype == "int8":
+                store._scales = np.load(persist_dir / SCALES_FILE, mmap_mode="r")
+            if use_ann and hnswlib is not None and (persist_dir / ANN_FILE).exists():
+                store._load_ann(persist_dir / ANN_FILE, meta.get("ann_rows", 0))
+        return store
+
+    @classmethod
+    def from_simple(cls, simple_store, dtype: str = "float32", use_ann: bool = False) -> "MemmapVectorStore":
+        """Copies the vectors of a SimpleVectorStore (the JSON store), so an existing index is not re-embedded."""
+        store = cls(dtype=dtype, use_ann=use_ann)
+        data = simple_store.data
+        node_ids = list(data.embedding_dict)
+        if node_ids:
+            metadata = data.metadata_dict or {}
+            store._append(
+                np.asarray([data.embedding_dict[node_id] for node_id in node_ids], dtype=np.float32),
+                [(node_id, data.text_id_to_ref_doc_id.get(node_id), user_metadata(metadata.get(node_id, {})))
+                 for node_id in node_ids],
+            )
+        return store
+
+    def persist(self, persist_path: str, fs: Any = None) -> None:
+        """
+        Writes the store next to `persist_path` (the path StorageContext passes,
+        only its directory is used), dropping deleted rows. Files are replaced
+        atomically and the new array is mapped again afterwards.
+        """
+        persist_dir = Path(os.path.dirname(persist_path))
+        persist_dir.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            self._consolidate()
+            keep = np.flatnonzero(self._alive)
+            node_ids = [self._node_ids[i] for i in keep]
+            ref_doc_ids = [self._ref_doc_ids[i] for i in keep]
+            metadata = [self._metadata[i] for i in keep]
+            if len(keep):
+                # In-memory copies: the mapped files can be replaced (also on Windows)
+                self._vectors = np.ascontiguousarray(self._vectors[keep])
+                self._norms = np.ascontiguousarray(self._norms[keep])
+                _write_npy(persist_dir / VECTORS_FILE, self._vectors)
+                _write_npy(persist_dir / NORMS_FILE, self._norms)
+                if self.dtype == "int8":
+                    self._scales = np.ascontiguousarray(self._scales[keep])
+                    _write_npy(persist_dir / SCALES_FILE, self._scales)
+
+            ann_rows = 0
+            if self.use_ann and hnswlib is not None and len(keep) >= ANN_MIN_CANDIDATES:
+                self._build_ann(persist_dir / ANN_FILE)
+                ann_rows = len(keep)
+
+            meta = {"dtype": self.dtype, "dim": self._dim, "ann_rows": ann_rows,
+                    "node_ids": node_ids, "ref_doc_ids": ref_doc_ids, "metadata": metadata}
+            tmp_path = persist_dir / (META_FILE + ".tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, persist_dir / META_FILE)
+
+            self._set_rows(node_ids, ref_doc_ids, metadata)
+            if len(keep):
+                self._vectors = np.load(persist_dir / VECTORS_FILE, mmap_mode="r")
+                self._norms = np.load(persist_dir / NORMS_FILE, mmap_mode="r")
+                if self.dtype == "int8":
+                    self._scales = np.load(persist_dir / SCALES_FILE, mmap_mode="r")
+            else:
+                self._vectors = self._norms = self._scales = None
+            if not ann_rows:
+                self._ann, self._ann_rows = None, 0
+
+    # --- Row bookkeeping ---
+    def _set_rows(self, node_ids: list, ref_doc_ids: list, metadata: list):
+        self._node_ids, self._ref_doc_ids, self._metadata = node_ids, ref_doc_ids, metadata
+        self._alive = np.ones(len(node_ids), dtype=bool)
+        self._rows_by_node = self._rows_by_ref_doc = None
+        self._columns = {}
+
+    def _lookups(self) -> tuple:
+        """({node_id: row}, {ref_doc_id: [rows]}) for live rows; filtered queries don't need them, so loading doesn't build them."""
+        if self._rows_by_node is None:
+            alive = self._alive
+            rows_by_node, rows_by_ref_doc = {}, {}
+            for i, (node_id, ref_doc_id) in enumerate(zip(self._node_ids, self._ref_doc_ids)):
+                if alive[i]:
+                    rows_by_node[node_id] = i
+                    rows_by_ref_doc.setdefault(ref_doc_id, []).append(i)
+            self._rows_by_node, self._rows_by_ref_doc = rows_by_node, rows_by_ref_doc
+        return self._rows_by_node, self._rows_by_ref_doc
+
+    def _append(self, vectors: np.ndarray, rows: list):
+        if self._dim is None:
+            self._dim = vectors.shape[1]
+        elif vectors.shape[1] != self._dim:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the store's {self._dim}")
+
+        if self.dtype == "int8":
+            stored, scales = quantize_int8(vectors)
+            norms = np.linalg.norm(stored.astype(np.float32) * scales[:, None], axis=1)
+        else:
+            stored, scales = vectors, None
+            norms = np.linalg.norm(vectors, axis=1)
+        self._pending.append((stored, norms.astype(np.float32), scales))
+
+        rows_by_node, rows_by_ref_doc = self._lookups()
+        alive, start = self._alive, len(self._node_ids)
+        for offset, (node_id, ref_doc_id, _) in enumerate(rows):
+            if node_id in rows_by_node:  # re-added node: the new row replaces the old one
+                alive[rows_by_node[node_id]] = False
+            rows_by_node[node_id] = start + offset
+            rows_by_ref_doc.setdefault(ref_doc_id, []).append(start + offset)
+        self._node_ids.extend(row[0] for row in rows)
+        self._ref_doc_ids.extend(row[1] for row in rows)
+        self._metadata.extend(row[2] for row in rows)
+        self._alive = np.concatenate([alive, np.ones(len(rows), dtype=bool)])
+        self._columns = {}
+
+    def _consolidate(self):
+        """Merges rows added since the last call into the main arrays (once, not on every add)."""
+        if not self._pending:
+            return
+        parts = ([] if self._vectors is None else [(self._vectors, self._norms, self._scales)]) + self._pending
+        self._vectors = np.concatenate([part[0] for part in parts])
+        self._norms = np.concatenate([part[1] for part in parts])
+        if self.dtype == "int8":
+            self._scales = np.concatenate([part[2] for part in parts])
+        self._pending = []
+
+    def add(self, nodes: Sequence[BaseNode], **add_kwargs: Any) -> List[str]:
+        if not nodes:
+            return []
+        vectors = np.asarray([node.get_embedding() for node in nodes], dtype=np.float32)
+        with self._lock:
+            self._append(vectors, [(node.node_id, node.ref_doc_id, dict(node.metadata)) for node in nodes])
+        return [node.node_id for node in nodes]
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        with self._lock:
+            rows_by_node, rows_by_ref_doc = self._lookups()
+            for row in rows_by_ref_doc.pop(ref_doc_id, []):
+                self._alive[row] = False
+                if rows_by_node.get(self._node_ids[row]) == row:
+                    del rows_by_node[self._node_ids[row]]
+
+    # --- Search ---
+    def _column(self, key: str) -> tuple:
+        column = self._columns.get(key)
+        if column is None:
+            codes_by_value = {}
+            codes = np.fromiter(
+                (codes_by_value.setdefault(_hashable(metadata.get(key)), len(codes_by_value)) for metadata in self._metadata),
+                dtype=np.int32, count=len(self._metadata),
+            )
+            column = self._columns[key] = (codes, codes_by_value)
+        return column
+
+    def _filter_mask(self, filters: MetadataFilters) -> np.ndarray:
+        exact = (filters.condition in (None, FilterCondition.AND) and all(
+            isinstance(f, MetadataFilter) and f.operator == FilterOperator.EQ for f in filters.filters
+        ))
+        if not exact:
+            matches = build_metadata_filter_fn(lambda row: self._metadata[row], filters)
+            return np.fromiter((matches(row) for row in range(len(self._metadata))), dtype=bool, count=len(self._metadata))
+
+        mask = np.ones(len(self._metadata), dtype=bool)
+        for metadata_filter in filters.filters:
+            codes, codes_by_value = self._column(metadata_filter.key)
+            code = codes_by_value.get(_hashable(metadata_filter.value))
+            if code is None:
+                return np.zeros(len(self._metadata), dtype=bool)
+            mask &= codes == code
+        return mask
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.mode != VectorStoreQueryMode.DEFAULT:
+            raise ValueError(f"MemmapVectorStore only supports the default query mode, not {query.mode}")
+        top_k = query.similarity_top_k
+        query_vector = np.asarray(query.query_embedding, dtype=np.float32)
+        query_norm = float(np.linalg.norm(query_vector))
+
+        with self._lock:
+            self._consolidate()
+            mask = self._alive.copy()
+            if query.filters is not None and query.filters.filters:
+                mask &= self._filter_mask(query.filters)
+            if query.node_ids is not None:
+                allowed = np.zeros(len(mask), dtype=bool)
+                rows_by_node = self._lookups()[0]
+                allowed[[rows_by_node[node_id] for node_id in query.node_ids if node_id in rows_by_node]] = True
+                mask &= allowed
+            vectors, norms, scales, ann, ann_rows = self._vectors, self._norms, self._scales, self._ann, self._ann_rows
+            node_ids = self._node_ids
+
+        rows = np.flatnonzero(mask)
+        if not len(rows) or not top_k:
+            return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+
+        graph_candidates = int(np.count_nonzero(mask[:ann_rows])) if ann is not None else 0
+        if graph_candidates >= ANN_MIN_CANDIDATES:
+            # Persisted rows through the graph, rows added since then scanned exactly
+            labels, distances = ann.knn_query(query_vector, k=min(top_k, graph_candidates),
+                                              filter=lambda label: bool(mask[label]))
+            newer = rows[rows >= ann_rows]
+            candidate_rows = np.concatenate([labels[0].astype(np.int64), newer])
+            candidate_scores = np.concatenate([
+                1.0 - distances[0].astype(np.float32),
+                self._scores_for(newer, query_vector, query_norm, vectors, norms, scales),
+            ])
+        else:
+            candidate_rows = rows
+            candidate_scores = self._scores_for(rows, query_vector, query_norm, vectors, norms, scales)
+
+        k = min(top_k, len(candidate_rows))
+        best = np.argpartition(-candidate_scores, k - 1)[:k]
+        best = best[np.argsort(-candidate_scores[best], kind="stable")]
+        return VectorStoreQueryResult(
+            ids=[node_ids[candidate_rows[i]] for i in best],
+            similarities=[float(candidate_scores[i]) for i in best],
+        )
+
+    @staticmethod
+    def _scores_for(rows, query, query_norm, vectors, norms, scales) -> np.ndarray:
+        """Cosine similarity of `query` with the given rows."""
+        if not len(rows):
+            return np.zeros(0, dtype=np.float32)
+        if len(rows) == len(vectors):  # every row: one sequential pass over the array
+            scores = np.concatenate([
+                vectors[start:start + SCAN_BLOCK_ROWS].astype(np.float32, copy=False) @ query
+                for start in range(0, len(vectors), SCAN_BLOCK_ROWS)
+            ])
+            selected_norms, selected_scales = norms, scales
+        else:
+            scores = vectors[rows].astype(np.float32, copy=False) @ query
+            selected_norms = norms[rows]
+            selected_scales = scales[rows] if scales is not None else None
+        if selected_scales is not None:
+            scores *= selected_scales
+        return scores / np.maximum(selected_norms * query_norm, 1e-12)
+
+    # --- Optional ANN graph ---
+    def _build_ann(self, path: Path):
+        vectors = self._vectors.astype(np.float32)
+        if self._scales is not None:
+            vectors *= self._scales[:, None]
+        ann = hnswlib.Index(space="cosine", dim=self._dim)
+        ann.init_index(max_elements=len(vectors), ef_construction=200, M=16)
+        ann.add_items(vectors, np.arange(len(vectors)))
+        ann.set_ef(64)
+        ann.save_index(str(path))
+        self._ann, self._ann_rows = ann, len(vectors)
+
+    def _load_ann(self, path: Path, rows: int):
+        ann = hnswlib.Index(space="cosine", dim=self._dim)
+        ann.load_index(str(path), max_elements=rows)
+        ann.set_ef(64)
+        self._ann, self._ann_rows = ann, rows
+
+
+def user_metadata(metadata: dict) -> dict:
+    """Drops the bookkeeping keys LlamaIndex adds to SimpleVectorStore metadata, keeping the node's own."""
+    return {key: value for key, value in metadata.items()
+            if not key.startswith("_") and key not in ("document_id", "doc_id", "ref_doc_id")}
+
+
+def _hashable(value):
+    return tuple(value) if isinstance(value, list) else value
@@ -0,0 +1,162 @@
+# src/onnx_embedding.py
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import Any, List
+import numpy as np
+from pydantic import Field, PrivateAttr
+from llama_index.core.base.embeddings.base import BaseEmbedding
+
+# onnxruntime and tokenizers are optional: only EMBED_BACKEND=onnx needs them
+# (exporting a model additionally needs optimum[onnxruntime], see export_onnx_model)
+try:
+    import onnxruntime
+    from tokenizers import Tokenizer
+except ImportError:
+    onnxruntime = None
+    Tokenizer = None
+
+ONNX_MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model_quantized.onnx"  # int8 weights, written by export_onnx_model
+TOKENIZER_FILE = "tokenizer.json"
+
+# The query instruction bge-*-en models were trained with, which HuggingFaceEmbedding prepends to
+# queries: the same one here keeps query vectors compatible with the default backend. Taken from
+# llama-index-embeddings-huggingface when it is installed (the ONNX backend doesn't need it otherwise)
+try:
+    from llama_index.embeddings.huggingface.utils import DEFAULT_QUERY_BGE_INSTRUCTION_EN as BGE_QUERY_INSTRUCTION
+except ImportError:
+    BGE_QUERY_INSTRUCTION = "Represent this question for searching relevant passages: "
+
+
+def export_onnx_model(source: str, target_dir, quantize: bool = True) -> Path:
+    """
+    Exports a HuggingFace model (Hub name or local snapshot) to ONNX in
+    `target_dir`, with its tokenizer, plus an int8 dynamically quantized copy.
+    Needs optimum[onnxruntime] (and with it torch and transformers); loading
+    the result afterwards only needs onnxruntime and tokenizers.
+    """
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from transformers import AutoTokenizer
+
+    target_dir = Path(target_dir)
+    ORTModelForFeatureExtraction.from_pretrained(source, export=True).save_pretrained(target_dir)
+    AutoTokenizer.from_pretrained(source).save_pretrained(target_dir)
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(str(target_dir / ONNX_MODEL_FILE), str(target_dir / QUANTIZED_MODEL_FILE),
+                         weight_type=QuantType.QInt8)
+    return target_dir
+
+
+class OnnxEmbedding(BaseEmbedding):
+    """
+    CPU embedding backend for BERT-style sentence models (bge) exported to
+    ONNX: a drop-in replacement for HuggingFaceEmbedding on Settings.embed_model.
+
+    Texts are embedded `batch_size` at a time, sorted by length so each batch
+    pads to little more than its longest text, with CLS pooling and L2
+    normalisation like the sentence-transformers model. The int8 model is used
+    when the directory has one. Single texts (chat queries, routing, the
+    semantic cache) go through a bounded LRU cache of `query_cache_size`
+    entries: a message embedded by several components in one turn is run
+    through the model again only if it was evicted in between.
+    """
+    model_dir: str = Field(description="Directory with the ONNX model and tokenizer.json.")
+    quantized: bool = Field(default=True, description="Use the int8 model if the directory has one.")
+    threads: int = Field(default=0, description="onnxruntime intra-op threads; 0 lets onnxruntime decide.")
+    max_length: int = Field(default=512, description="Tokens per text; longer texts are truncated.")
+    query_instruction: str = Field(default=BGE_QUERY_INSTRUCTION, description="Prepended to queries.")
+    query_cache_size: int = Field(default=1024, description="Single-text embeddings kept in the LRU cache.")
+
+    _session: Any = PrivateAttr()
+    _tokenizer: Any = PrivateAttr()
+    _input_names: set = PrivateAttr()
+    _cache: OrderedDict = PrivateAttr()
+    _cache_lock: Any = PrivateAttr()
+    _cache_hits: int = PrivateAttr(default=0)
+    _cache_misses: int = PrivateAttr(default=0)
+
+    def __init__(self, model_dir, batch_size: int = 32, **kwargs: Any):
+        if onnxruntime is None or Tokenizer is None:
+            raise ImportError("EMBED_BACKEND=onnx needs onnxruntime and tokenizers: pip install onnxruntime tokenizers")
+        super().__init__(model_dir=str(model_dir), embed_batch_size=batch_size,
+                         model_name=Path(model_dir).name, **kwargs)
+
+        model_path = Path(self.model_dir) / QUANTIZED_MODEL_FILE
+        if not (self.quantized and model_path.exists()):
+            model_path = Path(self.model_dir) / ONNX_MODEL_FILE
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.threads:
+            options.intra_op_num_threads = self.threads
+        self._session = onnxruntime.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+        self._input_names = {model_input.name for model_input in self._session.get_inputs()}
+
+        self._tokenizer = Tokenizer.from_file(str(Path(self.model_dir) / TOKENIZER_FILE))
+        self._tokenizer.enable_truncation(max_length=self.max_length)
+        self._tokenizer.no_padding()  # padded per batch in _encode
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "OnnxEmbedding"
+
+    def _run(self, texts: List[str]) -> np.ndarray:
+        encodings = self._tokenizer.encode_batch(texts)
+        length = max(len(encoding.ids) for encoding in encodings)
+        input_ids = np.zeros((len(texts), length), dtype=np.int64)
+        attention_mask = np.zeros((len(texts), length), dtype=np.int64)
+        for row, encoding in enumerate(encodings):
+            input_ids[row, :len(encoding.ids)] = encoding.ids
+            attention_mask[row, :len(encoding.ids)] = 1
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        hidden = self._session.run(None, feeds)[0]
+        vectors = hidden[:, 0]  # CLS pooling
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.embed_batch_size):
+            batch = order[start:start + self.embed_batch_size]
+            for i, vector in zip(batch, self._run([texts[i] for i in batch])):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def _cached(self, text: str) -> List[float]:
+        with self._cache_lock:
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+                self._cache_hits += 1
+                return vector
+            self._cache_misses += 1
+        vector = self._encode([text])[0]
+        with self._cache_lock:
+            self._cache[text] = vector
+            while len(self._cache) > self.query_cache_size:
+                self._cache.popitem(last=False)
+        return vector
+
+    def cache_stats(self) -> dict:
+        with self._cache_lock:
+            return {"entries": len(self._cache), "hits": self._cache_hits, "misses": self._cache_misses}
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._cached(self.query_instruction + query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._cached(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        if len(texts) == 1:
+            return [self._cached(texts[0])]
+        return self._encode(texts)
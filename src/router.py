@@ -0,0 +1,95 @@
+# src/router.py
+import re
+import numpy as np
+
+# --- Routes a chat turn can take ---
+ROUTE_QUESTION = "question"    # "question 3" -> that question's insight section, no condense step
+ROUTE_PERSONA = "persona"      # "who are you?" -> canned answer, no LLM call
+ROUTE_OFF_TOPIC = "off_topic"  # "capital of France?" -> canned refusal, no LLM call
+ROUTE_RAG = "rag"              # anything else -> condense + retrieve
+
+QUESTION_PATTERN = re.compile(r"\b(?:question|ques|qn|q)\s*(?:no\.?|number|#)?\s*\.?\s*(\d+)\b", re.IGNORECASE)
+
+PERSONA_ANSWER = (
+    "I'm **Baaz Bot**, your friendly AI mentor! 🦅\n\n"
+    "I've gone through a detailed analysis of your exam answers, and I'm here to help you understand "
+    "where and why you lost marks. You can ask me things like:\n\n"
+    "* *Why did I lose marks on question 3?*\n"
+    "* *What did I do well overall?*\n"
+    "* *How can I improve my answer on question 2?*\n\n"
+    "What would you like to look at first?"
+)
+
+OFF_TOPIC_ANSWER = (
+    "That's a great question, but I can only help with questions about your exam evaluation. 😊\n\n"
+    "Try asking me about a specific question (e.g. *\"Why did I lose marks on question 3?\"*) "
+    "or about your overall performance!"
+)
+
+# Example messages for each intent; incoming messages are compared against their embeddings
+INTENT_EXAMPLES = {
+    ROUTE_PERSONA: [
+        "who are you", "what is your name", "what can you do", "how can you help me",
+        "are you a bot", "introduce yourself", "what are you", "who made you",
+    ],
+    ROUTE_OFF_TOPIC: [
+        "what is the capital of France", "tell me a joke", "what's the weather like today",
+        "who won the football match yesterday", "write me a poem", "recommend a good movie",
+        "what is the price of bitcoin", "how do I cook pasta",
+    ],
+    ROUTE_RAG: [
+        "why did I lose marks", "how did I do on the exam", "explain my mistake",
+        "what should I improve", "what did I get wrong", "can you explain that concept in more detail",
+        "what did I do well", "how can I get full marks next time", "what is the difference between a process and a thread",
+    ],
+}
+
+
+class QueryRouter:
+    """
+    Cheap local routing for chat turns, run before any LLM call.
+
+    Messages that mention exactly one question number go straight to that
+    question's section. Otherwise the message is embedded with the already
+    loaded embedding model and compared to the INTENT_EXAMPLES; only a
+    confident persona / off-topic match (similarity above `threshold` and at
+    least `margin` ahead of the exam-related examples) skips the LLM.
+    Everything else takes the regular condense + retrieve path.
+    """
+    def __init__(self, embed_model, threshold: float = 0.80, margin: float = 0.05):
+        self.embed_model = embed_model
+        self.threshold = threshold
+        self.margin = margin
+        self._intent_embeddings = None
+
+    def _embed(self, texts: list) -> np.ndarray:
+        vectors = np.asarray(self.embed_model.get_text_embedding_batch(texts), dtype=np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    def _intents(self) -> dict:
+        if self._intent_embeddings is None:
+            self._intent_embeddings = {intent: self._embed(examples) for intent, examples in INTENT_EXAMPLES.items()}
+        return self._intent_embeddings
+
+    def warm_up(self):
+        """Embeds the intent examples up front, so the first chat turn doesn't pay for it."""
+        self._intents()
+
+    def classify(self, message: str) -> dict:
+        """Returns the best similarity score per intent."""
+        query = self._embed([message])[0]
+        return {intent: float(np.max(vectors @ query)) for intent, vectors in self._intents().items()}
+
+    def route(self, message: str):
+        """Returns (route, question_id); question_id is only set for ROUTE_QUESTION."""
+        question_numbers = {int(number) for number in QUESTION_PATTERN.findall(message)}
+        if len(question_numbers) == 1:
+            return ROUTE_QUESTION, question_numbers.pop()
+        if question_numbers:
+            return ROUTE_RAG, None
+
+        scores = self.classify(message)
+        for intent in (ROUTE_PERSONA, ROUTE_OFF_TOPIC):
+            if scores[intent] >= self.threshold and scores[intent] - scores[ROUTE_RAG] >= self.margin:
+                return intent, None
+        return ROUTE_RAG, None
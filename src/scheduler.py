@@ -0,0 +1,173 @@
+# src/scheduler.py
+import os
+import re
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from src import telemetry
+
+
+class RateLimitError(Exception):
+    """
+    Raised when the LLM API rejects a request with HTTP 429 / RESOURCE_EXHAUSTED.
+    `retry_after` holds the server's retry hint in seconds, if it sent one.
+    """
+    def __init__(self, message: str = "", retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough for quota accounting."""
+    return max(1, len(text) // 4)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Recognises our own RateLimitError as well as google.api_core's ResourceExhausted."""
+    if isinstance(error, RateLimitError):
+        return True
+    if getattr(error, "code", None) == 429:
+        return True
+    return type(error).__name__ == "ResourceExhausted"
+
+
+def retry_hint(error: Exception):
+    """
+    Extracts the server's retry delay (in seconds) from a rate-limit error.
+    Returns None if the server didn't send one.
+    """
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is not None:
+        return float(retry_after)
+
+    message = str(error)
+    # Gemini puts the hint both in the message ("Please retry in 12.3s") and in
+    # a RetryInfo detail ("retry_delay { seconds: 12 }").
+    match = re.search(r"retry in ([\d.]+)\s*s", message, re.IGNORECASE)
+    if not match:
+        match = re.search(r"retry_delay\s*\{\s*seconds:\s*(\d+)", message)
+    return float(match.group(1)) if match else None
+
+
+class TokenBucket:
+    """
+    Requests-per-minute and tokens-per-minute buckets behind a single lock.
+
+    `reserve()` books capacity straight away and returns how long the caller has
+    to wait before using it, so concurrent callers queue up fairly instead of
+    polling. `pause()` stops everyone, e.g. after the server answers with a 429.
+    """
+    def __init__(self, rpm: float, tpm: float = None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._lock = threading.Lock()
+        self._requests = float(rpm)
+        self._tokens = float(tpm) if tpm else 0.0
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def reserve(self, tokens: int = 0) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+
+            # Balances may go negative; the debt is what the caller waits out.
+            self._requests -= 1
+            wait = max(0.0, -self._requests * 60 / self.rpm)
+            if self.tpm:
+                self._tokens -= min(tokens, self.tpm)
+                wait = max(wait, -self._tokens * 60 / self.tpm)
+
+            return max(wait, self._paused_until - now)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            # The server disagrees with our count, so drop any burst credit and
+            # fall back to steady pacing once the pause is over.
+            self._requests = min(self._requests, 0.0)
+
+
+class RequestScheduler:
+    """
+    Runs LLM calls under a shared RPM/TPM quota.
+
+    `call()` waits for quota, makes the request and, on a 429, pauses the whole
+    bucket for the server's retry hint (or an exponential backoff) before
+    retrying. At most `max_concurrency` requests are in flight at once across
+    every caller, however many threads or nested `map()` calls there are.
+    `map()` runs many calls concurrently and returns results in input order.
+    The request function is just a callable, so a local fake LLM can be
+    plugged in for testing.
+    """
+    def __init__(self, rpm: float, tpm: float = None, max_concurrency: int = 4, max_retries: int = 5):
+        self.bucket = TokenBucket(rpm, tpm)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def _backoff(self, error: Exception, attempt: int) -> float:
+        delay = retry_hint(error)
+        if delay is None:
+            delay = 2.0 * (2 ** attempt)
+        self.bucket.pause(delay)
+        telemetry.inc("llm_rate_limited_total")
+        telemetry.add("rate_limited")
+        print(f"⏳ Rate limited by the API. Backing off for {delay:.1f} seconds...")
+        return delay
+
+    def call(self, fn, prompt: str, tokens: int = None):
+        if tokens is None:
+            tokens = estimate_tokens(prompt)
+
+        for attempt in range(self.max_retries + 1):
+            wait = self.bucket.reserve(tokens)
+            if wait > 0:
+                telemetry.add("quota_wait_s", round(wait, 3))
+                time.sleep(wait)
+            try:
+                # Only the request itself holds a slot, not the quota wait or a backoff
+                with self._slots:
+                    return fn(prompt)
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == self.max_retries:
+                    raise
+                self._backoff(e, attempt)
+
+    def map(self, fn, items: list) -> list:
+        """Applies `fn` to every item concurrently; results keep the order of `items`."""
+        if not items:
+            return []
+        # Each call runs in a copy of the caller's context, so its spans nest under the caller's
+        contexts = [contextvars.copy_context() for _ in items]
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(items))) as executor:
+            return list(executor.map(lambda context, item: context.run(fn, item), contexts, items))
+
+
+# --- Process-wide scheduler shared by every Gemini call ---
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> RequestScheduler:
+    """
+    Returns the shared scheduler, configured from the environment:
+    GEMINI_RPM, GEMINI_TPM and GEMINI_MAX_CONCURRENCY.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler(
+                rpm=float(os.getenv("GEMINI_RPM", "10")),
+                tpm=float(os.getenv("GEMINI_TPM", "250000")) or None,
+                max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "4")),
+            )
+        return _scheduler
@@ -0,0 +1,99 @@
+# src/semantic_cache.py
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+class SemanticCache:
+    """
+    Caches chat answers by the meaning of the question rather than its exact text.
+
+    Questions are embedded with the already loaded embedding model and
+    compared (cosine similarity) against earlier questions in the same
+    scope: one student, one version of their insights, and whatever extra
+    key the caller adds (e.g. the question number). A match above
+    `threshold` returns the stored answer without any LLM call.
+
+    Scopes are small (one student's questions), so each is searched with a
+    single matrix-vector product. Entries expire after `ttl` seconds and the
+    least recently used are evicted beyond `max_entries`. A scope whose
+    insights version changes is dropped on its next lookup.
+    """
+    def __init__(self, embed_model, threshold: float = 0.92, ttl: float = 86400, max_entries: int = 5000):
+        self.embed_model = embed_model
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # (student_id, key) -> {"version", "entries": OrderedDict(entry_id -> (vector, question, answer, created))}
+        self._scopes = {}
+        # entry_id -> scope, oldest use first, for global LRU eviction
+        self._lru = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def embed(self, message: str) -> np.ndarray:
+        vector = np.asarray(self.embed_model.get_text_embedding(message), dtype=np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def _scope(self, student_id: str, version: str, key, create: bool = False):
+        scope = self._scopes.get((student_id, key))
+        if scope is not None and scope["version"] != version:
+            # The student's insights changed since these answers were cached
+            for entry_id in self._scopes.pop((student_id, key))["entries"]:
+                self._lru.pop(entry_id, None)
+            scope = None
+        if scope is None and create:
+            scope = self._scopes[(student_id, key)] = {"version": version, "entries": OrderedDict()}
+        return scope
+
+    def _evict(self, entry_id):
+        scope_key = self._lru.pop(entry_id)
+        scope = self._scopes[scope_key]
+        scope["entries"].pop(entry_id, None)
+        if not scope["entries"]:
+            del self._scopes[scope_key]
+
+    def lookup(self, student_id: str, version: str, message: str, key=None, vector: np.ndarray = None):
+        """Returns the cached answer for a close enough earlier question, or None."""
+        if vector is None:
+            vector = self.embed(message)
+        now = time.time()
+        with self._lock:
+            scope = self._scope(student_id, version, key)
+            entries = scope["entries"] if scope is not None else {}
+            for entry_id in [entry_id for entry_id, entry in entries.items() if now - entry[3] > self.ttl]:
+                self._evict(entry_id)
+            if not entries:
+                self.misses += 1
+                return None
+
+            entry_ids = list(entries)
+            scores = np.stack([entries[entry_id][0] for entry_id in entry_ids]) @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._lru.move_to_end(entry_ids[best])
+            return entries[entry_ids[best]][2]
+
+    def store(self, student_id: str, version: str, message: str, answer: str, key=None, vector: np.ndarray = None):
+        if not answer:
+            return
+        if vector is None:
+            vector = self.embed(message)
+        with self._lock:
+            scope = self._scope(student_id, version, key, create=True)
+            entry_id = self._next_id
+            self._next_id += 1
+            scope["entries"][entry_id] = (vector, message, answer, time.time())
+            self._lru[entry_id] = (student_id, key)
+            while len(self._lru) > self.max_entries:
+                self._evict(next(iter(self._lru)))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._lru), "scopes": len(self._scopes), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,108 @@
+# src/session_store.py
+import json
+import time
+import threading
+from collections import OrderedDict
+from llama_index.core.llms import ChatMessage
+from llama_index.core.memory import ChatMemoryBuffer
+
+
+class ChatSession:
+    """One live conversation: its chat engine, the memory the engine writes to, and a lock for turns."""
+    def __init__(self, session_id: str, student_id: str, memory: ChatMemoryBuffer, engine):
+        self.session_id = session_id
+        self.student_id = student_id
+        self.memory = memory
+        self.engine = engine
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+
+class SessionStore:
+    """
+    Server-side chat sessions keyed by session id.
+
+    Live sessions (chat engine + memory) are kept in an in-process LRU and
+    dropped after `ttl` seconds without use, so the engine is built once per
+    session rather than on every request. Each memory is capped at
+    `token_limit` tokens of history.
+
+    If a key-value `backend` is given (anything with get/set/delete, e.g.
+    src.cache.SQLiteCache), histories are also saved there after every turn,
+    so a session that was evicted, or lived in a restarted process, picks up
+    where it left off.
+    """
+    def __init__(self, engine_factory, token_limit: int = 3000, max_sessions: int = 1000,
+                 ttl: float = 3600, backend=None):
+        # engine_factory(student_id, memory) -> chat engine
+        self.engine_factory = engine_factory
+        self.token_limit = token_limit
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.backend = backend
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _expire(self, now: float):
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_used < self.ttl:
+                break
+            self._sessions.popitem(last=False)
+
+    def _load_history(self, session_id: str, student_id: str) -> list:
+        if self.backend is None:
+            return []
+        saved = self.backend.get(session_id)
+        if saved is None:
+            return []
+        saved = json.loads(saved)
+        if saved["student_id"] != student_id or time.time() - saved["saved_at"] > self.ttl:
+            return []
+        return [ChatMessage.model_validate(message) for message in saved["history"]]
+
+    def get(self, session_id: str, student_id: str) -> ChatSession:
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is not None and session.student_id == student_id:
+                session.last_used = now
+                self._sessions.move_to_end(session_id)
+                return session
+
+        memory = ChatMemoryBuffer.from_defaults(
+            chat_history=self._load_history(session_id, student_id),
+            token_limit=self.token_limit,
+        )
+        session = ChatSession(session_id, student_id, memory, self.engine_factory(student_id, memory))
+
+        with self._lock:
+            # Another request may have created it meanwhile; keep the first one
+            existing = self._sessions.get(session_id)
+            if existing is not None and existing.student_id == student_id:
+                return existing
+            self._sessions[session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session
+
+    def save(self, session: ChatSession):
+        """Trims the history to the token budget and persists it. Call after each completed turn."""
+        # memory.get() returns the most recent messages that fit within token_limit
+        session.memory.set(session.memory.get())
+        if self.backend is not None:
+            self.backend.set(session.session_id, json.dumps({
+                "student_id": session.student_id,
+                "saved_at": time.time(),
+                "history": [message.model_dump(mode="json") for message in session.memory.get_all()],
+            }))
+
+    def drop(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        if self.backend is not None:
+            self.backend.delete(session_id)
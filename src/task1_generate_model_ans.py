@@ -1,111 +1,89 @@
 # src/task1_generate_model_answers.py
 import json
 import re
-import time
 import os
+import math
+import time
+import threading
+import contextvars
 from src.llm_client import get_gemini_response
-from src.utils import extract_text_from_image, parse_answers_with_llm
+from src.scheduler import get_scheduler
+from src.utils import ocr_pages, parse_answers
+from src.batch_grading import grade_in_batches
+from src.answer_segmenter import closed_answers, segment_answers, NO_ANSWER, SEGMENT_CONFIDENCE_THRESHOLD
+from src.insights_checkpoint import InsightsCheckpoint, checkpoint_path, grading_key
+from src import telemetry
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
 # Define paths for clarity
 QUESTIONS_FILE = 'data/questions.json'
 MODEL_ANSWERS_FILE = 'data/model_answers.json'
 INSIGHTS_FILE = 'data/insights.txt'
 
+# Cohort layout: data/exam_x/<student>/page_*.png -> data/exam_x/insights/<student>.txt
+COHORT_INSIGHTS_DIR = 'insights'
+IMAGE_PATTERNS = ("*.png", "*.jpg")
+PAGE_SEPARATOR = "\n\n--- Page Break ---\n\n"
+
+# "per-question" (default): one parse request plus one per question; "batched" (opt-in): a few JSON requests per student
+GRADING_MODE = os.getenv("GRADING_MODE", "per-question")
+
+
+def find_answer_images(answer_path: Path) -> list:
+    """Returns the answer-script pages in a directory, in page order."""
+    return sorted(image for pattern in IMAGE_PATTERNS for image in answer_path.glob(pattern))
+
+
+def write_text_atomic(path: str, text: str):
+    """Writes via a temp file + rename, so a crash never leaves a half-written file behind."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
 
-def generate_model_answers():
+
+def generate_model_answers(questions_file: str = QUESTIONS_FILE, model_answers_file: str = MODEL_ANSWERS_FILE):
     """
     Generates a model answer for each question and saves them to a file.
     """
     print("🚀 Starting: Generating Model Answers...")
 
-    with open(QUESTIONS_FILE, 'r', encoding='utf-8') as f:
+    with open(questions_file, 'r', encoding='utf-8') as f:
         questions = json.load(f)
 
-    model_answers = []
+    prompts = []
     for q in questions:
-        question_id = q['id']
         question_text = q['question']
         max_marks = q['max_marks']
 
-        print(f"\n🧠 Generating model answer for Question {question_id}...")
         prompt_model_answer = f"""
 You are a University Professor and Chief Examiner...
 # (Your full prompt here)
 **Question:** "{question_text}"
 **Maximum Marks:** {max_marks}
 """
-        model_answer_text = get_gemini_response(prompt_model_answer)
-        model_answers.append({"question_id": question_id, "model_answer": model_answer_text})
+        prompts.append(prompt_model_answer)
 
-        print("🕒 Waiting for 20 seconds before the next request...")
-        time.sleep(20)
+    # Requests run concurrently under the shared RPM/TPM quota; results keep question order
+    scheduler = get_scheduler()
+    print(f"\n🧠 Generating model answers for {len(questions)} questions (up to {scheduler.max_concurrency} at a time)...")
+    with telemetry.span("model_answers", questions=len(questions)):
+        answers = scheduler.map(get_gemini_response, prompts)
+    model_answers = [
+        {"question_id": q['id'], "model_answer": answer_text}
+        for q, answer_text in zip(questions, answers)
+    ]
 
     # This block is correctly placed OUTSIDE the for loop
-    with open(MODEL_ANSWERS_FILE, 'w', encoding='utf-8') as f:
+    with open(model_answers_file, 'w', encoding='utf-8') as f:
         json.dump(model_answers, f, indent=4)
-    print(f"\n✅ Model answers saved to {MODEL_ANSWERS_FILE}")
-
-
-def generate_insights(answer_dir: str):
-    """
-    Generates insights by processing all images in a given directory.
-    """
-    print(f"🚀 Starting: Generating Insights from directory: {answer_dir}")
-
-    answer_path = Path(answer_dir)
-    if not answer_path.is_dir():
-        print(f"❌ Error: Directory not found at {answer_dir}")
-        return
-
-    if not os.path.exists(MODEL_ANSWERS_FILE):
-        print(f"❌ Error: Model answers file not found at {MODEL_ANSWERS_FILE}")
-        return
-
-    # Step 1: OCR
-    all_text = []
-    image_files = sorted(list(answer_path.glob("*.png")) + list(answer_path.glob("*.jpg")))
-    if not image_files:
-        print(f"❌ No image files found in {answer_dir}. Aborting.")
-        return
-
-    print(f"📄 Found {len(image_files)} pages to process. Starting OCR...")
-    for image_path in image_files:
-        text = extract_text_from_image(str(image_path))
-        all_text.append(text)
-    student_answer_full_text = "\n\n--- Page Break ---\n\n".join(all_text)
-    print("✅ All pages processed successfully via OCR.")
-    
-    # Step 2: Load Data
-    with open(QUESTIONS_FILE, 'r', encoding='utf-8') as f:
-        questions = json.load(f)
-    with open(MODEL_ANSWERS_FILE, 'r', encoding='utf-8') as f:
-        model_answers_list = json.load(f)
-    
-    # Step 3: LLM Parsing
-    parsed_answers = parse_answers_with_llm(student_answer_full_text, questions)
-    if not parsed_answers:
-        print("❌ Aborting insights generation due to parsing failure.")
-        return
-
-    model_answers_dict = {item['question_id']: item['model_answer'] for item in model_answers_list}
-
-    # Step 4: Generate Insights for Each Question (The Loop)
-    all_insights = []
-    for q in questions:
-        question_id = q['id']
-        question_text = q['question']
-        max_marks = q['max_marks']
-        
-        student_answer_for_q = parsed_answers.get(question_id, "No answer provided")
-        model_answer_text = model_answers_dict.get(question_id, "Model answer not found.")
+    print(f"\n✅ Model answers saved to {model_answers_file}")
 
-        if model_answer_text == "Model answer not found.":
-            print(f"⚠️ Warning: Skipping Question {question_id} as no model answer was found.")
-            continue
 
-        print(f"\n 🕵️‍♀️ Generating insights for Question {question_id}...")
-        prompt_analysis = f"""
+def build_analysis_prompt(question_text: str, model_answer_text: str, student_answer: str) -> str:
+    """The per-question grading prompt: rubric, question, model answer and the student's answer."""
+    return f"""
 You are an empathetic yet rigorous Teaching Assistant. Your primary goal is to help the student understand their mistakes and learn from them.
 **Task:** Create a detailed, multi-part feedback report by comparing the student's answer to the model answer. This report will be the *only* document the student sees, so it must be self-contained, clear, and actionable. It will also be used as a knowledge base for a support chatbot, so a predictable, detailed structure is critical.
 **Required Output Structure:**
@@ -127,23 +105,384 @@ Suggest concrete next steps for the student. For example: "To improve, the stude
 **Model Answer:**
 "{model_answer_text}"
 **Student's Answer:**
-"{student_answer_for_q}"
+"{student_answer}"
 """
-        insight_text = get_gemini_response(prompt_analysis)
-        
-        formatted_insight = f"""
+
+
+def format_insight(q: dict, insight_text: str) -> str:
+    return f"""
 ==================================================
-Analysis for Question {question_id}: {question_text}
+Analysis for Question {q['id']}: {q['question']}
 ==================================================
 {insight_text}
 """
-        all_insights.append(formatted_insight)
-        
-        print("🕒 Waiting for 20 seconds before the next request...")
-        time.sleep(20)
-
-    # --- Step 5: Save the Final Insights File ---
-    # This block is now correctly placed OUTSIDE and AFTER the for loop
-    with open(INSIGHTS_FILE, 'w', encoding='utf-8') as f:
-        f.write("".join(all_insights))
-    print(f"\n✅ Analysis insights saved to {INSIGHTS_FILE}")
\ No newline at end of file
+
+
+def grade_answers(script_text: str, questions: list, graded_questions: list, model_answers: dict, mode: str = None,
+                  answers: dict = None, min_batches: int = None, on_graded=None):
+    """
+    Grades each of `graded_questions` against the OCR text of the whole
+    answer script. Returns {question_id: feedback text}, or None if the
+    script could not be parsed.
+
+    "per-question" mode (GRADING_MODE, the default) splits the script into
+    answers (locally if its question markers are clear, else with one LLM
+    request), then sends one grading request per question. "batched" mode
+    finds and grades the answers in a few JSON requests; questions whose
+    result fails validation are then graded one by one.
+
+    `answers` ({question_id: answer}) skips the split when the answers are
+    already known. `on_graded(question_id, feedback)` is called as soon as
+    each question's feedback arrives, from a worker thread.
+    """
+    mode = mode or GRADING_MODE
+    insights, student_answers = {}, dict(answers or {})
+    if mode == "batched":
+        insights, extracted = grade_in_batches(script_text, graded_questions, model_answers, min_batches, on_graded)
+        for question_id, answer in extracted.items():
+            student_answers.setdefault(question_id, answer)
+
+    pending = [q for q in graded_questions if q['id'] not in insights]
+    telemetry.annotate(mode=mode, graded_in_batches=len(insights), graded_one_by_one=len(pending))
+    if not pending:
+        return insights
+    if mode == "batched":
+        print(f"↩️ Falling back to per-question grading for question(s) {[q['id'] for q in pending]}...")
+
+    if any(q['id'] not in student_answers for q in pending):
+        parsed_answers = parse_answers(script_text, questions)
+        if not parsed_answers:
+            return None
+        for q in pending:
+            student_answers.setdefault(q['id'], parsed_answers.get(q['id'], "No answer provided"))
+
+    def grade_question(q: dict) -> str:
+        insight_text = get_gemini_response(build_analysis_prompt(q['question'], model_answers[q['id']], student_answers[q['id']]))
+        if insight_text and on_graded:
+            on_graded(q['id'], insight_text)
+        return insight_text
+
+    # Generate the insights concurrently under the shared RPM/TPM quota
+    scheduler = get_scheduler()
+    print(f"\n 🕵️‍♀️ Generating insights for {len(pending)} questions (up to {scheduler.max_concurrency} at a time)...")
+    for q, insight_text in zip(pending, scheduler.map(grade_question, pending)):
+        insights[q['id']] = insight_text
+    return insights
+
+
+class StreamingGrader:
+    """
+    Grades a script's questions while its pages are still being OCR'd, and
+    writes each one out as soon as it is graded.
+
+    `submit()` takes answers that are already known (closed by the next
+    question's marker) and grades them in the background, `group_size` at a
+    time: a batched request's worth in batched mode, one in per-question
+    mode. `grade_script()` grades whatever is left from the whole script.
+
+    Every graded question is appended to the checkpoint, and the insights
+    file is rewritten atomically with all questions graded so far, in
+    question order. The RAG index can pick those up before the script is
+    finished. Questions the checkpoint already has for the same answer and
+    model answer are reused rather than regraded.
+    """
+    def __init__(self, questions: list, graded_questions: list, model_answers: dict, insights_file: str, mode: str = None):
+        self.questions = questions
+        self.graded_questions = graded_questions
+        self.model_answers = model_answers
+        self.insights_file = insights_file
+        self.mode = mode or GRADING_MODE
+        self.checkpoint = InsightsCheckpoint(insights_file)
+        self.results = {}     # question_id -> feedback text, this run
+        self.sources = {}     # question_id -> the text it is being graded from
+        self.reused = 0
+        self._by_id = {q['id']: q for q in graded_questions}
+        self._waiting = []    # known answers not yet sent, until a group is full
+        self._lock = threading.Lock()
+        # Graded in the caller's context, so the LLM spans nest under its span rather than under "ocr"
+        self._context = contextvars.copy_context()
+
+        scheduler = get_scheduler()
+        self.group_size = 1
+        if self.mode == "batched":
+            self.group_size = max(1, math.ceil(len(graded_questions) / scheduler.max_concurrency))
+        self._executor = ThreadPoolExecutor(max_workers=scheduler.max_concurrency)
+        self._futures = []
+
+    def _key(self, question_id: int) -> str:
+        return grading_key(self.model_answers[question_id], self.sources[question_id])
+
+    def _store(self, question_id: int, insight: str, key: str, checkpoint: bool = True):
+        if not insight:
+            # The LLM layer returns "" on failure: left ungraded, so the next run retries it
+            print(f"   ⚠️ Question {question_id} could not be graded; it will be retried on the next run.")
+            return
+        with self._lock:
+            if key != self._key(question_id):
+                return  # graded from text that has changed since (the answer continued on a later page)
+            self.results[question_id] = insight
+            # The checkpoint exists before the insights file is first written, so a partial
+            # file is never mistaken for a finished one
+            self.checkpoint.create()
+            if checkpoint:
+                self.checkpoint.record(question_id, key, insight)
+            done = self._write()
+        if checkpoint:
+            print(f"   ✅ Question {question_id} graded ({done}/{len(self.graded_questions)})")
+
+    def _write(self) -> int:
+        """Rewrites the insights file with the questions graded so far; call with the lock held."""
+        done = [q for q in self.graded_questions if q['id'] in self.results]
+        write_text_atomic(self.insights_file, "".join(format_insight(q, self.results[q['id']]) for q in done))
+        return len(done)
+
+    def _reuse(self, question_id: int) -> bool:
+        key = self._key(question_id)
+        insight = self.checkpoint.get(question_id, key)
+        if insight is None:
+            return False
+        self._store(question_id, insight, key, checkpoint=False)
+        self.reused += 1
+        return True
+
+    def submit(self, answers: dict, final: bool = False):
+        """Queues known answers for grading; with final=True also sends a last, smaller group."""
+        for question_id, answer in answers.items():
+            if question_id not in self._by_id or self.sources.get(question_id) == answer:
+                continue
+            with self._lock:
+                self.sources[question_id] = answer
+                # Graded from text that has changed: dropped now, so a failed regrade leaves it ungraded
+                if self.results.pop(question_id, None) is not None:
+                    self._write()
+            if not self._reuse(question_id):
+                self._waiting.append(question_id)
+        while len(self._waiting) >= self.group_size or (final and self._waiting):
+            group, self._waiting = self._waiting[:self.group_size], self._waiting[self.group_size:]
+            self._futures.append(self._executor.submit(self._context.copy().run, self._grade_group, group))
+
+    def _grade_group(self, group: list):
+        answers = {question_id: self.sources[question_id] for question_id in group}
+        keys = {question_id: self._key(question_id) for question_id in group}
+        # Just these answers, marked so the batched prompt can tell them apart
+        excerpt = "\n\n".join(f"Q{question_id}. {answer}" for question_id, answer in answers.items())
+        insights = grade_answers(excerpt, self.questions, [self._by_id[question_id] for question_id in group],
+                                 self.model_answers, mode=self.mode, answers=answers, min_batches=1,
+                                 on_graded=lambda question_id, insight: self._store(question_id, insight, keys[question_id]))
+        for question_id in group:
+            if question_id not in self.results:
+                self._store(question_id, insights.get(question_id, ""), keys[question_id])
+
+    def grade_script(self, script_text: str) -> bool:
+        """
+        Grades the questions no answer was submitted for from the whole
+        script; False if it couldn't be parsed. If some answers were graded
+        early, the script is parsed first and every parsed answer goes through
+        submit(), so one the parse split differently is regraded.
+        """
+        if self.sources:
+            answers = parse_answers(script_text, self.questions)
+            if not answers:
+                return False
+            self.submit({q['id']: answers.get(q['id'], NO_ANSWER) for q in self.graded_questions}, final=True)
+            return True
+
+        remaining = [q for q in self.graded_questions if q['id'] not in self.sources]
+        for q in remaining:
+            self.sources[q['id']] = script_text
+        remaining = [q for q in remaining if not self._reuse(q['id'])]
+        if not remaining:
+            return True
+        keys = {q['id']: self._key(q['id']) for q in remaining}
+        insights = grade_answers(script_text, self.questions, remaining, self.model_answers, mode=self.mode,
+                                 on_graded=lambda question_id, insight: self._store(question_id, insight, keys[question_id]))
+        if insights is None:
+            return False
+        for q in remaining:
+            if q['id'] not in self.results:
+                self._store(q['id'], insights.get(q['id'], ""), keys[q['id']])
+        return True
+
+    def wait(self):
+        for future in self._futures:
+            future.result()
+
+    def close(self):
+        """Stops the workers; groups not yet started are dropped (their questions stay ungraded)."""
+        self._executor.shutdown(cancel_futures=True)
+
+    def complete(self) -> bool:
+        """True once every question has non-empty feedback."""
+        return all(self.results.get(q['id']) for q in self.graded_questions)
+
+
+def generate_insights(answer_dir: str, insights_file: str = INSIGHTS_FILE,
+                      questions_file: str = QUESTIONS_FILE, model_answers_file: str = MODEL_ANSWERS_FILE) -> bool:
+    """
+    Generates insights by processing all images in a given directory.
+    Answers are graded as soon as OCR shows they are complete, and the
+    insights file grows as questions are graded (see StreamingGrader).
+    Returns True once the insights file has been written in full.
+    """
+    with telemetry.span("generate_insights", answer_dir=str(answer_dir)) as span:
+        written = _generate_insights(answer_dir, insights_file, questions_file, model_answers_file)
+        span.set(written=written)
+        return written
+
+
+def _generate_insights(answer_dir: str, insights_file: str, questions_file: str, model_answers_file: str) -> bool:
+    print(f"🚀 Starting: Generating Insights from directory: {answer_dir}")
+
+    answer_path = Path(answer_dir)
+    if not answer_path.is_dir():
+        print(f"❌ Error: Directory not found at {answer_dir}")
+        return False
+
+    if not os.path.exists(model_answers_file):
+        print(f"❌ Error: Model answers file not found at {model_answers_file}")
+        return False
+
+    image_files = find_answer_images(answer_path)
+    if not image_files:
+        print(f"❌ No image files found in {answer_dir}. Aborting.")
+        return False
+
+    # Step 1: Load Data
+    with open(questions_file, 'r', encoding='utf-8') as f:
+        questions = json.load(f)
+    with open(model_answers_file, 'r', encoding='utf-8') as f:
+        model_answers_list = json.load(f)
+
+    model_answers_dict = {item['question_id']: item['model_answer'] for item in model_answers_list}
+    graded_questions = []
+    for q in questions:
+        if q['id'] not in model_answers_dict:
+            print(f"⚠️ Warning: Skipping Question {q['id']} as no model answer was found.")
+            continue
+        graded_questions.append(q)
+
+    grader = StreamingGrader(questions, graded_questions, model_answers_dict, insights_file)
+    if len(grader.checkpoint):
+        print(f"♻️ Resuming: {len(grader.checkpoint)} questions already graded in {grader.checkpoint.path}")
+
+    try:
+        # Step 2: OCR, grading each answer as soon as the next question's marker shows it is complete
+        all_text = []
+        print(f"📄 Found {len(image_files)} pages to process. Starting OCR...")
+        ocr_start = time.perf_counter()
+        stage_totals = {"preprocess": 0.0, "tesseract": 0.0}
+        with telemetry.span("ocr", pages=len(image_files)):
+            for image_path, text, timings in ocr_pages(image_files):
+                all_text.append(text)
+                grader.submit(closed_answers(PAGE_SEPARATOR.join(all_text), questions))
+                if timings.get("cached"):
+                    print(f"   ♻️ {Path(image_path).name}: unchanged, using cached OCR text")
+                    continue
+                for stage in stage_totals:
+                    stage_totals[stage] += timings[stage]
+                print(f"   📄 {Path(image_path).name}: preprocess {timings['preprocess']:.2f}s, tesseract {timings['tesseract']:.2f}s")
+        student_answer_full_text = PAGE_SEPARATOR.join(all_text)
+        graded_early = len(grader.sources)
+        print(f"✅ All pages processed successfully via OCR in {time.perf_counter() - ocr_start:.2f}s "
+              f"(CPU time: preprocess {stage_totals['preprocess']:.2f}s, tesseract {stage_totals['tesseract']:.2f}s), "
+              f"{graded_early} answers already sent for grading.")
+
+        # Step 3: Grade the rest. With clear markers the local answers are final; otherwise the whole
+        # script is parsed (by the LLM) and graded. Either way, an answer graded early whose final
+        # text differs is regraded from the final text.
+        with telemetry.span("grade_answers", questions=len(graded_questions), graded_early=graded_early):
+            answers, confidence = segment_answers(student_answer_full_text, questions)
+            found = sum(answer != NO_ANSWER for answer in answers.values())
+            if confidence >= SEGMENT_CONFIDENCE_THRESHOLD and found:
+                print(f"✂️ Segmented {found}/{len(questions)} answers locally (confidence {confidence:.2f}).")
+                grader.submit(answers, final=True)
+                parsed = True
+            else:
+                grader.submit({}, final=True)
+                parsed = grader.grade_script(student_answer_full_text)
+            grader.wait()
+    finally:
+        grader.close()
+    telemetry.annotate(reused=grader.reused)
+
+    if not parsed:
+        print(f"❌ Aborting insights generation due to parsing failure. "
+              f"{len(grader.results)} graded questions kept in {insights_file} for the next run.")
+        return False
+    if not grader.complete():
+        print("⚠️ Some questions were not graded; they will be retried on the next run.")
+        return False
+
+    # --- Step 4: Save the Final Insights File (in question order) ---
+    write_text_atomic(insights_file, "".join(format_insight(q, grader.results[q['id']]) for q in graded_questions))
+    grader.checkpoint.remove()
+    print(f"\n✅ Analysis insights saved to {insights_file}")
+    return True
+
+
+def generate_cohort(exam_dir: str, workers: int = None):
+    """
+    Generates insights for every student folder inside an exam directory.
+
+    Model answers are generated once (or reused) and shared by all students.
+    Students run in parallel through a worker pool; their LLM calls still share
+    the global RPM/TPM quota and GEMINI_MAX_CONCURRENCY requests in flight, so
+    more workers overlap OCR and grading without exceeding the API's limits.
+    Each student's insights are written atomically to
+    <exam_dir>/insights/<student>.txt, and students that already have a
+    complete one are skipped. An interrupted student resumes from their
+    checkpoint, so a re-run picks up where it left off.
+    """
+    print(f"🚀 Starting: Generating Insights for cohort in: {exam_dir}")
+
+    exam_path = Path(exam_dir)
+    if not exam_path.is_dir():
+        print(f"❌ Error: Directory not found at {exam_dir}")
+        return
+
+    output_dir = exam_path / COHORT_INSIGHTS_DIR
+    output_dir.mkdir(exist_ok=True)
+
+    # An exam may ship its own questions.json; otherwise the default one is used
+    questions_file = exam_path / 'questions.json'
+    if not questions_file.exists():
+        questions_file = Path(QUESTIONS_FILE)
+    model_answers_file = exam_path / 'model_answers.json'
+    if not model_answers_file.exists():
+        generate_model_answers(str(questions_file), str(model_answers_file))
+    else:
+        print(f"♻️ Reusing model answers from {model_answers_file}")
+
+    student_dirs = sorted(
+        path for path in exam_path.iterdir()
+        if path.is_dir() and path.name != COHORT_INSIGHTS_DIR and find_answer_images(path)
+    )
+    # A student is done once their insights file is complete, i.e. has no checkpoint left beside it
+    pending = [
+        path for path in student_dirs
+        if not (output_dir / f"{path.name}.txt").exists() or os.path.exists(checkpoint_path(output_dir / f"{path.name}.txt"))
+    ]
+    print(f"👩‍🎓 Found {len(student_dirs)} students, {len(student_dirs) - len(pending)} already done, {len(pending)} to process.")
+    if not pending:
+        return
+
+    def process_student(student_dir: Path) -> bool:
+        try:
+            return generate_insights(
+                str(student_dir),
+                insights_file=str(output_dir / f"{student_dir.name}.txt"),
+                questions_file=str(questions_file),
+                model_answers_file=str(model_answers_file),
+            )
+        except Exception as e:
+            print(f"❌ Error while processing {student_dir.name}: {e}")
+            return False
+
+    workers = workers or int(os.getenv("COHORT_WORKERS", "4"))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(process_student, pending))
+
+    failed = [path.name for path, ok in zip(pending, results) if not ok]
+    print(f"\n✅ Cohort done: {len(pending) - len(failed)} students processed, insights saved to {output_dir}")
+    if failed:
+        print(f"⚠️ {len(failed)} students failed and will be retried on the next run: {', '.join(failed)}")
\ No newline at end of file
@@ -1,17 +1,21 @@
 # src/task2_build_rag.py
 
 import os
+import json
+import hashlib
 from pathlib import Path  # NEW: Import for modern path handling
 from dotenv import load_dotenv
 from llama_index.core import (
+    Document,
     VectorStoreIndex,
-    SimpleDirectoryReader,
     Settings,
     StorageContext,
     load_index_from_storage,
 )
-from llama_index.llms.gemini import Gemini
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+from llama_index.core.vector_stores import MetadataFilters, ExactMatchFilter, SimpleVectorStore
+from src.insights_parser import InsightsNodeParser, split_questions
+from src.memmap_vector_store import MemmapVectorStore
+from src import telemetry
 
 # Load environment variables
 load_dotenv()
@@ -19,44 +23,310 @@ load_dotenv()
 # --- NEW: Define constants for paths ---
 DATA_DIR = Path("./data")
 PERSIST_DIR = Path("./storage") # Directory to store the index
+# Maps each indexed file to its content hash and the hash of every per-question document it produced
+MANIFEST_FILE = PERSIST_DIR / "manifest.json"
 
-def setup_rag_system():
+# Only insights are indexed, partitioned by student:
+#   data/insights.txt                       -> student "default"
+#   data/<exam>/insights/<student>.txt      -> student "<exam>/<student>" (the generate-cohort layout)
+INSIGHTS_FILE = DATA_DIR / "insights.txt"
+COHORT_INSIGHTS_GLOB = "*/insights/*.txt"
+DEFAULT_STUDENT_ID = "default"
+
+# --- Vector store: "memmap" keeps embeddings in a memory-mapped array (src/memmap_vector_store.py);
+# "simple" is LlamaIndex's default JSON store, parsed in full at every start ---
+VECTOR_STORE = os.getenv("VECTOR_STORE", "memmap").lower()
+VECTOR_STORE_DTYPE = os.getenv("VECTOR_STORE_DTYPE", "float32")  # or int8, for newly built stores
+VECTOR_STORE_ANN = os.getenv("VECTOR_STORE_ANN", "0").lower() in ("1", "true", "yes")  # needs hnswlib
+SIMPLE_VECTOR_STORE_FILE = "default__vector_store.json"
+
+# --- Embedding model: downloaded from the HuggingFace Hub unless EMBED_MODEL_PATH points to a local copy ---
+EMBED_MODEL_NAME = "BAAI/bge-small-en-v1.5"
+# A snapshot saved with `python main.py download-embed-model`; startup then needs no network
+EMBED_MODEL_PATH = os.getenv("EMBED_MODEL_PATH")
+DEFAULT_EMBED_MODEL_DIR = Path("./models/bge-small-en-v1.5")
+
+# --- Embedding backend: "hf" (sentence-transformers on torch) or "onnx" (src/onnx_embedding.py, int8 on CPU) ---
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "hf").lower()
+# An export made with `python main.py export-onnx-embed-model`
+EMBED_ONNX_PATH = os.getenv("EMBED_ONNX_PATH")
+DEFAULT_ONNX_EMBED_MODEL_DIR = Path("./models/bge-small-en-v1.5-onnx")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", "0"))  # onnx only; 0 = onnxruntime's default
+EMBED_QUERY_CACHE_SIZE = int(os.getenv("EMBED_QUERY_CACHE_SIZE", "1024"))  # onnx only
+
+def hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def find_insight_files() -> dict:
+    """Returns {path: student_id} for every insights file under DATA_DIR."""
+    files = {}
+    if INSIGHTS_FILE.exists():
+        files[str(INSIGHTS_FILE)] = DEFAULT_STUDENT_ID
+    for path in sorted(DATA_DIR.glob(COHORT_INSIGHTS_GLOB)):
+        files[str(path)] = f"{path.parent.parent.name}/{path.stem}"
+    return files
+
+def question_doc_id(student_id: str, question_id) -> str:
+    """Stable document id for one student's analysis of one question."""
+    return f"{student_id}:q{question_id}"
+
+def split_insights(text: str, student_id: str) -> list:
     """
-    Sets up the RAG system by creating or loading a vector index.
-    The index is built from the insights and model answers.
+    Splits an insights file into one Document per 'Analysis for Question N'
+    section, tagged with student_id and question_id metadata so retrieval can
+    be filtered to a single student (and question).
     """
-    print("Setting up RAG system...")
-    
+    questions = split_questions(text)
+    if not questions:
+        return [Document(text=text, id_=f"{student_id}:all", metadata={"student_id": student_id})]
+
+    return [
+        Document(
+            text=question_text,
+            id_=question_doc_id(student_id, question_id),
+            metadata={"student_id": student_id, "question_id": question_id},
+            excluded_embed_metadata_keys=["student_id"],
+            excluded_llm_metadata_keys=["student_id"],
+        )
+        for question_id, question_text in questions
+    ]
+
+def student_filters(student_id: str) -> MetadataFilters:
+    """Metadata filter that restricts retrieval to one student's insights."""
+    return MetadataFilters(filters=[ExactMatchFilter(key="student_id", value=student_id)])
+
+def question_filters(student_id: str, question_id) -> MetadataFilters:
+    """Metadata filter for one student's analysis of a single question."""
+    return MetadataFilters(filters=[
+        ExactMatchFilter(key="student_id", value=student_id),
+        ExactMatchFilter(key="question_id", value=question_id),
+    ])
+
+def load_manifest():
+    if not MANIFEST_FILE.exists():
+        return None
+    with open(MANIFEST_FILE, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    for entry in manifest.values():
+        # Older manifests only listed doc ids: mark those docs as changed so they are re-chunked once
+        if "docs" not in entry:
+            entry["docs"] = {doc_id: None for doc_id in entry.pop("doc_ids", [])}
+            entry["hash"] = None
+    return manifest
+
+def save_manifest(manifest: dict):
+    tmp_path = MANIFEST_FILE.with_suffix(".json.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, MANIFEST_FILE)
+
+def student_versions(manifest: dict) -> dict:
+    """Returns {student_id: version}, a hash of that student's indexed documents that changes whenever they do."""
+    documents = {}
+    for entry in manifest.values():
+        for doc_id, doc_hash in entry["docs"].items():
+            documents.setdefault(doc_id.rsplit(":", 1)[0], {})[doc_id] = doc_hash
+    return {
+        student_id: hashlib.sha256(json.dumps(docs, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        for student_id, docs in documents.items()
+    }
+
+def sync_index(index: VectorStoreIndex, manifest: dict) -> bool:
+    """
+    Brings the index in line with the insights files. Files that are
+    unchanged are skipped outright; changed files are split per question and
+    only questions whose text changed are re-chunked, embedded and upserted.
+    Documents of removed files and questions are deleted. Updates `manifest`
+    in place; returns True if anything changed.
+    """
+    insight_files = find_insight_files()
+    current = {path: hash_file(Path(path)) for path in insight_files}
+    removed = [path for path in manifest if path not in current]
+    changed = [path for path in current if path in manifest and manifest[path]["hash"] != current[path]]
+    added = [path for path in current if path not in manifest]
+    if not (removed or changed or added):
+        return False
+
+    print(f"🔄 Updating index: {len(added)} added, {len(changed)} changed, {len(removed)} removed file(s)...")
+    for path in removed:
+        for doc_id in manifest.pop(path)["docs"]:
+            index.delete_ref_doc(doc_id, delete_from_docstore=True)
+
+    parser = InsightsNodeParser()
+    upserted = unchanged = 0
+    for path in changed + added:
+        old_docs = manifest.get(path, {}).get("docs", {})
+        with open(path, 'r', encoding='utf-8') as f:
+            documents = split_insights(f.read(), insight_files[path])
+        new_docs = {document.doc_id: document.hash for document in documents}
+
+        for doc_id, doc_hash in old_docs.items():
+            if new_docs.get(doc_id) != doc_hash:
+                index.delete_ref_doc(doc_id, delete_from_docstore=True)
+
+        to_insert = [document for document in documents if old_docs.get(document.doc_id) != document.hash]
+        if to_insert:
+            index.insert_nodes(parser.get_nodes_from_documents(to_insert))
+        upserted += len(to_insert)
+        unchanged += len(documents) - len(to_insert)
+        manifest[path] = {"hash": current[path], "docs": new_docs}
+
+    print(f"   {upserted} question(s) re-embedded, {unchanged} unchanged.")
+    telemetry.annotate(files_added=len(added), files_changed=len(changed), files_removed=len(removed),
+                       re_embedded=upserted, unchanged=unchanged)
+    return True
+
+def download_embed_model(target_dir=DEFAULT_EMBED_MODEL_DIR) -> Path:
+    """Saves a local snapshot of the embedding model, for use with EMBED_MODEL_PATH."""
+    from huggingface_hub import snapshot_download
+    target_dir = Path(target_dir)
+    print(f"⬇️ Downloading {EMBED_MODEL_NAME} to {target_dir}...")
+    snapshot_download(repo_id=EMBED_MODEL_NAME, local_dir=str(target_dir))
+    print(f"✅ Done. Set EMBED_MODEL_PATH={target_dir} to load it from there.")
+    return target_dir
+
+def export_onnx_embed_model(target_dir=DEFAULT_ONNX_EMBED_MODEL_DIR) -> Path:
+    """Exports the embedding model to ONNX plus an int8 copy, for use with EMBED_BACKEND=onnx."""
+    from src.onnx_embedding import export_onnx_model
+    source = EMBED_MODEL_PATH or EMBED_MODEL_NAME
+    print(f"📦 Exporting {source} to ONNX (fp32 + int8) in {target_dir}...")
+    export_onnx_model(source, target_dir)
+    print(f"✅ Done. Set EMBED_BACKEND=onnx and EMBED_ONNX_PATH={target_dir} to use it.")
+    return Path(target_dir)
+
+def configure_models():
+    """Sets the Gemini LLM and the local embedding model on Settings."""
+    if EMBED_BACKEND == "onnx":
+        embed_model = EMBED_ONNX_PATH or str(DEFAULT_ONNX_EMBED_MODEL_DIR)
+    else:
+        embed_model = EMBED_MODEL_PATH or EMBED_MODEL_NAME
+    with telemetry.span("rag.configure_models", embed_backend=EMBED_BACKEND, embed_model=embed_model):
+        _configure_models()
+
+def _configure_models():
+    # Imported here: these pull in the Gemini client and torch, which take seconds to import
+    from llama_index.llms.gemini import Gemini
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+    from llama_index.embeddings.huggingface.utils import DEFAULT_QUERY_BGE_INSTRUCTION_EN
+
     # Configure LLM (This stays the same)
     Settings.llm = Gemini(model_name="gemini-2.5-flash", api_key=os.getenv("GEMINI_API_KEY"))
-    
+
     # Configure a local, open-source embedding model
-    print("Using local embedding model: bge-small-en-v1.5")
-    Settings.embed_model = HuggingFaceEmbedding(model_name="BAAI/bge-small-en-v1.5")
+    if EMBED_BACKEND == "onnx":
+        Settings.embed_model = onnx_embed_model()
+    elif EMBED_MODEL_PATH:
+        if not Path(EMBED_MODEL_PATH).is_dir():
+            raise FileNotFoundError(
+                f"EMBED_MODEL_PATH={EMBED_MODEL_PATH} does not exist. "
+                "Run 'python main.py download-embed-model' first, or unset EMBED_MODEL_PATH."
+            )
+        print(f"Using local embedding model snapshot: {EMBED_MODEL_PATH}")
+        # llama-index picks the bge instructions by Hub name, which a local path doesn't match: pass them explicitly
+        Settings.embed_model = HuggingFaceEmbedding(model_name=EMBED_MODEL_PATH, embed_batch_size=EMBED_BATCH_SIZE,
+                                                    query_instruction=DEFAULT_QUERY_BGE_INSTRUCTION_EN, text_instruction="")
+    else:
+        print("Using local embedding model: bge-small-en-v1.5")
+        Settings.embed_model = HuggingFaceEmbedding(model_name=EMBED_MODEL_NAME, embed_batch_size=EMBED_BATCH_SIZE,
+                                                    query_instruction=DEFAULT_QUERY_BGE_INSTRUCTION_EN, text_instruction="")
+
+def onnx_embed_model():
+    """The ONNX embedding backend, configured from EMBED_ONNX_PATH, EMBED_BATCH_SIZE, EMBED_THREADS and EMBED_QUERY_CACHE_SIZE."""
+    from src.onnx_embedding import OnnxEmbedding
+
+    model_dir = Path(EMBED_ONNX_PATH or DEFAULT_ONNX_EMBED_MODEL_DIR)
+    if not model_dir.is_dir():
+        raise FileNotFoundError(
+            f"ONNX embedding model {model_dir} does not exist. "
+            "Run 'python main.py export-onnx-embed-model' first, or set EMBED_BACKEND=hf."
+        )
+    print(f"Using ONNX embedding model: {model_dir}")
+    return OnnxEmbedding(model_dir, batch_size=EMBED_BATCH_SIZE, threads=EMBED_THREADS,
+                         query_cache_size=EMBED_QUERY_CACHE_SIZE)
+
+def load_index() -> VectorStoreIndex:
+    """
+    Loads the vector index from PERSIST_DIR (or creates it) and brings it in
+    sync with the insights files. Needs the embedding model on Settings.
+    """
+    with telemetry.span("rag.load_index"):
+        return _load_index()
+
+def open_vector_store():
+    """
+    Returns (vector store for the persisted index, migrated). With
+    VECTOR_STORE=memmap, an index persisted with the JSON store is converted
+    once, keeping its embeddings; migrated is then True. Returns None as the
+    store for VECTOR_STORE=simple, which StorageContext loads by default.
+    """
+    if VECTOR_STORE == "simple":
+        return None, False
+    if MemmapVectorStore.exists(PERSIST_DIR):
+        return MemmapVectorStore.from_persist_dir(PERSIST_DIR, use_ann=VECTOR_STORE_ANN), False
+    if (PERSIST_DIR / SIMPLE_VECTOR_STORE_FILE).exists():
+        print("Converting the JSON vector store to the memory-mapped one (no re-embedding)...")
+        simple_store = SimpleVectorStore.from_persist_path(str(PERSIST_DIR / SIMPLE_VECTOR_STORE_FILE))
+        return MemmapVectorStore.from_simple(simple_store, dtype=VECTOR_STORE_DTYPE, use_ann=VECTOR_STORE_ANN), True
+    raise FileNotFoundError(f"No vector store in {PERSIST_DIR}")
 
-    # --- UPDATED: Filesystem check using pathlib ---
-    if not PERSIST_DIR.exists():
+def vector_store_persisted() -> bool:
+    """Whether PERSIST_DIR has vectors the configured VECTOR_STORE can load (the memmap store can convert JSON ones)."""
+    if VECTOR_STORE == "simple":
+        return (PERSIST_DIR / SIMPLE_VECTOR_STORE_FILE).exists()
+    return MemmapVectorStore.exists(PERSIST_DIR) or (PERSIST_DIR / SIMPLE_VECTOR_STORE_FILE).exists()
+
+def _load_index() -> VectorStoreIndex:
+    manifest = load_manifest()
+    migrated = False
+    if manifest is not None and not vector_store_persisted():
+        print(f"No {VECTOR_STORE} vector store in {PERSIST_DIR}, rebuilding the index...")
+        manifest = None
+    if manifest is not None:
+        print(f"Loading existing index from {PERSIST_DIR}...")
+        vector_store, migrated = open_vector_store()
+        storage_context = StorageContext.from_defaults(persist_dir=str(PERSIST_DIR), vector_store=vector_store)
+        index = load_index_from_storage(storage_context)
+    else:
+        # No index yet, or one persisted before manifests existed: start from empty
         print("Creating new index...")
-        # LlamaIndex's SimpleDirectoryReader works directly with string paths
-        documents = SimpleDirectoryReader(str(DATA_DIR)).load_data()
-        
-        # Create and persist the index
-        index = VectorStoreIndex.from_documents(documents)
-        # The persist method also works directly with string paths
+        vector_store = None
+        if VECTOR_STORE != "simple":
+            vector_store = MemmapVectorStore(dtype=VECTOR_STORE_DTYPE, use_ann=VECTOR_STORE_ANN)
+        index = VectorStoreIndex(nodes=[], storage_context=StorageContext.from_defaults(vector_store=vector_store))
+        manifest = {}
+
+    if sync_index(index, manifest) or migrated or not MANIFEST_FILE.exists():
         index.storage_context.persist(persist_dir=str(PERSIST_DIR))
-        print(f"Index created and saved to {PERSIST_DIR}")
+        save_manifest(manifest)
+        if migrated:
+            (PERSIST_DIR / SIMPLE_VECTOR_STORE_FILE).unlink()
+        print(f"Index saved to {PERSIST_DIR}")
     else:
-        print(f"Loading existing index from {PERSIST_DIR}...")
-        # Load the existing index
-        storage_context = StorageContext.from_defaults(persist_dir=str(PERSIST_DIR))
-        index = load_index_from_storage(storage_context)
-        print("Index loaded successfully.")
-        
+        print("Index is up to date.")
+
     return index
 
-def start_chat_session():
+def setup_rag_system():
+    """
+    Sets up the RAG system by creating or loading a vector index.
+    The index holds every student's insights, one partition per student via
+    metadata, and is kept in sync incrementally: on every start only new,
+    changed or removed insights files are re-embedded.
+    """
+    print("Setting up RAG system...")
+    with telemetry.span("rag.setup"):
+        configure_models()
+        return load_index()
+
+def start_chat_session(student_id: str = DEFAULT_STUDENT_ID):
     """
-    Initializes the RAG system and starts an interactive chat loop.
+    Initializes the RAG system and starts an interactive chat loop
+    over one student's insights.
     """
     index = setup_rag_system()
 
@@ -77,7 +347,8 @@ def start_chat_session():
     # --- MODIFIED: Pass the system_prompt to the chat engine ---
     chat_engine = index.as_chat_engine(
         chat_mode='condense_plus_context',
-        system_prompt=system_prompt
+        system_prompt=system_prompt,
+        filters=student_filters(student_id)
     )
     
     print("\n🎓 Smart Mentor Chatbot is ready!")
@@ -0,0 +1,237 @@
+# src/telemetry.py
+import os
+import json
+import time
+import uuid
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# --- Traces: every finished span is appended as one JSON line to TRACE_FILE, if set ---
+# The batch CLI writes to DEFAULT_CLI_TRACE_FILE unless TRACE_FILE says otherwise; servers only write one if it is set.
+TRACE_FILE = os.getenv("TRACE_FILE")
+DEFAULT_CLI_TRACE_FILE = "data/traces.jsonl"
+
+# --- Metrics: counters and histograms, rendered in the Prometheus text format for /metrics ---
+METRIC_PREFIX = "baaz_"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+SCORE_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_trace_file = None
+_trace_lock = threading.Lock()
+
+
+class Span:
+    """
+    One timed operation. Attributes (token counts, cache hits, scores...) are
+    set while it runs; `end()` records its duration in the
+    span_duration_seconds histogram and writes it to the trace file.
+    """
+    def __init__(self, name: str, parent=None, **attrs):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attrs = attrs
+        self.status = "ok"
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, key: str, amount=1):
+        self.attrs[key] = self.attrs.get(key, 0) + amount
+
+    def end(self, duration: float = None):
+        if self.duration is not None:
+            return
+        self.duration = duration if duration is not None else time.perf_counter() - self._start
+        observe("span_duration_seconds", self.duration, span=self.name, status=self.status)
+        write_trace({
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.start_time, 6),
+            "duration_s": round(self.duration, 6),
+            "status": self.status,
+            "attrs": self.attrs,
+        })
+
+
+def start_span(name: str, **attrs) -> Span:
+    """Starts a span under the current one without making it current; call end() on it."""
+    return Span(name, _current_span.get(), **attrs)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Times the block as a span; spans started inside it (same thread or task) become its children."""
+    current = start_span(name, **attrs)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.set(error=type(e).__name__)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end()
+
+
+@contextmanager
+def use_span(current: Span):
+    """Makes a span started with start_span() the current one inside the block, without ending it."""
+    token = _current_span.set(current)
+    try:
+        yield current
+    finally:
+        _current_span.reset(token)
+
+
+def record(name: str, duration: float, **attrs):
+    """Records an operation that was timed elsewhere (e.g. in a worker process) as a finished span."""
+    start_span(name, **attrs).end(duration)
+
+
+def annotate(**attrs):
+    """Sets attributes on the current span, if there is one."""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attrs)
+
+
+def add(key: str, amount=1):
+    """Adds to a counting attribute of the current span, if there is one."""
+    current = _current_span.get()
+    if current is not None:
+        current.add(key, amount)
+
+
+def set_trace_file(path):
+    global _trace_file
+    _trace_file = str(path) if path else None
+    if _trace_file:
+        os.makedirs(os.path.dirname(_trace_file) or ".", exist_ok=True)
+
+
+set_trace_file(TRACE_FILE)
+
+
+def write_trace(record_: dict):
+    if not _trace_file:
+        return
+    line = json.dumps(record_, default=str)
+    with _trace_lock:
+        with open(_trace_file, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+# --- Metric registry ---
+_metrics_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket bounds, bucket counts, sum, count]
+_gauges = {}      # name -> callable returning the current value
+
+
+def _labels(labels: dict) -> tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def inc(name: str, amount: float = 1, **labels):
+    key = (METRIC_PREFIX + name, _labels(labels))
+    with _metrics_lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name: str, value: float, buckets: tuple = LATENCY_BUCKETS, **labels):
+    key = (METRIC_PREFIX + name, _labels(labels))
+    with _metrics_lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [buckets, [0] * len(buckets), 0.0, 0]
+        index = bisect.bisect_left(histogram[0], value)
+        if index < len(histogram[1]):
+            histogram[1][index] += 1
+        histogram[2] += value
+        histogram[3] += 1
+
+
+def gauge(name: str, fn):
+    """Registers a gauge whose value is read from fn() each time metrics are rendered."""
+    with _metrics_lock:
+        _gauges[METRIC_PREFIX + name] = fn
+
+
+def _format_labels(labels, extra: tuple = ()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+def render_prometheus() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    with _metrics_lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((key, (value[0], list(value[1]), value[2], value[3])) for key, value in _histograms.items())
+        gauges = sorted(_gauges.items())
+
+    lines, typed = [], set()
+    for (name, labels), value in counters:
+        if name not in typed:
+            lines.append(f"# TYPE {name} counter")
+            typed.add(name)
+        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+    for (name, labels), (buckets, counts, total, count) in histograms:
+        if name not in typed:
+            lines.append(f"# TYPE {name} histogram")
+            typed.add(name)
+        cumulative = 0
+        for bound, bucket_count in zip(buckets, counts):
+            cumulative += bucket_count
+            lines.append(f"{name}_bucket{_format_labels(labels, (('le', f'{bound:g}'),))} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total:g}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    for name, fn in gauges:
+        try:
+            value = float(fn())
+        except Exception:
+            continue
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+def span_summary() -> dict:
+    """{span name: {"count", "total_s", "mean_s"}} from the span_duration_seconds histogram."""
+    summary = {}
+    with _metrics_lock:
+        for (name, labels), (_, _, total, count) in _histograms.items():
+            if name != METRIC_PREFIX + "span_duration_seconds":
+                continue
+            span_name = dict(labels)["span"]
+            entry = summary.setdefault(span_name, {"count": 0, "total_s": 0.0})
+            entry["count"] += count
+            entry["total_s"] += total
+    for entry in summary.values():
+        entry["mean_s"] = entry["total_s"] / entry["count"]
+    return summary
+
+
+def print_span_summary():
+    summary = span_summary()
+    if not summary:
+        return
+    print("\n⏱️ Time by stage:")
+    for name, entry in sorted(summary.items(), key=lambda item: -item[1]["total_s"]):
+        print(f"   {name:<24} {entry['count']:4d} x  {entry['total_s']:8.2f}s total  {entry['mean_s']:7.3f}s mean")
+    if _trace_file:
+        print(f"   Trace written to {_trace_file}")
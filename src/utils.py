@@ -1,59 +1,331 @@
 # src/utils.py
+import os
+import time
+import atexit
+import shlex
+import hashlib
+import threading
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pytesseract
 from PIL import Image
 import cv2
 import markdown
 from bs4 import BeautifulSoup
+from src.cache import CACHE_DIR, SQLiteCache, make_key
+from src import telemetry
+
+# tesserocr keeps a Tesseract engine loaded in-process (one per thread); it's optional and
+# without it pages are piped to the tesseract CLI through stdin/stdout.
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
 
 # IMPORTANT FOR WINDOWS USERS:
 # You may need to tell pytesseract where you installed Tesseract.
-pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+if os.name == "nt":
+    pytesseract.pytesseract.tesseract_cmd = os.getenv("TESSERACT_CMD", r'C:\Program Files\Tesseract-OCR\tesseract.exe')
+
+# Number of processes used to OCR a multi-page script
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", os.cpu_count() or 1))
+
+# Preprocessing and Tesseract settings; both are part of the OCR cache key,
+# so changing either one re-OCRs every page.
+# Pages whose longer side exceeds max_side pixels are downscaled first
+# (3508 px is the long side of an A4 page at 300 DPI).
+OCR_PREPROCESS_PARAMS = {
+    "decode": "grayscale",
+    "max_side": int(os.getenv("OCR_MAX_SIDE", "3508")),
+    "threshold": "otsu",
+    "median_blur": 3,
+}
+TESSERACT_CONFIG = os.getenv("TESSERACT_CONFIG", "")
+
+# --- OCR cache: page text keyed by a hash of the image bytes and the settings above ---
+OCR_CACHE_FILE = CACHE_DIR / "ocr.sqlite"
+OCR_CACHE_MAX_MB = float(os.getenv("OCR_CACHE_MAX_MB", "64"))
+_ocr_cache = None
+_ocr_cache_lock = threading.Lock()
+
+def get_ocr_cache() -> SQLiteCache:
+    global _ocr_cache
+    with _ocr_cache_lock:
+        if _ocr_cache is None:
+            _ocr_cache = SQLiteCache(OCR_CACHE_FILE, max_bytes=int(OCR_CACHE_MAX_MB * 1024 * 1024))
+        return _ocr_cache
+
+def ocr_cache_key(image_bytes: bytes) -> str:
+    image_hash = hashlib.sha256(image_bytes).hexdigest()
+    return make_key(image_hash, OCR_PREPROCESS_PARAMS, TESSERACT_CONFIG)
+
+def read_image_bytes(image_path: str) -> bytes:
+    with open(image_path, 'rb') as f:
+        return f.read()
+
+def load_grayscale(image) -> np.ndarray:
+    """
+    Returns a grayscale ndarray for a file path, encoded image bytes or an
+    already-decoded ndarray (BGR or grayscale).
+    """
+    if isinstance(image, np.ndarray):
+        return image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    if isinstance(image, (str, os.PathLike)):
+        image = read_image_bytes(image)
+    # Decoding straight to grayscale skips building (and converting) a colour image
+    gray = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        raise ValueError("Could not decode image data.")
+    return gray
 
-def preprocess_image_for_ocr(image_path: str):
+def preprocess_image_for_ocr(image):
     """
     Loads an image and applies preprocessing steps to improve OCR accuracy.
+    `image` may be a file path, encoded image bytes or an ndarray.
     - Converts to grayscale
+    - Downscales oversized pages
     - Applies thresholding to create a binary (black & white) image
     """
-    # Read the image using OpenCV
-    image = cv2.imread(image_path)
-    
-    # 1. Convert to grayscale
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    
-    # 2. Apply thresholding to get a binary image
+    # 1. Decode to grayscale
+    gray = load_grayscale(image)
+
+    # 2. Downscale oversized pages; everything after this runs on fewer pixels
+    max_side = OCR_PREPROCESS_PARAMS["max_side"]
+    height, width = gray.shape
+    if max(height, width) > max_side:
+        scale = max_side / max(height, width)
+        gray = cv2.resize(gray, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+
+    # 3. Apply thresholding to get a binary image
     # Otsu's thresholding automatically finds the optimal threshold value
     _, binary_image = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
-    
+
     # Optional: Apply a median blur to remove noise
-    binary_image = cv2.medianBlur(binary_image, 3)
-    
+    binary_image = cv2.medianBlur(binary_image, OCR_PREPROCESS_PARAMS["median_blur"])
+
     return binary_image
 
-def extract_text_from_image(image_path: str) -> str:
+# --- Tesseract backends ---
+class TesseractError(RuntimeError):
+    """The tesseract CLI is missing or failed; not a problem with the page."""
+
+# A tesserocr engine holds the current image and results, so threads (e.g. generate-cohort's
+# students) can't share one: each thread gets its own
+_tesseract_local = threading.local()
+
+def _get_tesseract_api():
+    """One tesserocr engine per thread, configured from TESSERACT_CONFIG (--psm, --oem, -l and -c are supported)."""
+    if getattr(_tesseract_local, "api", None) is None:
+        args = shlex.split(TESSERACT_CONFIG)
+        init_kwargs, variables, psm = {}, {}, None
+        i = 0
+        while i < len(args):
+            flag, value = args[i], args[i + 1] if i + 1 < len(args) else ""
+            if flag == "--psm":
+                psm = tesserocr.PSM(int(value))
+            elif flag == "--oem":
+                init_kwargs["oem"] = tesserocr.OEM(int(value))
+            elif flag == "-l":
+                init_kwargs["lang"] = value
+            elif flag == "-c" and "=" in value:
+                name, _, setting = value.partition("=")
+                variables[name] = setting
+            else:
+                raise ValueError(f"TESSERACT_CONFIG option {flag!r} is not supported with tesserocr.")
+            i += 2
+        api = tesserocr.PyTessBaseAPI(**init_kwargs)
+        if psm is not None:
+            api.SetPageSegMode(psm)
+        for name, setting in variables.items():
+            api.SetVariable(name, setting)
+        _tesseract_local.api = api
+    return _tesseract_local.api
+
+def run_tesseract(binary_image: np.ndarray) -> str:
     """
-    Uses Tesseract OCR to extract text from an image file,
-    applying preprocessing first to improve accuracy.
+    OCRs a preprocessed image without going through temporary files: via the
+    in-process tesserocr engine when installed, else by piping a PNG through
+    the tesseract CLI's stdin/stdout.
     """
+    if tesserocr is not None:
+        api = _get_tesseract_api()
+        height, width = binary_image.shape
+        api.SetImageBytes(binary_image.tobytes(), width, height, 1, width)
+        return api.GetUTF8Text()
+
+    ok, png = cv2.imencode(".png", binary_image)
+    if not ok:
+        raise ValueError("Could not encode preprocessed image.")
+    command = [pytesseract.pytesseract.tesseract_cmd, "stdin", "stdout", *shlex.split(TESSERACT_CONFIG)]
+    try:
+        result = subprocess.run(command, input=png.tobytes(), capture_output=True, check=True)
+    except FileNotFoundError:
+        raise TesseractError(f"Tesseract binary not found at {command[0]!r}; install Tesseract or set TESSERACT_CMD.") from None
+    except subprocess.CalledProcessError as e:
+        stderr = e.stderr.decode("utf-8", errors="replace").strip()
+        raise TesseractError(f"Tesseract ({command[0]}) exited with status {e.returncode}: {stderr[:500]}") from None
+    return result.stdout.decode("utf-8")
+
+def describe_image(image) -> str:
+    """How a page shows up in error messages: its path, never its raw bytes."""
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return f"<{len(image)} bytes of image data>"
+    if isinstance(image, np.ndarray):
+        return f"<{image.shape} image array>"
+    return str(image)
+
+def ocr_page(image):
+    """
+    OCRs a single page (file path, encoded bytes or ndarray) and times each stage.
+    Returns (text, timings) where timings holds seconds spent in 'preprocess' and 'tesseract'.
+    Top-level so it can run in a worker process.
+    """
+    timings = {"preprocess": 0.0, "tesseract": 0.0}
     try:
         # Preprocess the image first
-        preprocessed_image = preprocess_image_for_ocr(image_path)
-        
-        # Pass the preprocessed image directly to pytesseract
-        text = pytesseract.image_to_string(preprocessed_image)
-        return text
+        start = time.perf_counter()
+        preprocessed_image = preprocess_image_for_ocr(image)
+        timings["preprocess"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        text = run_tesseract(preprocessed_image)
+        timings["tesseract"] = time.perf_counter() - start
+        return text, timings
     except FileNotFoundError:
-        print(f"Error: The file at {image_path} was not found.")
-        return ""
+        print(f"Error: The file at {describe_image(image)} was not found.")
+        return "", timings
+    except TesseractError as e:
+        print(f"❌ {e}")
+        return "", timings
     except Exception as e:
-        print(f"An error occurred during OCR processing: {e}")
-        return ""
+        print(f"An error occurred during OCR processing of {describe_image(image)}: {e}")
+        return "", timings
+
+def extract_text_from_image(image_path: str) -> str:
+    """
+    Uses Tesseract OCR to extract text from an image file,
+    applying preprocessing first to improve accuracy.
+    Pages that were OCR'd before with the same settings come from the OCR cache.
+    """
+    with telemetry.span("ocr.page", image=str(image_path)) as span:
+        try:
+            image_bytes = read_image_bytes(image_path)
+        except FileNotFoundError:
+            print(f"Error: The file at {image_path} was not found.")
+            span.status = "error"
+            return ""
+
+        cache_key = ocr_cache_key(image_bytes)
+        cached = get_ocr_cache().get(cache_key)
+        if cached is not None:
+            span.set(cache="hit")
+            telemetry.inc("ocr_pages_total", cache="hit")
+            return cached
+
+        text, timings = ocr_page(image_bytes)
+        record_ocr_timings(span, timings)
+        if text:
+            get_ocr_cache().set(cache_key, text)
+        return text
+
+def record_ocr_timings(span, timings: dict):
+    span.set(cache="miss", preprocess_s=round(timings["preprocess"], 4), tesseract_s=round(timings["tesseract"], 4))
+    telemetry.inc("ocr_pages_total", cache="miss")
+    for stage in ("preprocess", "tesseract"):
+        telemetry.observe("ocr_stage_seconds", timings[stage], stage=stage)
+
+# --- One OCR process pool for the whole program: concurrent ocr_pages calls (generate-cohort's
+# student threads) share its OCR_WORKERS processes instead of each starting a pool ---
+_ocr_executor = None
+_ocr_executor_lock = threading.Lock()
+
+def get_ocr_executor() -> ProcessPoolExecutor:
+    global _ocr_executor
+    with _ocr_executor_lock:
+        if _ocr_executor is None:
+            _ocr_executor = ProcessPoolExecutor(max_workers=OCR_WORKERS)
+            atexit.register(_ocr_executor.shutdown, cancel_futures=True)
+        return _ocr_executor
+
+def ocr_pages(image_paths: list, workers: int = None):
+    """
+    OCRs many pages on the shared process pool (OCR_WORKERS processes), with
+    at most `workers` (default OCR_WORKERS) of this call's pages queued at a
+    time, so concurrent calls take turns on the pool.
+
+    Each file is read once; its bytes are hashed for the OCR cache and, on a
+    miss, decoded in memory by the worker. Pages whose image bytes and OCR
+    settings are unchanged come straight from the cache.
+
+    Yields (image_path, text, timings) in page order, each one as soon as that
+    page and every page before it are done, so the next stage can start on the
+    first pages while later ones are still being read. Cached pages are marked
+    with timings["cached"] = True.
+    """
+    image_paths = [str(path) for path in image_paths]
+    cache = get_ocr_cache()
+
+    pages = []  # (image_path, image_bytes, cache_key, cached_text)
+    for image_path in image_paths:
+        try:
+            image_bytes = read_image_bytes(image_path)
+        except FileNotFoundError:
+            print(f"Error: The file at {image_path} was not found.")
+            pages.append((image_path, None, None, None))
+            continue
+        cache_key = ocr_cache_key(image_bytes)
+        pages.append((image_path, image_bytes, cache_key, cache.get(cache_key)))
+
+    misses = [page for page in pages if page[1] is not None and page[3] is None]
+    workers = min(workers or OCR_WORKERS, len(misses))
+
+    executor = get_ocr_executor() if workers > 1 else None
+    futures, queued = {}, iter(misses)
+
+    def submit_next():
+        page = next(queued, None)
+        if page is not None:
+            futures[page[0]] = executor.submit(ocr_page, page[1])
+
+    try:
+        if executor:
+            for _ in range(workers):
+                submit_next()
+
+        for image_path, image_bytes, cache_key, cached in pages:
+            if image_bytes is None:
+                yield image_path, "", {"preprocess": 0.0, "tesseract": 0.0}
+                continue
+            if cached is not None:
+                telemetry.record("ocr.page", 0.0, image=image_path, cache="hit")
+                telemetry.inc("ocr_pages_total", cache="hit")
+                yield image_path, cached, {"preprocess": 0.0, "tesseract": 0.0, "cached": True}
+                continue
+
+            if image_path in futures:
+                text, timings = futures.pop(image_path).result()
+                submit_next()
+            else:
+                text, timings = ocr_page(image_bytes)
+            # Timed in the worker; the span covers its CPU time, not the wait for it
+            span = telemetry.start_span("ocr.page", image=image_path)
+            record_ocr_timings(span, timings)
+            span.end(timings["preprocess"] + timings["tesseract"])
+            if text:
+                cache.set(cache_key, text)
+            yield image_path, text, timings
+    finally:
+        for future in futures.values():
+            future.cancel()
 
     
 # Parsing with LLM
 
 import json
 from src.llm_client import get_gemini_response
+from src.answer_segmenter import segment_answers, NO_ANSWER, SEGMENT_CONFIDENCE_THRESHOLD
 
 def parse_answers_with_llm(raw_text: str, questions: list) -> dict:
     """
@@ -66,6 +338,14 @@ def parse_answers_with_llm(raw_text: str, questions: list) -> dict:
     Returns:
         A dictionary mapping question_id (as int) to the student's answer (as str).
     """
+    with telemetry.span("parse_answers.llm", questions=len(questions)) as span:
+        parsed_answers = _parse_answers_with_llm(raw_text, questions)
+        span.set(parsed=len(parsed_answers))
+        if not parsed_answers:
+            span.status = "error"
+        return parsed_answers
+
+def _parse_answers_with_llm(raw_text: str, questions: list) -> dict:
     print("🧠 Using LLM to intelligently parse student answers...")
 
     # Create a simple list of question numbers for the prompt
@@ -100,12 +380,6 @@ Now, provide the structured JSON object.
 """
 
     response_text = get_gemini_response(parsing_prompt)
-        # --- ADD THIS BLOCK TO DEBUG ---
-    print("\n" + "="*50)
-    print("RAW LLM PARSER RESPONSE:")
-    print(response_text)
-    print("="*50 + "\n")
-    # --- END DEBUG BLOCK ---
 
     try:
         # Clean up the response to ensure it's valid JSON
@@ -121,9 +395,37 @@ Now, provide the structured JSON object.
         return parsed_answers
     except (json.JSONDecodeError, IndexError, ValueError) as e:
         print(f"❌ Failed to parse LLM response as JSON: {e}")
-        print(f"   LLM Response was: {response_text}")
+        print(f"   LLM Response began: {response_text[:500]!r}")
         return {} # Return empty dictionary on failure
-    
+
+def parse_answers(raw_text: str, questions: list) -> dict:
+    """
+    Maps question_id to the student's answer. The script is first split
+    locally on its "Q1" / "Ans 2" / "3." markers; only when that segmentation
+    is not confident enough (SEGMENT_CONFIDENCE_THRESHOLD) is the whole text
+    sent to the LLM parser. Returns an empty dict if neither worked.
+    """
+    with telemetry.span("parse_answers", questions=len(questions)) as span:
+        answers, confidence = segment_answers(raw_text, questions)
+        found = sum(answer != NO_ANSWER for answer in answers.values())
+        span.set(confidence=confidence, found_locally=found)
+        if confidence >= SEGMENT_CONFIDENCE_THRESHOLD and found:
+            print(f"✂️ Segmented {found}/{len(questions)} answers locally (confidence {confidence:.2f}).")
+            span.set(method="local")
+            telemetry.inc("answer_parses_total", method="local")
+            return answers
+
+        print(f"🤔 Local segmentation confidence {confidence:.2f} is below {SEGMENT_CONFIDENCE_THRESHOLD:.2f}.")
+        span.set(method="llm")
+        telemetry.inc("answer_parses_total", method="llm")
+        parsed_answers = parse_answers_with_llm(raw_text, questions)
+        if not parsed_answers and found:
+            print(f"⚠️ Using the local segmentation ({found}/{len(questions)} answers) instead.")
+            span.set(method="local_after_llm_failure")
+            return answers
+        return parsed_answers
+
+
 def strip_markdown(markdown_text: str) -> str:
     """
     Converts a string of Markdown text to plain text.
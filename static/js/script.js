@@ -51,7 +51,17 @@ document.addEventListener('DOMContentLoaded', () => {
                 return;
             }
             
-            // Add the new character to our buffer
+            if (data.done) {
+                // Server finished streaming, render whatever is still buffered
+                if (buffer.length > 0) {
+                    renderUpdate();
+                }
+                eventSource.close();
+                sendButton.disabled = false;
+                return;
+            }
+
+            // Add the new chunk of text to our buffer
             buffer += data.token;
 
             // Schedule a render update if one isn't already scheduled
@@ -0,0 +1,90 @@
+# tests/test_answer_segmenter.py
+import pytest
+from src.answer_segmenter import (find_markers, segment_answers, closed_answers, NO_ANSWER,
+                                  WEAK_ONLY_PENALTY, DUPLICATE_PENALTY, OUT_OF_ORDER_PENALTY, PREAMBLE_PENALTY)
+
+QUESTIONS = [{'id': 1}, {'id': 2}, {'id': 3}]
+
+
+def numbers(raw_text: str, question_ids=(1, 2, 3, 4)):
+    markers, strong = find_markers(raw_text, list(question_ids))
+    return [number for _, _, number in markers], strong
+
+
+@pytest.mark.parametrize("raw_text", [
+    "Q1. a\nQ.2) b\nAns 3: c\nQuestion No. 4 - d",
+    "(Q1) a\n[Ques 2] b\nAnswer #3 c\nquestion number 4. d",
+])
+def test_strong_marker_forms(raw_text):
+    assert numbers(raw_text) == ([1, 2, 3, 4], True)
+
+
+def test_ocr_misread_digits_attached_to_the_prefix():
+    assert numbers("Ql. a\nQ2. b\nQ|O. c", question_ids=(1, 2, 10)) == ([1, 2, 10], True)
+    # A look-alike after a space is a word, not a digit
+    assert numbers("Q. I think so\nQ2. b") == ([2], True)
+
+
+def test_bare_numbers_are_weak_and_only_used_without_prefixed_markers():
+    assert numbers("1. a\n2) b\n(3) c") == ([1, 2, 3], False)
+    assert numbers("Q1. a\n1. first step\n2. second step\nQ2. b") == ([1, 2], True)
+
+
+def test_markers_for_unknown_questions_are_ignored():
+    assert numbers("Q1. a\nQ7. b\nQ2. c", question_ids=(1, 2)) == ([1, 2], True)
+    assert numbers("no markers here") == ([], False)
+
+
+def test_clean_script_is_fully_confident():
+    answers, confidence = segment_answers("Q1. one\n--- Page Break ---\nmore one\nQ2. two\nQ3. three", QUESTIONS)
+    assert answers == {1: "one\n\nmore one", 2: "two", 3: "three"}
+    assert confidence == 1.0
+
+
+def test_missing_marker_lowers_confidence():
+    answers, confidence = segment_answers("Q1. one\nQ3. three", QUESTIONS)
+    assert answers[2] == NO_ANSWER
+    assert confidence == pytest.approx(2 / 3, abs=1e-3)
+
+
+def test_repeated_strong_marker_continues_the_answer():
+    answers, confidence = segment_answers("Q1. one\nQ2. two\nQ3. three\nQ2 (contd.) more two", QUESTIONS)
+    assert answers[2] == "two\n(contd.) more two"
+    assert confidence == pytest.approx(DUPLICATE_PENALTY)
+
+
+def test_repeated_bare_number_is_not_trusted():
+    answers, confidence = segment_answers("1. one\n2. two\n1. step\n3. three", QUESTIONS)
+    assert confidence == 0.0
+    assert set(answers.values()) == {NO_ANSWER}
+
+
+def test_weak_out_of_order_and_preamble_penalties():
+    assert segment_answers("1. one\n2. two\n3. three", QUESTIONS)[1] == pytest.approx(WEAK_ONLY_PENALTY)
+    assert segment_answers("Q2. two\nQ1. one\nQ3. three", QUESTIONS)[1] == pytest.approx(OUT_OF_ORDER_PENALTY)
+    preamble = "an unmarked answer that runs on for quite a while\n"
+    assert segment_answers(preamble + "Q2. two\nQ3. three", [{'id': 2}, {'id': 3}])[1] == pytest.approx(PREAMBLE_PENALTY)
+
+
+def test_no_questions_or_no_markers():
+    assert segment_answers("Q1. one", []) == ({}, 0.0)
+    assert segment_answers("just prose", QUESTIONS) == ({1: NO_ANSWER, 2: NO_ANSWER, 3: NO_ANSWER}, 0.0)
+
+
+def test_closed_answers_leave_the_last_marked_answer_open():
+    assert closed_answers("Q1. one\nQ2. two", QUESTIONS) == {1: "one"}
+    assert closed_answers("Q1. one\nQ2. two\nQ3. three", QUESTIONS) == {1: "one", 2: "two"}
+    assert closed_answers("Q1. one", QUESTIONS) == {}
+
+
+def test_closed_answers_wait_on_a_skipped_question():
+    # Q2 may have lost its marker and run into Q1's answer
+    assert closed_answers("Q1. one\nQ3. three", QUESTIONS) == {}
+    assert closed_answers("Q1. one\nQ3. three", QUESTIONS, threshold=0.5) == {1: "one"}
+    # Questions after the furthest marker don't count against a partial page
+    assert closed_answers("Q1. one\nQ2. two", QUESTIONS + [{'id': 4}, {'id': 5}]) == {1: "one"}
+
+
+def test_closed_answers_need_unique_prefixed_markers():
+    assert closed_answers("1. one\n2. two\n3. three", QUESTIONS) == {}
+    assert closed_answers("Q1. one\nQ2. two\nQ1 (contd.) more", QUESTIONS) == {}
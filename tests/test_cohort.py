@@ -0,0 +1,52 @@
+# tests/test_cohort.py
+import json
+import threading
+import time
+from src import task1_generate_model_ans as task1, batch_grading, scheduler
+from src.scheduler import RequestScheduler
+
+STUDENTS = 4
+PAGES = ["Q1. answer one\nQ2. answer two", "Q3. answer three\nQ4. answer four"]
+
+
+class InFlightLLM:
+    """Fake LLM behind the shared scheduler, like llm_client.generate; records the most requests in flight at once."""
+    def __init__(self):
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def _request(self, prompt: str) -> str:
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(0.01)
+        with self._lock:
+            self.in_flight -= 1
+        return "Feedback"
+
+    def __call__(self, prompt: str, generation_config=None) -> str:
+        return scheduler.get_scheduler().call(self._request, prompt)
+
+
+def test_cohort_stays_within_max_concurrency(tmp_path, monkeypatch):
+    questions = [{"id": i, "question": f"q{i}"} for i in (1, 2, 3, 4)]
+    (tmp_path / "questions.json").write_text(json.dumps(questions))
+    (tmp_path / "model_answers.json").write_text(json.dumps([{"question_id": i, "model_answer": f"m{i}"} for i in (1, 2, 3, 4)]))
+    for student in range(STUDENTS):
+        answer_dir = tmp_path / f"student_{student}"
+        answer_dir.mkdir()
+        for page in range(len(PAGES)):
+            (answer_dir / f"page_{page}.png").write_bytes(b"")
+
+    fake = InFlightLLM()
+    monkeypatch.setattr(scheduler, "_scheduler", RequestScheduler(rpm=1_000_000, max_concurrency=2))
+    monkeypatch.setattr(task1, "GRADING_MODE", "per-question")
+    monkeypatch.setattr(task1, "ocr_pages", lambda files: ((f, text, {"cached": True}) for f, text in zip(files, PAGES)))
+    monkeypatch.setattr(task1, "get_gemini_response", fake)
+    monkeypatch.setattr(batch_grading, "get_gemini_response", fake)
+
+    task1.generate_cohort(str(tmp_path), workers=STUDENTS)
+
+    assert len(list((tmp_path / task1.COHORT_INSIGHTS_DIR).glob("*.txt"))) == STUDENTS
+    assert fake.peak == 2
@@ -0,0 +1,109 @@
+# tests/test_memmap_vector_store.py
+import numpy as np
+import pytest
+from llama_index.core.schema import TextNode, NodeRelationship, RelatedNodeInfo
+from llama_index.core.vector_stores import SimpleVectorStore, VectorStoreQuery, MetadataFilters, ExactMatchFilter
+from src.memmap_vector_store import MemmapVectorStore
+
+DIM = 32
+STUDENTS = ["exam/student_001", "exam/student_002", "exam/student_003"]
+QUESTIONS = 4
+SECTIONS = 3
+
+
+def make_nodes(seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    nodes = []
+    for student_id in STUDENTS:
+        for question in range(1, QUESTIONS + 1):
+            doc_id = f"{student_id}:q{question}"
+            for section in range(SECTIONS):
+                node = TextNode(text="", id_=f"{doc_id}:s{section}", embedding=rng.standard_normal(DIM).tolist(),
+                                metadata={"student_id": student_id, "question_id": question})
+                node.relationships[NodeRelationship.SOURCE] = RelatedNodeInfo(node_id=doc_id)
+                nodes.append(node)
+    return nodes
+
+
+def queries(count: int = 10) -> list:
+    rng = np.random.default_rng(99)
+    filters = [None, MetadataFilters(filters=[ExactMatchFilter(key="student_id", value=STUDENTS[1])]),
+               MetadataFilters(filters=[ExactMatchFilter(key="student_id", value=STUDENTS[0]),
+                                        ExactMatchFilter(key="question_id", value=2)])]
+    return [VectorStoreQuery(query_embedding=rng.standard_normal(DIM).tolist(), similarity_top_k=5,
+                             filters=filters[i % len(filters)]) for i in range(count)]
+
+
+def assert_same_results(store, reference, tolerance: float):
+    """
+    Same top-k as the reference store, with scores within `tolerance`. Only
+    nodes whose reference scores are within 2 * tolerance of each other may
+    swap places (int8 rounding can reorder near-ties).
+    """
+    for query in queries():
+        expected, got = reference.query(query), store.query(query)
+        everything = reference.query(VectorStoreQuery(
+            query_embedding=query.query_embedding, similarity_top_k=10_000, filters=query.filters))
+        scores = dict(zip(everything.ids, everything.similarities))
+
+        assert len(got.ids) == len(expected.ids)
+        assert got.similarities == pytest.approx([scores[node_id] for node_id in got.ids], abs=tolerance)
+        for rank, node_id in enumerate(got.ids):
+            assert scores[node_id] == pytest.approx(expected.similarities[rank], abs=2 * tolerance)
+
+
+@pytest.fixture
+def reference():
+    store = SimpleVectorStore()
+    store.add(make_nodes())
+    return store
+
+
+# int8 rounding moves scores by well under a hundredth
+DTYPES = [("float32", 1e-5), ("int8", 1e-2)]
+
+
+@pytest.mark.parametrize("dtype, tolerance", DTYPES)
+def test_matches_simple_vector_store(reference, dtype, tolerance):
+    store = MemmapVectorStore(dtype=dtype)
+    store.add(make_nodes())
+    assert_same_results(store, reference, tolerance)
+
+
+@pytest.mark.parametrize("dtype, tolerance", DTYPES)
+def test_matches_after_delete(reference, dtype, tolerance):
+    store = MemmapVectorStore(dtype=dtype)
+    store.add(make_nodes())
+    for doc_id in (f"{STUDENTS[1]}:q1", f"{STUDENTS[0]}:q2"):
+        reference.delete(doc_id)
+        store.delete(doc_id)
+    assert_same_results(store, reference, tolerance)
+    # A deleted question's filter matches nothing
+    empty = VectorStoreQuery(query_embedding=[1.0] * DIM, similarity_top_k=5, filters=MetadataFilters(
+        filters=[ExactMatchFilter(key="student_id", value=STUDENTS[0]), ExactMatchFilter(key="question_id", value=2)]))
+    assert store.query(empty).ids == []
+
+
+@pytest.mark.parametrize("dtype, tolerance", DTYPES)
+def test_matches_after_persist_and_reload(tmp_path, reference, dtype, tolerance):
+    store = MemmapVectorStore(dtype=dtype)
+    store.add(make_nodes())
+    store.delete(f"{STUDENTS[2]}:q3")
+    reference.delete(f"{STUDENTS[2]}:q3")
+    store.persist(str(tmp_path / "default__vector_store.json"))
+
+    reloaded = MemmapVectorStore.from_persist_dir(tmp_path)
+    assert reloaded.dtype == dtype
+    assert_same_results(reloaded, reference, tolerance)
+
+    # Rows added after the reload are searched alongside the mapped ones
+    extra = make_nodes(seed=1)[:SECTIONS]
+    for node in extra:
+        node.id_ = node.id_ + ":new"
+    reloaded.add(extra)
+    reference.add(extra)
+    assert_same_results(reloaded, reference, tolerance)
+
+
+def test_converted_from_simple_vector_store(reference):
+    assert_same_results(MemmapVectorStore.from_simple(reference), reference, 1e-5)
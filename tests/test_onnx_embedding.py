@@ -0,0 +1,15 @@
+# tests/test_onnx_embedding.py
+import pytest
+from src.onnx_embedding import OnnxEmbedding
+from src.task2_rag import EMBED_MODEL_NAME
+
+hf_utils = pytest.importorskip("llama_index.embeddings.huggingface.utils")
+
+
+def test_query_text_matches_hf_backend(monkeypatch):
+    # The text each backend feeds its model for a query: sentence-transformers prepends HuggingFaceEmbedding's query prompt
+    monkeypatch.setattr(OnnxEmbedding, "_cached", lambda self, text: text)
+    query = "Where did I lose marks in question 3?"
+    hf_text = hf_utils.get_query_instruct_for_model_name(EMBED_MODEL_NAME) + query
+    assert hf_text != query
+    assert OnnxEmbedding.model_construct()._get_query_embedding(query) == hf_text
@@ -0,0 +1,98 @@
+# tests/test_scheduler.py
+import pytest
+from src import scheduler
+from src.scheduler import TokenBucket, RequestScheduler, RateLimitError, retry_hint
+
+
+class FakeClock:
+    """Stands in for the time module: sleep() advances monotonic() instantly and is recorded."""
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(scheduler, "time", fake)
+    return fake
+
+
+def test_bucket_allows_a_burst_then_refills(clock):
+    bucket = TokenBucket(rpm=60)
+    assert [bucket.reserve() for _ in range(60)] == [0.0] * 60
+    assert bucket.reserve() == pytest.approx(1.0)   # one request per second once the burst is spent
+
+    clock.now += 31   # 31 s refills 31 requests, one of which pays off the debt above
+    assert [bucket.reserve() for _ in range(30)] == [0.0] * 30
+    assert bucket.reserve() == pytest.approx(1.0)
+
+
+def test_large_prompts_wait_for_tpm(clock):
+    bucket = TokenBucket(rpm=1000, tpm=6000)
+    assert bucket.reserve(6000) == 0.0
+    assert bucket.reserve(3000) == pytest.approx(30.0)   # half a minute of tokens
+    clock.now += 30
+    # A prompt bigger than the whole TPM budget waits for a full bucket, not forever
+    assert bucket.reserve(100_000) == pytest.approx(60.0)
+
+
+def test_pause_holds_every_caller(clock):
+    bucket = TokenBucket(rpm=60)
+    bucket.pause(5)
+    assert bucket.reserve() == pytest.approx(5.0)
+    clock.now += 5
+    # The burst credit is gone after a 429: only what refilled during the pause is left
+    assert [bucket.reserve() for _ in range(4)] == [0.0] * 4
+    assert bucket.reserve() == pytest.approx(1.0)
+
+
+class FlakyAPI:
+    """Raises the given errors in turn, then answers."""
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self, prompt: str) -> str:
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return f"answer to {prompt}"
+
+
+def test_429_backs_off_with_the_server_hint(clock):
+    requests = RequestScheduler(rpm=1000)
+    api = FlakyAPI(RateLimitError("429", retry_after=7), RateLimitError("429 Please retry in 12.5s"))
+    assert requests.call(api, "q") == "answer to q"
+    assert api.calls == 3
+    assert clock.sleeps == [pytest.approx(7), pytest.approx(12.5)]
+
+
+def test_429_without_a_hint_backs_off_exponentially_then_gives_up(clock):
+    requests = RequestScheduler(rpm=1000, max_retries=3)
+    api = FlakyAPI(*[RateLimitError("429") for _ in range(4)])
+    with pytest.raises(RateLimitError):
+        requests.call(api, "q")
+    assert api.calls == 4
+    assert clock.sleeps == [pytest.approx(2), pytest.approx(4), pytest.approx(8)]
+
+
+def test_other_errors_are_not_retried(clock):
+    api = FlakyAPI(ValueError("bad request"))
+    with pytest.raises(ValueError):
+        RequestScheduler(rpm=1000).call(api, "q")
+    assert api.calls == 1
+
+
+def test_retry_hint_formats():
+    assert retry_hint(RateLimitError(retry_after=3)) == 3.0
+    assert retry_hint(Exception("429 Resource has been exhausted. Please retry in 12.3s.")) == 12.3
+    assert retry_hint(Exception("retry_delay { seconds: 20 }")) == 20.0
+    assert retry_hint(Exception("429")) is None
@@ -0,0 +1,125 @@
+# tests/test_streaming_grader.py
+import re
+import json
+import pytest
+from src import task1_generate_model_ans as task1, batch_grading, utils
+from src.insights_checkpoint import checkpoint_path
+
+PAGES = ["Q1. answer one\nQ2. answer two", "Q3. answer three"]
+
+
+class FakeLLM:
+    """
+    Grades every question, except those in `failing` and any answer containing
+    `fail_on`, for which it returns "" like the LLM layer does on failure.
+    Parse requests get `parsed` back; per-question grading prompts are kept.
+    """
+    def __init__(self, failing=(), fail_on=None, parsed=None):
+        self.failing = set(failing)
+        self.fail_on = fail_on
+        self.parsed = parsed or {}
+        self.graded = []
+        self.prompts = {}  # question_id -> [per-question grading prompts]
+
+    def __call__(self, prompt: str, generation_config=None) -> str:
+        if "text structuring expert" in prompt:
+            return json.dumps({str(k): v for k, v in self.parsed.items()})
+        batch = re.search(r"question IDs \[([\d, ]+)\]", prompt)
+        if batch:
+            ids = [int(i) for i in batch.group(1).split(",")]
+            self.graded += ids
+            return json.dumps({"questions": [
+                {"question_id": i, "student_answer": "a", "overall_summary": f"Summary {i}", "positive_points": ["p"],
+                 "areas_for_improvement": [], "actionable_path": "x"}
+                for i in ids if i not in self.failing
+            ]})
+        question_id = int(re.search(r'Question:\*\* "q(\d+)"', prompt).group(1))
+        self.graded.append(question_id)
+        self.prompts.setdefault(question_id, []).append(prompt)
+        if question_id in self.failing or (self.fail_on and self.fail_on in prompt):
+            return ""
+        return f"Feedback {question_id}"
+
+
+@pytest.fixture
+def exam(tmp_path, monkeypatch):
+    questions = [{"id": i, "question": f"q{i}"} for i in (1, 2, 3)]
+    (tmp_path / "questions.json").write_text(json.dumps(questions))
+    (tmp_path / "model_answers.json").write_text(json.dumps([{"question_id": i, "model_answer": f"m{i}"} for i in (1, 2, 3)]))
+    use_pages(tmp_path, monkeypatch, PAGES)
+    return tmp_path
+
+
+def use_pages(exam, monkeypatch, pages: list):
+    answer_dir = exam / "student_01"
+    answer_dir.mkdir(exist_ok=True)
+    for i in range(len(pages)):
+        (answer_dir / f"page_{i}.png").write_bytes(b"")
+    monkeypatch.setattr(task1, "ocr_pages", lambda files: ((f, text, {"cached": True}) for f, text in zip(files, pages)))
+
+
+def run(exam, fake, monkeypatch) -> bool:
+    for module in (task1, batch_grading, utils):
+        monkeypatch.setattr(module, "get_gemini_response", fake)
+    return task1.generate_insights(str(exam / "student_01"), str(exam / "insights.txt"),
+                                   str(exam / "questions.json"), str(exam / "model_answers.json"))
+
+
+@pytest.mark.parametrize("mode", ["per-question", "batched"])
+def test_failed_question_is_retried_on_resume(exam, monkeypatch, mode):
+    monkeypatch.setattr(task1, "GRADING_MODE", mode)
+    insights_file = exam / "insights.txt"
+
+    assert run(exam, FakeLLM(failing={2}), monkeypatch) is False
+    assert "Analysis for Question 2" not in insights_file.read_text()
+    assert len(open(checkpoint_path(insights_file)).readlines()) == 2
+
+    fake = FakeLLM()
+    assert run(exam, fake, monkeypatch) is True
+    assert fake.graded == [2]
+    text = insights_file.read_text()
+    assert all(f"Analysis for Question {i}" in text for i in (1, 2, 3))
+    assert not (exam / checkpoint_path("insights.txt")).exists()
+
+
+def test_missing_marker_is_not_graded_early(exam, monkeypatch):
+    # Q2 lost its marker, so its answer runs on from Q1's: only the LLM parse can split them
+    monkeypatch.setattr(task1, "GRADING_MODE", "per-question")
+    use_pages(exam, monkeypatch, ["Q1. answer one\nanswer to two, student forgot the marker", "Q3. answer three"])
+    fake = FakeLLM(parsed={1: "answer one", 2: "answer to two, student forgot the marker", 3: "answer three"})
+
+    assert run(exam, fake, monkeypatch) is True
+    assert len(fake.prompts[1]) == 1
+    assert "answer one" in fake.prompts[1][0] and "forgot the marker" not in fake.prompts[1][0]
+    assert "forgot the marker" in fake.prompts[2][0]
+
+
+# Q1 is closed (and graded) after the first page; the repeated Q2 marker on the second then drops the
+# confidence below the threshold, and the LLM parse splits Q1 differently
+OVERRIDE_PAGES = ["Q1. one\nQ2. two", "Q3. three\nQ2. more for two"]
+OVERRIDE_PARSE = {1: "one, as the parse reads it", 2: "two\nmore for two", 3: "three"}
+
+
+def test_llm_parse_overrides_early_answer(exam, monkeypatch):
+    monkeypatch.setattr(task1, "GRADING_MODE", "per-question")
+    use_pages(exam, monkeypatch, OVERRIDE_PAGES)
+    fake = FakeLLM(parsed=OVERRIDE_PARSE)
+
+    assert run(exam, fake, monkeypatch) is True
+    assert len(fake.prompts[1]) == 2
+    assert "as the parse reads it" in fake.prompts[1][1]
+
+
+def test_failed_regrade_drops_early_result(exam, monkeypatch):
+    monkeypatch.setattr(task1, "GRADING_MODE", "per-question")
+    use_pages(exam, monkeypatch, OVERRIDE_PAGES)
+    insights_file = exam / "insights.txt"
+
+    assert run(exam, FakeLLM(parsed=OVERRIDE_PARSE, fail_on="as the parse reads it"), monkeypatch) is False
+    assert "Analysis for Question 1" not in insights_file.read_text()
+    assert (exam / checkpoint_path("insights.txt")).exists()
+
+    fake = FakeLLM(parsed=OVERRIDE_PARSE)
+    assert run(exam, fake, monkeypatch) is True
+    assert set(fake.graded) == {1}
+    assert "Analysis for Question 1" in insights_file.read_text()